@@ -41,7 +41,7 @@ def run():
     # Long pyramid tests dataset
     dataset_long_pyramid_name = "long_svp_10mm_pyramid"
     data_folder_path = os.path.join(parent_dir, data_folder_name, dataset_long_pyramid_name)
-    dataset_long_pyramid_filepaths = [os.path.join(data_folder_path, file) for file in os.listdir(data_folder_path) if file.endswith(".pkl")]
+    dataset_long_pyramid_filepaths = [os.path.join(data_folder_path, file) for file in os.listdir(data_folder_path) if file.endswith((".pkl", ".etrun", ".etarc", ".rows"))]
     
     # # Long pyramid tests dataset
     # dataset_long_pyramid_name = "short_svp_15mm_control"
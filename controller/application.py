@@ -7,6 +7,7 @@ import logging
 import os
 import sys
 from pathlib import Path
+from typing import Optional
 
 # Add the path of the main HX2.5 new microcontroller code to the path so that the pyEasyTransfer module can be imported
 parent_dir = Path(__file__).parent.parent
@@ -14,7 +15,8 @@ sys.path.append(os.path.join(parent_dir))
 python_EasyTransfer_dir = os.path.join(parent_dir, "python_EasyTransfer")
 sys.path.append(python_EasyTransfer_dir)
 from python_EasyTransfer.pyEasyTransfer import PyEasyTransfer
-from python_EasyTransfer.utils import save_ETDataArrays
+from python_EasyTransfer.utils import start_ETDataArrays_file
+from python_EasyTransfer.save_service import SaveService
 
 from PySide6.QtCore import QMutex, Qt, QTimer
 from PySide6.QtGui import QFont
@@ -77,6 +79,11 @@ heat_block_enable = False
 # -------------------- GUI attributes --------------------
 min_width_slider = 30
 
+# -------------------- Saved data attributes --------------------
+data_dir = 'data'               # Directory the test data is saved to
+stream_data_to_file = False     # False saves each test to a run file with the SaveService at its end, True writes the test data to memory mapped files while testing so a crash does not lose the run
+data_flush_interval = 5         # Number of seconds between the flushes of the streamed test data to the disk
+
 
         
     
@@ -111,6 +118,9 @@ class MainWindow(QMainWindow):
         self.last_io_count_driver = 0
         
         self.emergency_stop = False
+        
+        # Save the test data in a worker thread, so the next test can start while it is written
+        self.save_service = SaveService(data_dir, progress=self.save_progress, done=self.save_done)
  
         # Initialize the main window
         self.log.info("Initializing application window")
@@ -704,6 +714,8 @@ class MainWindow(QMainWindow):
         #self.emergency_stop_button.setCheckable(True)
         if self.current_test_time > 0:
             self.current_test_time -= 1
+            if self.current_test_time % data_flush_interval == 0:
+                await self.flush_saved_data()
             self.start_test_button.setText(f"TESTING... {self.current_test_time}")
             # If the current test time is half of the test time then start the piezos given their current settings
             if self.current_test_time == self.test_time/2:
@@ -726,13 +738,32 @@ class MainWindow(QMainWindow):
             self.driver_output_data.reset_time = np.bool_(True)
             self.driver_output_data.piezo_1_enable = np.bool_(False)
             self.driver_output_data.piezo_2_enable = np.bool_(False)
-            await self.ET_driver.send_data()        # Send the data to the Driver
-            # Save the data to a file
-            save_ETDataArrays(self.ET_monitor.save_read_data, dir='data')
-            save_ETDataArrays(self.ET_driver.save_read_data, dir='data')
+            await self.ET_driver.send_data(force=True)      # Send even if unchanged, the driver clock is reset for the next test
+            # Save the data to a file in the background, the streamed data only needs a last flush
+            for save_read_data in [self.ET_monitor.save_read_data, self.ET_driver.save_read_data]:
+                if not save_read_data.file_path:
+                    self.save_service.save(save_read_data)
+            await self.flush_saved_data()
             self.enable_all_elements()
             self.test_time_timer.stop()
             
+    async def flush_saved_data(self):
+        """Flush the test data streamed to files in a thread, so the event loop keeps reading meanwhile"""
+        for save_read_data in [self.ET_monitor.save_read_data, self.ET_driver.save_read_data]:
+            if save_read_data.file_path:
+                await asyncio.to_thread(save_read_data.flush)
+            
+    def save_progress(self, file_path: str, written: int, total: int):
+        """Log the progress of a background save"""
+        self.log.debug(f"Saving {os.path.basename(file_path)}: {written/max(total, 1)*100:.0f}%")
+        
+    def save_done(self, file_path: str, exception: Optional[BaseException]):
+        """Log the completion of a background save"""
+        if exception is None:
+            self.log.info(f"Saved the test data to {file_path}")
+        else:
+            self.log.error(f"Could not save the test data to {file_path}: {exception}")
+            
     @qasync.asyncSlot()
     def update_piezo_sweep(self):
         pass
@@ -1050,15 +1081,18 @@ class MainWindow(QMainWindow):
         # Disable the piezos temporarily, we turn them on half way through the test
         self.driver_output_data.piezo_1_enable = False
         self.driver_output_data.piezo_2_enable = False
-        # Send the data to the teensys
-        await self.ET_driver.send_data()
-        await self.ET_monitor.send_data()
+        # Send the data to the teensys, even if the settings did not change since the last test, to reset their clocks
+        await self.ET_driver.send_data(force=True)
+        await self.ET_monitor.send_data(force=True)
         #self.start_test_button.setText("TESTING...")
         #self.disable_all_elements()
         self.emergency_stop_button.setEnabled(True)     # Enable the emergency stop button
-        # Reset the io count (This overwrites the data in the save_read_data object)
-        self.ET_monitor.save_read_data.io_count = 0
-        self.ET_driver.save_read_data.io_count = 0        
+        # Reset the io count (This overwrites the data in the save_read_data object), or start new files for the streamed data
+        for save_read_data in [self.ET_monitor.save_read_data, self.ET_driver.save_read_data]:
+            if stream_data_to_file:
+                await asyncio.to_thread(start_ETDataArrays_file, save_read_data, dir=data_dir)    # Flushes the previous file, in a thread as flush_saved_data
+            else:
+                save_read_data.io_count = 0
         # Start saving on the objects
         self.ET_driver.start_saving()
         self.ET_monitor.start_saving()
@@ -1087,8 +1121,8 @@ class MainWindow(QMainWindow):
         # Set all values to zero or False in the output for driver
         self.update_output_ETdata(emergency=False)      # Init values if needed
         self.update_output_ETdata(emergency=True)
-        await self.ET_driver.send_data()
-        await self.ET_monitor.send_data()       
+        await self.ET_driver.send_data(force=True)      # Send immediately, even if the teensys should already be in this state
+        await self.ET_monitor.send_data(force=True)       
         await asyncio.sleep(1)
         self.emergency_stop_button.setChecked(False)
         self.emergency_stop_button.setText("Emergency Stop")
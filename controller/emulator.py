@@ -0,0 +1,377 @@
+"""Emulates the Monitor and Driver Teensys on the wire, so the controller can be run and benchmarked without the hardware.
+
+The emulators send the same EasyTransfer frames as src/main_Monitor.cpp and src/main_Driver.cpp at a configurable rate, and react to
+the commands sent by the PC the same way as the firmware. The PC side connects with a normal PyEasyTransfer object, using either
+    com_port="socket://localhost:<port>"    (local socket, works on every OS), or
+    com_port=<pty slave path>               (pty pair, Linux/macOS only)
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+# Add the path of the main HX2.5 new microcontroller code to the path so that the pyEasyTransfer module can be imported
+parent_dir = Path(__file__).parent.parent
+sys.path.append(os.path.join(parent_dir))
+python_EasyTransfer_dir = os.path.join(parent_dir, "python_EasyTransfer")
+sys.path.append(python_EasyTransfer_dir)
+from python_EasyTransfer.pyEasyTransfer import PyEasyTransfer, create_record_dtype
+from python_EasyTransfer.extended_framing import encode_extended_frames
+from struct_defs import monitor_input_struct_def, monitor_output_struct_def, driver_input_struct_def, driver_output_struct_def
+
+
+# -------------------------------- TRANSPORTS -------------------------------- #
+class PtyTransport(asyncio.Transport):
+    """Minimal transport over the master side of a pty pair, the PC side opens the slave path as a serial port"""
+    def __init__(self, loop: asyncio.AbstractEventLoop, fd: int, protocol: asyncio.BaseProtocol):
+        super().__init__()
+        self._loop = loop
+        self._fd = fd
+        self._protocol = protocol
+        self._write_buffer = bytearray()
+        self._closing = loop.create_future()
+        self._reading = True
+        os.set_blocking(fd, False)
+        loop.add_reader(fd, self._read_ready)
+        loop.call_soon(protocol.connection_made, self)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            return          # EIO until the PC side opens the slave
+        if data:
+            self._protocol.data_received(data)
+
+    def _write_ready(self):
+        try:
+            nbytes = os.write(self._fd, self._write_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        del self._write_buffer[:nbytes]
+        if not self._write_buffer:
+            self._loop.remove_writer(self._fd)
+
+    def write(self, data: bytes):
+        if self._closing.done():
+            return
+        if not self._write_buffer:
+            try:
+                nbytes = os.write(self._fd, data)
+            except (BlockingIOError, InterruptedError):
+                nbytes = 0
+            data = data[nbytes:]
+            if not data:
+                return
+            self._loop.add_writer(self._fd, self._write_ready)
+        self._write_buffer.extend(data)
+
+    def get_write_buffer_size(self) -> int:
+        return len(self._write_buffer)
+
+    def pause_reading(self):
+        if self._reading and not self._closing.done():
+            self._loop.remove_reader(self._fd)
+            self._reading = False
+
+    def resume_reading(self):
+        if not self._reading and not self._closing.done():
+            self._loop.add_reader(self._fd, self._read_ready)
+            self._reading = True
+
+    def is_reading(self) -> bool:
+        return self._reading and not self._closing.done()
+
+    def is_closing(self) -> bool:
+        return self._closing.done()
+
+    def close(self):
+        if self._closing.done():
+            return
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        os.close(self._fd)
+        self._loop.call_soon(self._protocol.connection_lost, None)
+        self._closing.set_result(None)
+
+
+def open_pty_pair() -> tuple[int, str]:
+    """Open a raw pty pair, returns the master fd (for the emulator) and the slave path (the com_port for the PC side)"""
+    import tty
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)            # No echo or line discipline, the pty behaves like a serial port
+    slave_path = os.ttyname(slave_fd)
+    os.close(slave_fd)
+    return master_fd, slave_path
+
+
+async def create_pty_connection(loop: asyncio.AbstractEventLoop, protocol_factory: Callable[[], asyncio.BaseProtocol],
+                                url: Optional[str] = None, baudrate: Optional[int] = None, *, master_fd: int) -> tuple[PtyTransport, asyncio.BaseProtocol]:
+    """Connection factory for PyEasyTransfer which talks over the master side of a pty pair"""
+    protocol = protocol_factory()
+    return PtyTransport(loop, master_fd, protocol), protocol
+
+
+async def create_socket_server_connection(loop: asyncio.AbstractEventLoop, protocol_factory: Callable[[], asyncio.BaseProtocol],
+                                          url: str, baudrate: Optional[int] = None) -> tuple[asyncio.Transport, asyncio.BaseProtocol]:
+    """Connection factory for PyEasyTransfer which listens on a local socket (url "socket://host:port") and returns once the PC side connects"""
+    address = urlparse(url)
+    connected = loop.create_future()
+
+    def factory():
+        protocol = protocol_factory()
+        connection_made = protocol.connection_made
+
+        def on_connection_made(transport):
+            connection_made(transport)
+            if not connected.done():
+                connected.set_result((transport, protocol))
+        protocol.connection_made = on_connection_made
+        return protocol
+
+    server = await loop.create_server(factory, address.hostname, address.port)
+    transport, protocol = await connected
+    server.close()          # Only one connection, the same as a serial port
+    return transport, protocol
+
+
+# -------------------------------- EMULATORS -------------------------------- #
+class TeensyEmulator:
+    """Base class for the Teensy emulators.
+
+    The emulator is a PyEasyTransfer object with the struct definitions swapped: it receives the PC output struct and sends the PC input struct.
+    Each tick the newest command from the PC is applied (like receiveData() in the firmware loop), then every frame due at the data rate is sent.
+
+    Args:
+        name: str
+            The name of the emulated device
+        pc_input_struct_def: dict[str, np.dtype]
+            The struct sent by the Teensy to the PC
+        pc_output_struct_def: dict[str, np.dtype]
+            The struct sent by the PC to the Teensy
+        com_port: str
+            "socket://host:port" to listen on a local socket, or "pty" to talk over a pty pair (see slave_path)
+        data_rate: float
+            Number of samples sent per second
+        log: logging.Logger
+            The logger to use
+        samples_per_frame: int
+            Number of samples sent in one extended frame (see python_EasyTransfer/extended_framing.py), 1 to send standard frames.
+            The PC side must use input_framing='extended' when this is more than 1.
+        checksum: str
+            The checksum of the frames in both directions, the PC side must use the same one
+    """
+    def __init__(self, name: str, pc_input_struct_def: dict[str, np.dtype], pc_output_struct_def: dict[str, np.dtype],
+                 com_port: str, data_rate: float = 25, log: Optional[logging.Logger] = None, seed: Optional[int] = None,
+                 samples_per_frame: int = 1, checksum: str = 'xor'):
+        self.name = name
+        self.data_rate = data_rate
+        self.samples_per_frame = samples_per_frame
+        self.log = log or logging.getLogger(name)
+        self.rng = np.random.default_rng(seed)
+        self.slave_path = None                  # Path to open on the PC side when using a pty pair
+        self.frames_sent = 0
+        self.commands_received = 0
+
+        if com_port == 'pty':
+            master_fd, self.slave_path = open_pty_pair()
+            connection_factory = functools.partial(create_pty_connection, master_fd=master_fd)
+        else:
+            connection_factory = create_socket_server_connection
+        self.et = PyEasyTransfer(com_port=com_port, baud_rate=115200,
+                                 input_struct_def=pc_output_struct_def,
+                                 output_struct_def=pc_input_struct_def,
+                                 mode='both', log=self.log, name=f"{name} emulator",
+                                 connection_factory=connection_factory, checksum=checksum)
+        self.state = self.et.write_data         # The data sent to the PC
+        self.command = self.et.read_data        # The last command received from the PC
+        self._last_command_count = 0
+        self.echo_command_tag = 'pc_seq' in pc_output_struct_def and 'pc_seq_received' in pc_input_struct_def
+        if self.echo_command_tag:
+            self.set('pc_seq_received', 0)
+        self._time_zero = time.perf_counter()   # Time of the last reset_time, elapsed_millis/elapsed_micros in the firmware
+        self._record_dtype = create_record_dtype(self.et.byte_format, pc_input_struct_def)
+        self._pending_samples: list[bytes] = []  # Packed samples waiting to fill an extended frame
+
+    def set(self, field: str, value):
+        """Set a field of the state sent to the PC, cast to the dtype of the struct"""
+        setattr(self.state, field, self.state.struct_def[field](value))
+
+    def reset_time(self):
+        """Zero the device time, the same as reset_time in the firmware"""
+        self._time_zero = time.perf_counter()
+
+    def apply_command(self):
+        """Apply the last command received from the PC to the emulated device, implemented by each emulator"""
+        raise NotImplementedError
+
+    def update_state(self, t: float, dt: float):
+        """Update the simulated measurements in the state, t is the device time and dt the time since the last frame in seconds"""
+        raise NotImplementedError
+
+    async def run(self):
+        """Open the connection and run the emulator until cancelled"""
+        await self.et.open()
+        self.log.info(f"{self.name} emulator connected, sending at {self.data_rate} Hz")
+        start_time = time.perf_counter()
+        last_frame_time = start_time
+        try:
+            while True:
+                # Apply the newest command from the PC
+                if self.command.io_count != self._last_command_count:
+                    self._last_command_count = self.command.io_count
+                    self.commands_received += 1
+                    self.apply_command()
+                    if self.echo_command_tag:
+                        self.set('pc_seq_received', self.command.pc_seq)       # Echoed in the next frame, as in send_data_to_pc() in the firmware
+
+                # Send every frame which is due, several per write if the loop can not keep up with the data rate
+                now = time.perf_counter()
+                frames_due = int((now - start_time) * self.data_rate) - self.frames_sent
+                if frames_due > 0:
+                    frames = []
+                    for i in range(frames_due):
+                        frame_time = now - (frames_due - 1 - i)/self.data_rate
+                        self.update_state(frame_time - self._time_zero, frame_time - last_frame_time)
+                        last_frame_time = frame_time
+                        frames.append(bytes(self.et.write_codec.encode(self.state)))
+                    if self.samples_per_frame > 1:
+                        self.send_extended_frames(frames)
+                    else:
+                        self.et.writer.write(b''.join(frames))
+                    self.frames_sent += frames_due
+                await asyncio.sleep(max(start_time + (self.frames_sent + 1)/self.data_rate - time.perf_counter(), 0))
+        finally:
+            await self.et.close()
+
+    def send_extended_frames(self, frames: list[bytes]):
+        """Queue the samples of the given standard frames, and send them in extended frames of samples_per_frame samples each"""
+        codec = self.et.write_codec
+        self._pending_samples += [frame[codec.packet_start:codec.footer_start] for frame in frames]
+        num_full = len(self._pending_samples) // self.samples_per_frame * self.samples_per_frame
+        if num_full:
+            records = np.frombuffer(b''.join(self._pending_samples[:num_full]), dtype=self._record_dtype)
+            del self._pending_samples[:num_full]
+            self.et.writer.write(encode_extended_frames(records, self.samples_per_frame, self.et.header_bytes, self.et.byte_order, self.et.checksum))
+
+
+class MonitorEmulator(TeensyEmulator):
+    """Emulates src/main_Monitor.cpp: thermistor, inlet fluid temperature and heater echo data.
+
+    The thermistors follow first order responses: the inlet fluid heats towards the setpoint while the rope heater is enabled,
+    the heater block thermistors (13 and 14) heat in proportion to the heat flux while the heater block is enabled, and the
+    channel thermistors (1 to 12) sit between the two.
+    """
+    ambient_temp_c = 22.0
+    fluid_time_constant_s = 60.0
+    block_time_constant_s = 30.0
+    block_temp_rise_per_flux = 0.5          # Steady state heater block temperature rise per unit of heat flux
+    noise_c = 0.05
+
+    def __init__(self, com_port: str, data_rate: float = 25, log: Optional[logging.Logger] = None, seed: Optional[int] = None,
+                 samples_per_frame: int = 1, checksum: str = 'xor'):
+        super().__init__('monitor', monitor_input_struct_def, monitor_output_struct_def, com_port, data_rate, log, seed, samples_per_frame, checksum)
+        self.inlet_fluid_temp_c = self.ambient_temp_c
+        self.block_temp_c = self.ambient_temp_c
+        self.set('inlet_fluid_temp_setpoint_c', 25.0)
+        self.set('heater_block_enable', False)
+        self.set('rope_heater_enable', False)
+        self.set('heat_flux', 0.0)
+
+    def apply_command(self):
+        if self.command.reset_time:
+            self.reset_time()
+        self.set('inlet_fluid_temp_setpoint_c', self.command.inlet_fluid_temp_setpoint_c)
+        self.set('heater_block_enable', self.command.heater_block_enable)
+        self.set('rope_heater_enable', self.command.rope_heater_enable)
+        self.set('heat_flux', self.command.heat_flux)
+
+    def update_state(self, t: float, dt: float):
+        # Inlet fluid, rope heater bang bang control towards the setpoint
+        fluid_target = max(self.state.inlet_fluid_temp_setpoint_c, self.ambient_temp_c) if self.state.rope_heater_enable else self.ambient_temp_c
+        self.inlet_fluid_temp_c += (fluid_target - self.inlet_fluid_temp_c) * min(dt/self.fluid_time_constant_s, 1.0)
+        # Heater block
+        block_target = self.inlet_fluid_temp_c + (self.block_temp_rise_per_flux*self.state.heat_flux if self.state.heater_block_enable else 0.0)
+        self.block_temp_c += (block_target - self.block_temp_c) * min(dt/self.block_time_constant_s, 1.0)
+
+        self.set('time_ms', int(t*1e3) % 2**32)
+        self.set('time_us', int(t*1e6) % 2**32)
+        self.set('inlet_fluid_temp_c', self.inlet_fluid_temp_c + self.rng.normal(0, self.noise_c))
+        noise = self.rng.normal(0, self.noise_c, 14)
+        for i in range(12):
+            # Channel thermistors get closer to the heater block temperature further down the channel
+            fraction = 0.2 + 0.6*i/11
+            self.set(f'thermistor_{i+1}_temp_c', self.inlet_fluid_temp_c + fraction*(self.block_temp_c - self.inlet_fluid_temp_c) + noise[i])
+        self.set('thermistor_13_temp_c', self.block_temp_c + noise[12])
+        self.set('thermistor_14_temp_c', self.block_temp_c + noise[13])
+
+
+class DriverEmulator(TeensyEmulator):
+    """Emulates src/main_Driver.cpp: echoes the piezo settings and sends the inlet and outlet flow rates.
+    The flow rate picks up a small oscillation at the piezo frequency while a piezo is enabled."""
+    base_flow_ml_min = 50.0
+    noise_ml_min = 0.2
+
+    def __init__(self, com_port: str, data_rate: float = 25, log: Optional[logging.Logger] = None, seed: Optional[int] = None,
+                 samples_per_frame: int = 1, checksum: str = 'xor'):
+        super().__init__('driver', driver_input_struct_def, driver_output_struct_def, com_port, data_rate, log, seed, samples_per_frame, checksum)
+        for field in ['signal_type_piezo_1', 'signal_type_piezo_2', 'piezo_1_freq_hz', 'piezo_2_freq_hz',
+                      'piezo_1_vpp', 'piezo_2_vpp', 'piezo_1_phase_deg', 'piezo_2_phase_deg']:
+            self.set(field, 0)
+        self.set('piezo_1_enable', False)
+        self.set('piezo_2_enable', False)
+
+    def apply_command(self):
+        if self.command.reset_time:
+            self.reset_time()
+        for field in self.command.struct_def.keys():
+            if field not in ['reset_time', 'pc_seq']:
+                self.set(field, getattr(self.command, field))
+
+    def update_state(self, t: float, dt: float):
+        flow = self.base_flow_ml_min
+        for piezo in [1, 2]:
+            if getattr(self.state, f'piezo_{piezo}_enable'):
+                amplitude = 0.01*getattr(self.state, f'piezo_{piezo}_vpp')
+                flow += amplitude*np.sin(2*np.pi*getattr(self.state, f'piezo_{piezo}_freq_hz')*t + np.deg2rad(getattr(self.state, f'piezo_{piezo}_phase_deg')))
+        self.set('time_ms', int(t*1e3) % 2**32)
+        self.set('time_us', int(t*1e6) % 2**32)
+        self.set('inlet_flow_sensor_ml_min', flow + self.rng.normal(0, self.noise_ml_min))
+        self.set('outlet_flow_sensor_ml_min', flow + self.rng.normal(0, self.noise_ml_min))
+
+
+async def run_emulators(emulators: list[TeensyEmulator]):
+    """Run the emulators until cancelled"""
+    await asyncio.gather(*(emulator.run() for emulator in emulators))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate the Monitor and Driver Teensys for the HX2.5 PC Controller")
+    parser.add_argument('--transport', choices=['socket', 'pty'], default='socket', help="Connect over a local socket or a pty pair")
+    parser.add_argument('--monitor-port', type=int, default=5001, help="Local socket port of the monitor emulator")
+    parser.add_argument('--driver-port', type=int, default=5002, help="Local socket port of the driver emulator")
+    parser.add_argument('--rate', type=float, default=25, help="Number of samples sent per second by each emulator")
+    parser.add_argument('--checksum', choices=['xor', 'crc16'], default='xor', help="Checksum of the frames, the PC side must use the same one")
+    parser.add_argument('--samples-per-frame', type=int, default=1, help="Number of samples per extended frame, 1 to send standard frames")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.transport == 'pty':
+        monitor = MonitorEmulator('pty', args.rate, samples_per_frame=args.samples_per_frame, checksum=args.checksum)
+        driver = DriverEmulator('pty', args.rate, samples_per_frame=args.samples_per_frame, checksum=args.checksum)
+        print(f"Monitor com_port: {monitor.slave_path}\nDriver com_port: {driver.slave_path}")
+    else:
+        monitor = MonitorEmulator(f"socket://localhost:{args.monitor_port}", args.rate, samples_per_frame=args.samples_per_frame, checksum=args.checksum)
+        driver = DriverEmulator(f"socket://localhost:{args.driver_port}", args.rate, samples_per_frame=args.samples_per_frame, checksum=args.checksum)
+        print(f"Monitor com_port: socket://localhost:{args.monitor_port}\nDriver com_port: socket://localhost:{args.driver_port}")
+    asyncio.run(run_emulators([monitor, driver]))
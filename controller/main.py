@@ -13,8 +13,10 @@ import asyncio
 from PySide6.QtWidgets import QApplication
 from qasync import QEventLoop
 from python_EasyTransfer.pyEasyTransfer import PyEasyTransfer
+from python_EasyTransfer.acquisition_process import AcquisitionProcess
 from python_EasyTransfer.ETData import ETDataArrays
 from application import MainWindow
+from struct_defs import monitor_input_struct_def, monitor_output_struct_def, driver_input_struct_def, driver_output_struct_def
 import logger
 
 from typing import Optional
@@ -91,103 +93,39 @@ class HXController:
         await serial_connection.close()
 
 
-# Input data from the monitor serial connection struct definition, exactly as defined in the Arduino code
-monitor_input_struct_def = {"time_ms": np.uint32,
-                            "time_us": np.uint32,
-                            "inlet_fluid_temp_c": np.float32,
-                            "inlet_fluid_temp_setpoint_c": np.float32,
-                            "heater_block_enable": np.bool_,
-                            "rope_heater_enable": np.bool_,
-                            "heat_flux": np.float32,
-                            "thermistor_1_temp_c": np.float32,
-                            "thermistor_2_temp_c": np.float32,
-                            "thermistor_3_temp_c": np.float32,
-                            "thermistor_4_temp_c": np.float32,
-                            "thermistor_5_temp_c": np.float32,
-                            "thermistor_6_temp_c": np.float32,
-                            "thermistor_7_temp_c": np.float32,
-                            "thermistor_8_temp_c": np.float32,
-                            "thermistor_9_temp_c": np.float32,
-                            "thermistor_10_temp_c": np.float32,
-                            "thermistor_11_temp_c": np.float32,
-                            "thermistor_12_temp_c": np.float32,
-                            "thermistor_13_temp_c": np.float32,
-                            "thermistor_14_temp_c": np.float32
-                            }
-
-# Output data to the monitor serial connection struct definition, exactly as defined in the Arduino code
-monitor_output_struct_def    = {"reset_time": np.bool_,
-                                "heater_block_enable": np.bool_,
-                                "rope_heater_enable": np.bool_,
-                                "heat_flux": np.float32,
-                                "inlet_fluid_temp_setpoint_c": np.float32
-                                }
-
-# Input data from the driver serial connection struct definition, exactly as defined in the Arduino code
-driver_input_struct_def = {"time_ms": np.uint32,
-                           "time_us": np.uint32,
-                           "signal_type_piezo_1": np.uint8,
-                           "signal_type_piezo_2": np.uint8,
-                           "piezo_1_enable": np.bool_,
-                           "piezo_2_enable": np.bool_,
-                           "piezo_1_freq_hz": np.float32,
-                           "piezo_2_freq_hz": np.float32,
-                           "piezo_1_vpp": np.float32,
-                           "piezo_2_vpp": np.float32,
-                           "piezo_1_phase_deg": np.float32,
-                           "piezo_2_phase_deg": np.float32,
-                           "inlet_flow_sensor_ml_min": np.float32,
-                           "outlet_flow_sensor_ml_min": np.float32
-                           }
-
-# Output data to the driver serial connection struct definition, exactly as defined in the Arduino code
-driver_output_struct_def = {"reset_time": np.bool_,
-                            "signal_type_piezo_1": np.uint8,
-                            "signal_type_piezo_2": np.uint8,
-                            "piezo_1_enable": np.bool_,
-                            "piezo_2_enable": np.bool_,
-                            "piezo_1_freq_hz": np.float32,
-                            "piezo_2_freq_hz": np.float32,
-                            "piezo_1_vpp": np.float32,
-                            "piezo_2_vpp": np.float32,
-                            "piezo_1_phase_deg": np.float32,
-                            "piezo_2_phase_deg": np.float32,
-                            }
-
-valve_input_struct_def = {"time_ms": np.uint32,
-                          "time_us": np.uint32,
-                          "valve_flow_rate_ml_min": np.float32}
-
-valve_output_struct_def = {"reset_time": np.bool_}
-
 if __name__ == "__main__":
     # Define the log output path
     log_dir             = os.path.join(os.getcwd(), 'logs')
     baud_rate           = 115200
     byte_format         = 'little-endian'
     input_data_rate     = 25                # Number of data points received per second (get from arduino code)
+    send_window         = 0.02              # Number of seconds over which updates to the output data are merged into one frame
+    acquisition_process = False             # Read each serial port in its own worker process, so the GUI never delays reading
     test_time           = 10*60             # Number of seconds to run the test for
-    max_ele             = int(input_data_rate*test_time*1.5)
-    monitor_save_read_data  = ETDataArrays(monitor_input_struct_def, name='monitor', max_elements=max_ele)     # initialize for test with some extra space
-    driver_save_read_data   = ETDataArrays(driver_input_struct_def, name='driver', max_elements=max_ele)       # initialize for test with some extra space
+    chunk_size          = 4096              # Number of data points allocated at a time as the saved data grows, no limit on the length of a test
+    monitor_save_read_data  = ETDataArrays(monitor_input_struct_def, name='monitor', max_elements=0, chunk_size=chunk_size)
+    driver_save_read_data   = ETDataArrays(driver_input_struct_def, name='driver', max_elements=0, chunk_size=chunk_size)
     
-    monitor_interface  = PyEasyTransfer(com_port="COM9", 
+    interface_class = AcquisitionProcess if acquisition_process else PyEasyTransfer
+    monitor_interface  = interface_class(com_port="COM9", 
                                         baud_rate=baud_rate, 
                                         input_struct_def=monitor_input_struct_def, 
                                         output_struct_def=monitor_output_struct_def,
                                         byte_format=byte_format, 
                                         mode='both', 
                                         save_read_data=monitor_save_read_data,
-                                        name="monitor")
+                                        name="monitor",
+                                        send_window=send_window)
     
-    driver_interface   = PyEasyTransfer(com_port="COM12",
+    driver_interface   = interface_class(com_port="COM12",
                                         baud_rate=baud_rate,
                                         input_struct_def=driver_input_struct_def,
                                         output_struct_def=driver_output_struct_def,
                                         byte_format=byte_format,
                                         mode='both',
                                         save_read_data=driver_save_read_data,
-                                        name="driver")
+                                        name="driver",
+                                        send_window=send_window)
     
     controller = HXController(log_dir=log_dir, 
                               monitor_serial_interface=monitor_interface, 
@@ -0,0 +1,75 @@
+"""Struct definitions for the EasyTransfer data sent between the PC and the Teensys, exactly as defined in the Arduino code"""
+import numpy as np
+
+# Input data from the monitor serial connection struct definition, exactly as defined in the Arduino code
+monitor_input_struct_def = {"time_ms": np.uint32,
+                            "time_us": np.uint32,
+                            "inlet_fluid_temp_c": np.float32,
+                            "inlet_fluid_temp_setpoint_c": np.float32,
+                            "heater_block_enable": np.bool_,
+                            "rope_heater_enable": np.bool_,
+                            "heat_flux": np.float32,
+                            "thermistor_1_temp_c": np.float32,
+                            "thermistor_2_temp_c": np.float32,
+                            "thermistor_3_temp_c": np.float32,
+                            "thermistor_4_temp_c": np.float32,
+                            "thermistor_5_temp_c": np.float32,
+                            "thermistor_6_temp_c": np.float32,
+                            "thermistor_7_temp_c": np.float32,
+                            "thermistor_8_temp_c": np.float32,
+                            "thermistor_9_temp_c": np.float32,
+                            "thermistor_10_temp_c": np.float32,
+                            "thermistor_11_temp_c": np.float32,
+                            "thermistor_12_temp_c": np.float32,
+                            "thermistor_13_temp_c": np.float32,
+                            "thermistor_14_temp_c": np.float32,
+                            "pc_seq_received": np.uint32
+                            }
+
+# Output data to the monitor serial connection struct definition, exactly as defined in the Arduino code
+monitor_output_struct_def    = {"reset_time": np.bool_,
+                                "heater_block_enable": np.bool_,
+                                "rope_heater_enable": np.bool_,
+                                "heat_flux": np.float32,
+                                "inlet_fluid_temp_setpoint_c": np.float32,
+                                "pc_seq": np.uint32
+                                }
+
+# Input data from the driver serial connection struct definition, exactly as defined in the Arduino code
+driver_input_struct_def = {"time_ms": np.uint32,
+                           "time_us": np.uint32,
+                           "signal_type_piezo_1": np.uint8,
+                           "signal_type_piezo_2": np.uint8,
+                           "piezo_1_enable": np.bool_,
+                           "piezo_2_enable": np.bool_,
+                           "piezo_1_freq_hz": np.float32,
+                           "piezo_2_freq_hz": np.float32,
+                           "piezo_1_vpp": np.float32,
+                           "piezo_2_vpp": np.float32,
+                           "piezo_1_phase_deg": np.float32,
+                           "piezo_2_phase_deg": np.float32,
+                           "inlet_flow_sensor_ml_min": np.float32,
+                           "outlet_flow_sensor_ml_min": np.float32,
+                           "pc_seq_received": np.uint32
+                           }
+
+# Output data to the driver serial connection struct definition, exactly as defined in the Arduino code
+driver_output_struct_def = {"reset_time": np.bool_,
+                            "signal_type_piezo_1": np.uint8,
+                            "signal_type_piezo_2": np.uint8,
+                            "piezo_1_enable": np.bool_,
+                            "piezo_2_enable": np.bool_,
+                            "piezo_1_freq_hz": np.float32,
+                            "piezo_2_freq_hz": np.float32,
+                            "piezo_1_vpp": np.float32,
+                            "piezo_2_vpp": np.float32,
+                            "piezo_1_phase_deg": np.float32,
+                            "piezo_2_phase_deg": np.float32,
+                            "pc_seq": np.uint32
+                            }
+
+valve_input_struct_def = {"time_ms": np.uint32,
+                          "time_us": np.uint32,
+                          "valve_flow_rate_ml_min": np.float32}
+
+valve_output_struct_def = {"reset_time": np.bool_}
@@ -34,6 +34,7 @@ struct __attribute__((packed)) dataSave {
     float thermistor_12_temp_c;             // Temperature of the thermistor 12 in deg C
     float thermistor_13_temp_c;             // Temperature of the thermistor 13 in deg C
     float thermistor_14_temp_c;             // Temperature of the thermistor 14 in deg C
+    uint32_t pc_seq_received;               // pc_seq of the last command received from the PC, used by the PC to measure the round-trip time
 } monitor_to_pc_data;
 
 struct __attribute__((packed)) dataPCtoMonitor {
@@ -42,6 +43,7 @@ struct __attribute__((packed)) dataPCtoMonitor {
     bool rope_heater_enable;                // Enable/disable the rope heater
     float heat_flux;                        // Heat flux of the heaters in W/m^2
     float inlet_fluid_temp_setpoint;        // Setpoint for the inlet fluid temperature, can change this on the screen
+    uint32_t pc_seq;                        // Sequence number of the command, echoed back in pc_seq_received
 } pc_to_monitor_data;
 
 
@@ -61,6 +63,7 @@ struct __attribute((packed)) dataDriverToPC {
     float piezo_2_phase;            // Phase of right channel signal in degrees
     float inlet_flow_sensor_ml_min;         // mL/min from the inlet flow sensor
     float outlet_flow_sensor_ml_min;        // mL/min from the outlet flow sensor
+    uint32_t pc_seq_received;               // pc_seq of the last command received from the PC, used by the PC to measure the round-trip time
 } driver_to_pc_data;
 
 struct __attribute__((packed)) dataPCtoDriver {
@@ -75,6 +78,7 @@ struct __attribute__((packed)) dataPCtoDriver {
     float piezo_2_vpp;          // Amplitude of right channel sine wave in voltage p-p need to make sure this is divided by 100 for signal
     float piezo_1_phase;        // Phase of left channel signal in degrees
     float piezo_2_phase;        // Phase of right channel signal in degrees
+    uint32_t pc_seq;            // Sequence number of the command, echoed back in pc_seq_received
 } pc_to_driver_data;
 
 
@@ -0,0 +1,55 @@
+#ifndef _ET_EXTENDED_H_
+#define _ET_EXTENDED_H_
+
+#pragma once
+#include <Arduino.h>          // Arduino library for Arduino specific types
+
+
+// ------------------ EXTENDED EASYTRANSFER FRAMES ------------------ //
+// Sends N consecutive samples of a packed struct in one frame, decoded on the PC with input_framing='extended'
+// (see python_EasyTransfer/extended_framing.py). The frame is:
+//     0x06 0x85 | uint16 length (2 + count*sizeof(T)) | uint16 count | count structs | XOR checksum of the length, count and structs
+// The uint16 fields are little-endian, the same as the Teensy.
+template <typename T, uint16_t N>
+class ETExtendedSender {
+    static_assert(2 + (uint32_t)N * sizeof(T) <= 0xFFFF, "The samples of one frame must fit in the uint16 length field");
+
+  public:
+    void begin(Stream *stream) {
+        _stream = stream;
+        _count = 0;
+    }
+
+    // Queue a sample, the frame is sent once N samples are queued
+    void add(const T &sample) {
+        _samples[_count++] = sample;
+        if (_count >= N) flush();
+    }
+
+    // Send the queued samples in one frame
+    void flush() {
+        if (_stream == nullptr || _count == 0) return;
+        const uint16_t length = sizeof(uint16_t) + _count * sizeof(T);
+        const uint8_t prefix[4] = {lowByte(length), highByte(length), lowByte(_count), highByte(_count)};
+        const uint8_t *data = reinterpret_cast<const uint8_t *>(_samples);
+        uint8_t checksum = 0;
+        for (uint8_t i = 0; i < sizeof(prefix); i++) checksum ^= prefix[i];
+        for (uint32_t i = 0; i < (uint32_t)_count * sizeof(T); i++) checksum ^= data[i];
+
+        _stream->write((uint8_t)0x06);
+        _stream->write((uint8_t)0x85);
+        _stream->write(prefix, sizeof(prefix));
+        _stream->write(data, (uint32_t)_count * sizeof(T));
+        _stream->write(checksum);
+        _count = 0;
+    }
+
+    uint16_t pending() const { return _count; }
+
+  private:
+    Stream *_stream = nullptr;
+    T _samples[N];
+    uint16_t _count = 0;
+};
+
+#endif
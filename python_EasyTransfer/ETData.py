@@ -1,4 +1,8 @@
-from dataclasses import dataclass
+from bisect import bisect_right
+from dataclasses import dataclass, field
+import json
+import os
+from typing import Optional
 import numpy as np
 
 """ Numpy dtypes for C/Arduino types
@@ -47,19 +51,96 @@ Note: The struct_def MUST be a dictionary with the following format:
     The struct_def MUST be in the same order as the data is received from the serial connection, as well as correct types.
 """
 
-"""IO Data Class for single element of input data. Can be used to send, receive, and store data for a single element"""
+_RECORD_CLASSES: dict[tuple, type] = {}    # ETData subclasses with a property per field, by base class and field names
+
+
+def _cast_field_value(scalar_type: type, value):
+    """Return value cast to the numpy scalar_type of a field, or None if the cast would change it: an integer out of range or 
+    a float with a fraction for an integer field, anything but 0 or 1 for a bool field, or an overflow for a float field 
+    (float fields round values to their precision)."""
+    try:
+        if scalar_type is np.bool_:
+            if isinstance(value, (int, np.integer, np.bool_)) and value in (0, 1):
+                return np.bool_(value)
+        elif issubclass(scalar_type, np.integer):
+            if isinstance(value, (int, np.integer)) or (isinstance(value, (float, np.floating)) and float(value).is_integer()):
+                info = np.iinfo(scalar_type)
+                if info.min <= int(value) <= info.max:
+                    return scalar_type(int(value))
+        elif isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_)):
+            with np.errstate(over='ignore'):
+                cast = scalar_type(value)
+            if np.isfinite(cast) or not np.isfinite(value):
+                return cast
+    except OverflowError:
+        pass
+    return None
+
+
+def _field_property(variable: str) -> property:
+    """Return the property exposing one field of the record of an ETData. A read creates the numpy scalar from the 0-d view 
+    (about 0.1 us, a few times a plain attribute). Keeping the value read as a plain attribute would need a __setattr__ and 
+    an invalidation at each decode, which cost more on the receive path than they save on the reads."""
+    def get_field(self):
+        return self._field_views[variable][()]
+
+    def set_field(self, value):
+        accepted_types = self._accepted_types[variable]
+        if type(value) not in accepted_types:
+            value = _cast_field_value(accepted_types[0], value)
+            if value is None:
+                raise TypeError(f"'{self.name}': The value for {variable} can not be stored as {accepted_types[0]} without loss")
+        self._field_views[variable][()] = value
+
+    return property(get_field, set_field, doc=f"The {variable} field of the record")
+
+
+def _record_class(cls: type, variables: tuple[str, ...]) -> type:
+    """Return the subclass of cls with a property for each of the variables, created once per set of variables"""
+    key = (cls, variables)
+    if key not in _RECORD_CLASSES:
+        _RECORD_CLASSES[key] = type(cls.__name__, (cls,), {variable: _field_property(variable) for variable in variables})
+    return _RECORD_CLASSES[key]
+
+
+def _restore_etdata(struct_def: dict[str, np.dtype], name: str, io_count: int, host_time_ns: int, record_dtype: np.dtype, record: bytes) -> 'ETData':
+    """Unpickle an ETData, the record subclasses are created at runtime so they can not be pickled by reference"""
+    data = ETData(struct_def, name, io_count, host_time_ns, record_dtype)
+    data.record_bytes[:] = record
+    return data
+
+
+"""IO Data Class for single element of input data. Can be used to send, receive, and store data for a single element.
+The values are stored in a one element numpy structured array (record), and each struct_def variable is a property reading or 
+writing its field of the record. PyEasyTransfer uses the dtype of the packets on the link as the record_dtype, so decoding a packet 
+is a single copy of its bytes into the record, and encoding one a single copy out of it."""
 @dataclass
 class ETData:
     struct_def: dict[str, np.dtype]         # This is the dictionary which defines the data structure of the input/output data
     name: str                               # This is the name of the class, used in saving the data to a file as default
     io_count: int = 0                       # This is the number of elements in the numpy arrays which have been filled, keep at zero when initializing the class
+    host_time_ns: int = 0                   # Host time.perf_counter_ns() when the data was received, set by PyEasyTransfer
+    record_dtype: Optional[np.dtype] = field(default=None, repr=False)     # Structured dtype of the record with the struct_def fields, packed in native byte order if not given
     
     def __post_init__(self):
-        # Set the attributes of the class to match the struct_def and init the numpy arrays
-        for variable, _dtype in self.struct_def.items():
-            setattr(self, variable, _dtype)
+        if self.record_dtype is None:
+            self.record_dtype = np.dtype([(variable, _dtype) for variable, _dtype in self.struct_def.items()])
+        self.record_dtype = np.dtype(self.record_dtype)
+        if self.record_dtype.names != tuple(self.struct_def.keys()):
+            raise ValueError(f"'{self.name}': The fields of the record_dtype {self.record_dtype.names} do not match the struct_def {tuple(self.struct_def.keys())}")
+        # The record holding the values, with a view of each field and the raw bytes in the layout of the record_dtype
+        self.record = np.zeros(1, dtype=self.record_dtype)
+        self.record_bytes = memoryview(self.record.view(np.uint8))
+        self._field_views = {variable: self.record[variable].reshape(()) for variable in self.struct_def}     # 0-d views, indexed with [()]
+        # Python bools are accepted for np.bool_ fields, the same as ETCodec.encode, other values are cast if that keeps them
+        self._accepted_types = {variable: (np.dtype(_dtype).type, bool) if np.dtype(_dtype).type is np.bool_ else (np.dtype(_dtype).type,)
+                                for variable, _dtype in self.struct_def.items()}
+        self.__class__ = _record_class(type(self), tuple(self.struct_def))
         # Calculate the number of bytes in the struct_def
         self.struct_bytes = np.sum([np.dtype(dtype).itemsize for dtype in self.struct_def.values()]) 
+
+    def __reduce__(self):
+        return _restore_etdata, (self.struct_def, self.name, self.io_count, self.host_time_ns, self.record_dtype, self.record_bytes.tobytes())
     
     def populate_dummy_data(self):
         """Populate dummy data for the input/output data"""
@@ -69,20 +150,272 @@ class ETData:
             else:
                 setattr(self, variable, np.random.choice([True, False]))
 
-"""IO Data Class for input/output data. Can be used to send, receive, and store data for multiple elements"""
+
+CHUNK_SIZE = 64*1024                        # Default number of rows allocated at a time by a chunked ETDataArrays
+FILE_FORMAT_VERSION = 1                     # Version of the rows file layout of a file backed ETDataArrays
+ROWS_FILE_EXTENSION = '.rows'              # Extension of the rows file of a file backed ETDataArrays, see utils.start_ETDataArrays_file
+FILE_SIDECAR_SUFFIX = '.json'               # Suffix of the JSON file next to the rows file, holding the struct_def and the io_count of the last flush
+
+
+def dtype_to_json(dtype: np.dtype) -> dict:
+    """Describe a structured dtype, including its offsets, so it can be rebuilt with np.dtype in another process or from a file"""
+    return {'names': list(dtype.names), 'formats': [dtype.fields[name][0].str for name in dtype.names],
+            'offsets': [dtype.fields[name][1] for name in dtype.names], 'itemsize': dtype.itemsize}
+
+
+"""IO Data Class for input/output data. Can be used to send, receive, and store data for multiple elements.
+The elements are stored as the rows of one numpy structured array (records), and each struct_def variable is a zero-copy view of 
+its field, so getattr(data, variable) returns the array of that variable. Appending an element or a block of decoded records is a 
+single slice assignment, a copy of the bytes when the record_dtype matches the packets.
+
+With a chunk_size the rows are allocated chunk_size at a time as they are appended instead of max_elements up front, and 
+max_elements is only a limit if it is positive. The records, host_time_ns, record_bytes and the variable arrays are then 
+materialized when they are first read after an append: the chunks are merged into one array of io_count rows, which the views 
+point into, so the memory stays proportional to the number of elements recorded.
+
+With a file_path the rows are written to a memory mapped file instead, growing by chunk_size rows (or max_elements rows up front). 
+Each row of the file is the record followed by its int64 host_time_ns, and the materialized arrays are views of the whole file. 
+flush writes the rows to the disk and the io_count to the sidecar file, open_file maps the file again, e.g. after a crash."""
 @dataclass
 class ETDataArrays:
     struct_def: dict[str, np.dtype]         # This is the dictionary which defines the data structure
     max_elements: int                       # This is the default size of the numpy arrays, set when initializing the class    
     name: str                               # This is the name of the class, used in saving the data to a file as default
     io_count: int = 0                       # This is the number of elements in the numpy arrays which have been filled, keep at zero when initializing the class
+    record_dtype: Optional[np.dtype] = field(default=None, repr=False)     # Structured dtype of the rows, packed in native byte order (the packets of a little-endian link on the PC) if not given
+    chunk_size: int = 0                     # Number of rows allocated at a time as the arrays grow, 0 to allocate max_elements rows up front
+    file_path: Optional[str] = None         # Path of the memory mapped file the rows are written to instead of the RAM, see start_file
     
     def __post_init__(self):
-        # Set the attributes of the class to match the struct_def and init the numpy arrays
-        for variable, _dtype in self.struct_def.items():
-            setattr(self, variable, np.full(shape=int(self.max_elements), dtype=_dtype, fill_value=np.nan))     # Fill with np.nan for easy identification of empty elements
+        if self.record_dtype is None:
+            self.record_dtype = np.dtype([(variable, _dtype) for variable, _dtype in self.struct_def.items()])
+        self.record_dtype = np.dtype(self.record_dtype)
+        if self.record_dtype.names != tuple(self.struct_def.keys()):
+            raise ValueError(f"'{self.name}': The fields of the record_dtype {self.record_dtype.names} do not match the struct_def {tuple(self.struct_def.keys())}")
+        if self.chunk_size < 0:
+            raise ValueError(f"'{self.name}': Invalid chunk_size {self.chunk_size}, must be positive or 0 for no chunks")
+        self._matching_dtype = self.record_dtype        # Last dtype found equal to the record_dtype, comparing structured dtypes is slow
         # Calculate the number of bytes in the struct_def
         self.struct_bytes = np.sum([np.dtype(dtype).itemsize for dtype in self.struct_def.values()]) 
+        if self.file_path:
+            file_path, self.file_path = self.file_path, None
+            self.start_file(file_path)
+        elif self.chunk_size:
+            self._init_chunks([])
+        else:
+            # Init the rows, and set the attributes of the class to the views of the fields
+            self.records = np.zeros(int(self.max_elements), dtype=self.record_dtype)
+            for variable in self.struct_def.keys():
+                if np.issubdtype(self.records.dtype[variable], np.floating):
+                    self.records[variable] = np.nan     # Fill float fields with np.nan for easy identification of empty elements, others stay 0
+            self.host_time_ns = np.zeros(shape=int(self.max_elements), dtype=np.int64)     # Host time.perf_counter_ns() when each element was received, not part of the struct_def
+            self._create_views()
+
+    def _create_views(self):
+        """Set the attribute of each struct_def variable to the view of its field in the records, and create the byte view of the rows"""
+        for variable in self.struct_def.keys():
+            setattr(self, variable, self.records[variable])
+        self.record_bytes = self.records.view(np.uint8).reshape(len(self.records), self.record_dtype.itemsize)    # One row of bytes per element
+
+    def _init_chunks(self, chunks: list[tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        """Set the chunks of a chunked or file backed ETDataArrays, a list of (records, record_bytes, host_time_ns) arrays"""
+        self._chunks = []                       # (records, record_bytes, host_time_ns) of each chunk
+        self._chunk_starts = []                 # Index of the first element of each chunk
+        self._capacity = 0                      # Number of rows of all chunks
+        self._views = None                      # The materialized arrays, until the next append or change of the io_count
+        self._views_count = 0                   # The io_count of the materialized arrays
+        for chunk in chunks:
+            self._add_chunk(*chunk)
+
+    def _add_chunk(self, records: np.ndarray, record_bytes: np.ndarray, host_time_ns: np.ndarray):
+        """Append a chunk of rows to the storage of a chunked or file backed ETDataArrays"""
+        self._chunks.append((records, record_bytes, host_time_ns))
+        self._chunk_starts.append(self._capacity)
+        self._capacity += len(records)
+
+    def _ram_chunk(self, records: np.ndarray, host_time_ns: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the (records, record_bytes, host_time_ns) of a chunk of rows in the RAM"""
+        return records, records.view(np.uint8).reshape(len(records), self.record_dtype.itemsize), host_time_ns
+
+    def _file_chunk(self, start: int, num_rows: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Map the rows start to start + num_rows of the file, extending it if needed, and return the (records, record_bytes, host_time_ns) of the chunk"""
+        rows = np.memmap(self.file_path, dtype=self._row_dtype, mode=self._file_mode, offset=start*self._row_dtype.itemsize, shape=num_rows)
+        self._maps.append(rows)
+        rows = rows.view(np.ndarray)            # Slicing a memmap is slower, the memmap is only kept to flush it
+        record_bytes = rows.view(np.uint8).reshape(num_rows, self._row_dtype.itemsize)[:, :self.record_dtype.itemsize]
+        return rows['record'], record_bytes, rows['host_time_ns']
+
+    def _materialize(self) -> dict[str, np.ndarray]:
+        """Return the arrays of a chunked or file backed ETDataArrays. Several chunks are merged into one array with room to grow, 
+        or mapped again as one array for a file."""
+        if self._views is None or self._views_count != self.io_count:
+            filled = min(self.io_count, self._capacity)
+            if len(self._chunks) > 1 and self.file_path:
+                self._maps = []
+                self._init_chunks([self._file_chunk(0, self._capacity)])
+            elif len(self._chunks) != 1:
+                # The merged array keeps the unfilled rows and at least doubles, the next appends are written to it until it is full,
+                # so each row is copied a bounded number of times however often the arrays are read while they grow
+                num_rows = max(self._capacity, 2*len(self._chunks[0][0]) if self._chunks else 0)
+                if self.max_elements > 0:
+                    num_rows = max(self._capacity, min(num_rows, int(self.max_elements)))
+                records = np.empty(num_rows, dtype=self.record_dtype)
+                host_time_ns = np.zeros(num_rows, dtype=np.int64)
+                for (chunk_records, _, chunk_host_time_ns), start in zip(self._chunks, self._chunk_starts):
+                    if start >= filled:
+                        break
+                    stop = min(start + len(chunk_records), filled)
+                    records[start:stop] = chunk_records[:stop-start]
+                    host_time_ns[start:stop] = chunk_host_time_ns[:stop-start]
+                self._init_chunks([self._ram_chunk(records, host_time_ns)])
+            records, record_bytes, host_time_ns = self._chunks[0]
+            self._views = {variable: records[variable][:filled] for variable in self.struct_def.keys()}
+            self._views.update(records=records[:filled], record_bytes=record_bytes[:filled], host_time_ns=host_time_ns[:filled])
+            self._views_count = self.io_count
+        return self._views
+
+    def __getattr__(self, name: str):
+        # Only called for the attributes which are not set, the materialized arrays of a chunked or file backed ETDataArrays
+        if '_chunks' in self.__dict__ and (name in ('records', 'record_bytes', 'host_time_ns') or name in self.struct_def):
+            return self._materialize()[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def _row_slices(self, num: int) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Return the (records, record_bytes, host_time_ns) slices of the rows for the next num elements, allocating chunks if needed.
+        Fewer rows are returned if the max_elements is reached."""
+        if self.max_elements > 0 or not self.chunk_size:
+            num = min(num, int(self.max_elements) - self.io_count)
+        if num <= 0:
+            return []
+        if '_chunks' not in self.__dict__:
+            stop = self.io_count + num
+            return [(self.records[self.io_count:stop], self.record_bytes[self.io_count:stop], self.host_time_ns[self.io_count:stop])]
+        self._views = None
+        while self._capacity < self.io_count + num:
+            num_rows = self.chunk_size or int(self.max_elements)
+            if self.file_path:
+                self._add_chunk(*self._file_chunk(self._capacity, num_rows))
+            else:
+                self._add_chunk(*self._ram_chunk(np.empty(num_rows, dtype=self.record_dtype), np.zeros(num_rows, dtype=np.int64)))
+        slices = []
+        index, stop = self.io_count, self.io_count + num
+        chunk = bisect_right(self._chunk_starts, index) - 1
+        while index < stop:
+            records, record_bytes, host_time_ns = self._chunks[chunk]
+            offset = index - self._chunk_starts[chunk]
+            end = min(len(records), offset + stop - index)
+            slices.append((records[offset:end], record_bytes[offset:end], host_time_ns[offset:end]))
+            index += end - offset
+            chunk += 1
+        return slices
+
+    def _map_file(self, file_path: str, mode: str):
+        """Keep the rows in the memory mapped file_path from now on, mapping the rows it already holds"""
+        for key in list(self.struct_def.keys()) + ['records', 'record_bytes', 'host_time_ns']:
+            self.__dict__.pop(key, None)        # Views of the preallocated rows, replaced by the materialized arrays
+        self.file_path = file_path
+        self._file_mode = mode
+        self._row_dtype = np.dtype([('record', self.record_dtype), ('host_time_ns', '<i8')])
+        self._maps = []                         # The memmaps of the chunks, see flush
+        self._init_chunks([])
+        num_rows = os.path.getsize(file_path) // self._row_dtype.itemsize
+        if num_rows:
+            self._add_chunk(*self._file_chunk(0, num_rows))
+
+    def _write_sidecar(self, io_count: int):
+        """Replace the sidecar file of the rows file, atomically so a crash leaves either the previous or the new one"""
+        sidecar = {'version': FILE_FORMAT_VERSION, 'name': self.name, 'struct_def': {variable: np.dtype(_dtype).str for variable, _dtype in self.struct_def.items()},
+                   'record_dtype': dtype_to_json(self.record_dtype), 'max_elements': int(self.max_elements), 'chunk_size': self.chunk_size, 'io_count': io_count}
+        sidecar_path = self.file_path + FILE_SIDECAR_SUFFIX
+        with open(sidecar_path + '.tmp', 'w') as f:
+            json.dump(sidecar, f)
+        os.replace(sidecar_path + '.tmp', sidecar_path)
+
+    def start_file(self, file_path: str):
+        """Write the rows to the new memory mapped file file_path from now on, starting again from io_count 0. 
+        The rows of a previous file are flushed and stay in it."""
+        if not self.chunk_size and self.max_elements <= 0:
+            raise ValueError(f"'{self.name}': A file backed ETDataArrays needs a chunk_size or a positive max_elements")
+        self.flush()
+        with open(file_path, 'wb'):
+            pass
+        self._map_file(file_path, 'r+')
+        self.io_count = 0
+        self._write_sidecar(0)
+
+    def flush(self):
+        """Write the rows of a file backed ETDataArrays to the disk and the io_count to its sidecar file, the rows up to it are recovered
+        by open_file after a crash. It can take a while on a slow disk, run it in a thread (asyncio.to_thread) to not block the event
+        loop, rows can be appended meanwhile."""
+        if self.file_path is None or self._file_mode == 'r':
+            return
+        io_count = self.io_count
+        for rows in list(self._maps):
+            rows.flush()
+        self._write_sidecar(io_count)
+
+    @classmethod
+    def open_file(cls, file_path: str, readonly: bool = True) -> 'ETDataArrays':
+        """Open the rows file of a file backed ETDataArrays, e.g. to recover a run after a crash.
+        The io_count is the one of the last flush plus the rows written after it, up to the first row without a host_time_ns. 
+        The file is mapped read-only unless readonly is False, then rows are appended from the io_count on."""
+        with open(file_path + FILE_SIDECAR_SUFFIX) as f:
+            sidecar = json.load(f)
+        if sidecar['version'] != FILE_FORMAT_VERSION:
+            raise ValueError(f"'{file_path}' has the file format version {sidecar['version']}, only version {FILE_FORMAT_VERSION} is supported")
+        record_dtype = np.dtype(sidecar['record_dtype'])
+        struct_def = {variable: np.dtype(_dtype) for variable, _dtype in sidecar['struct_def'].items()}
+        data = cls.__new__(cls)
+        data.__setstate__(dict(struct_def=struct_def, max_elements=sidecar['max_elements'], name=sidecar['name'], io_count=0, record_dtype=record_dtype,
+                               chunk_size=sidecar['chunk_size'], records=np.empty(0, dtype=record_dtype), host_time_ns=np.empty(0, dtype=np.int64)))
+        data._map_file(file_path, 'r' if readonly else 'r+')
+        io_count = min(sidecar['io_count'], data._capacity)
+        if data._chunks:
+            # Rows appended after the last flush are kept if their host_time_ns reached the file, the rows past the io_count are zeros
+            unflushed = np.flatnonzero(data._chunks[0][2][io_count:] == 0)
+            io_count = io_count + int(unflushed[0]) if len(unflushed) else data._capacity
+        data.io_count = io_count
+        return data
+
+    def __getstate__(self) -> dict:
+        # The views would be pickled as copies, only the records are saved
+        state = self.__dict__.copy()
+        if '_chunks' in state:
+            views = self._materialize()
+            if self.file_path:
+                # Pickled as a copy of the rows, which grows by chunks in the RAM when rows are appended to it
+                state.update(records=np.array(views['records']), host_time_ns=np.array(views['host_time_ns']), file_path=None, chunk_size=self.chunk_size or CHUNK_SIZE)
+            else:
+                state.update(records=views['records'], host_time_ns=views['host_time_ns'])
+            for key in ['_chunks', '_chunk_starts', '_capacity', '_views', '_views_count', '_maps', '_file_mode', '_row_dtype']:
+                state.pop(key, None)
+        for variable in list(self.struct_def.keys()) + ['record_bytes', '_matching_dtype']:
+            state.pop(variable, None)
+        return state
+
+    def __setstate__(self, state: dict):
+        if 'records' not in state:
+            # Saved with one array per variable, copy them into the rows
+            state['record_dtype'] = np.dtype([(variable, _dtype) for variable, _dtype in state['struct_def'].items()])
+            arrays = {variable: state.pop(variable) for variable in state['struct_def'].keys()}
+            state['records'] = np.empty(len(next(iter(arrays.values()))), dtype=state['record_dtype'])
+            for variable, array in arrays.items():
+                state['records'][variable] = array
+            state.setdefault('host_time_ns', np.zeros(len(state['records']), dtype=np.int64))
+        self.__dict__.update(state)
+        self._matching_dtype = self.record_dtype
+        if self.chunk_size:
+            self._init_chunks([self._ram_chunk(self.__dict__.pop('records'), self.__dict__.pop('host_time_ns'))])
+        else:
+            self._create_views()
+
+    def has_record_dtype(self, record_dtype: np.dtype) -> bool:
+        """Return True if records of record_dtype can be copied as bytes into the rows"""
+        if record_dtype is not self._matching_dtype:
+            if record_dtype != self.record_dtype:
+                return False
+            self._matching_dtype = record_dtype
+        return True
 
     def get_last_element(self, array):
         """Return the last element in the array"""
@@ -92,20 +425,73 @@ class ETDataArrays:
         """Return a numpy array of the values from the array between the start and last index"""
         return array[start_index:last_index]
     
+    def snapshot(self) -> 'ETDataArrays':
+        """Return a copy of the elements 0 to io_count in the RAM, which can be saved while this object keeps receiving"""
+        snapshot = ETDataArrays(self.struct_def, max_elements=self.io_count, name=self.name, record_dtype=self.record_dtype)
+        snapshot.append_records(self.records[:self.io_count], self.host_time_ns[:self.io_count])
+        return snapshot
+
+    def get_records(self, record_dtype: np.dtype = None) -> np.ndarray:
+        """Return a copy of the filled elements (0 to io_count) as a numpy structured array, with one field per struct_def variable.
+        If no record_dtype is given the record_dtype of the rows is used."""
+        if record_dtype is None:
+            return self.records[:self.io_count].copy()
+        return self.records[:self.io_count].astype(record_dtype)
+
+    def append_record(self, data: ETData) -> bool:
+        """Append the record of an ETData and its host_time_ns as the next element.
+        Returns False if the max_elements is reached and the element was not appended."""
+        slices = self._row_slices(1)
+        if not slices:
+            return False
+        records, record_bytes, host_time_ns = slices[0]
+        if self.has_record_dtype(data.record_dtype):
+            record_bytes[0] = data.record_bytes
+        else:
+            records[0] = data.record[0]
+        host_time_ns[0] = data.host_time_ns
+        self.io_count += 1
+        return True
+    
+    def append_records(self, records: np.ndarray, host_time_ns=None) -> int:
+        """Append a block of records (a numpy structured array with the struct_def fields) to the numpy arrays.
+        host_time_ns is the host receive time of the records, a single value or one per record.
+        Returns the number of records appended, which is less than the number given if the max_elements is reached."""
+        slices = self._row_slices(len(records))
+        matching = self.has_record_dtype(records.dtype)
+        if matching:
+            # Assigning structured arrays goes field by field, copy the bytes of the rows instead
+            source_bytes = np.ascontiguousarray(records).view(np.uint8).reshape(len(records), self.record_dtype.itemsize)
+        start = 0
+        for rows, row_bytes, row_host_time_ns in slices:
+            stop = start + len(rows)
+            if matching:
+                row_bytes[:] = source_bytes[start:stop]
+            elif records.dtype.names == self.record_dtype.names:
+                rows[:] = records[start:stop]
+            else:
+                for variable in self.struct_def.keys():
+                    rows[variable] = records[variable][start:stop]
+            if host_time_ns is not None:
+                row_host_time_ns[:] = host_time_ns if np.isscalar(host_time_ns) else host_time_ns[start:stop]
+            start = stop
+        self.io_count += start
+        return start
+    
     def add_dummy_data(self, num: int=1):
         """Add dummy data to the numpy arrays for elements io_count to io_count + num"""
         # First check to see that the number of elements to add to the io_count is less than the max_elements
-        if self.io_count + num > self.max_elements:
+        if (self.max_elements > 0 or not self.chunk_size) and self.io_count + num > self.max_elements:
             raise ValueError(f'Cannot add {num} elements to the numpy arrays because the io_count will be greater than the max_elements')
         
-        # Iterate over all the variables in the struct_def and add random data to the numpy arrays
-        for _ in range(num):
-            for variable, _dtype in self.struct_def.items():
-                if _dtype != np.bool_:
-                    getattr(self, variable)[self.io_count] = (np.random.rand(1)*100).astype(_dtype)[0]
-                else:
-                    getattr(self, variable)[self.io_count] = np.random.choice([True, False])
-            self.io_count += 1
+        # Iterate over all the variables in the struct_def and add random data to the records
+        records = np.empty(num, dtype=self.record_dtype)
+        for variable, _dtype in self.struct_def.items():
+            if _dtype != np.bool_:
+                records[variable] = (np.random.rand(num)*100).astype(_dtype)
+            else:
+                records[variable] = np.random.choice([True, False], num)
+        self.append_records(records)
     
 
 def test_io_data_arrays() -> None:
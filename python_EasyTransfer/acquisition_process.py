@@ -0,0 +1,365 @@
+import asyncio
+from dataclasses import asdict
+import logging
+import multiprocessing
+import threading
+import time
+from typing import Any, AsyncIterator, Optional
+import numpy as np
+from ETData import ETData, ETDataArrays
+from pyEasyTransfer import PyEasyTransfer, ResyncStats, SendStats, create_record_dtype
+from shared_ring import SharedRecordRing, RING_CAPACITY
+from frame_subscription import FRAMES_MAX_BATCH, FRAMES_MAXSIZE, FrameBatch, FrameBroadcaster
+
+POLL_INTERVAL = 0.02            # Seconds between two reads of the ring in the GUI process
+STATUS_INTERVAL = 0.5           # Seconds between two status messages of the worker process
+OPEN_TIMEOUT = 10.0             # Seconds to wait for the worker process to open the connection
+CLOSE_TIMEOUT = 5.0             # Seconds to wait for the worker process to exit before terminating it
+
+
+class _PipeLogHandler(logging.Handler):
+    """Forwards the log records of the worker process to the GUI process"""
+    def __init__(self, connection, level: int):
+        super().__init__(level)
+        self.connection = connection
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.connection.send(('log', (record.levelno, self.format(record))))
+        except (OSError, ValueError):
+            pass
+
+
+def run_acquisition(ring_name: str, record_dtype: np.dtype, kwargs: dict, commands, status, log_level: int = logging.INFO):
+    """Entry point of the worker process, runs a PyEasyTransfer on its own event loop and appends the decoded records to the ring.
+
+    Args:
+        ring_name: str
+            The name of the SharedRecordRing created by the GUI process
+        record_dtype: np.dtype
+            The record dtype of the input struct_def
+        kwargs: dict
+            The keyword arguments of the PyEasyTransfer
+        commands: multiprocessing.connection.Connection
+            Receives the commands of the GUI process
+        status: multiprocessing.connection.Connection
+            Sends the status, log and error messages to the GUI process
+        log_level: int
+            The lowest level of the log records forwarded to the GUI process
+    """
+    log = logging.getLogger(f"{kwargs.get('name', 'acquisition')} worker")
+    log.setLevel(log_level)
+    log.addHandler(_PipeLogHandler(status, log_level))
+    log.propagate = False
+    asyncio.run(_acquire(ring_name, record_dtype, kwargs, commands, status, log))
+
+
+async def _acquire(ring_name: str, record_dtype: np.dtype, kwargs: dict, commands, status, log: logging.Logger):
+    """Open the connection, then run the commands of the GUI process until it sends 'stop'"""
+    loop = asyncio.get_running_loop()
+    ring = SharedRecordRing.attach(ring_name, record_dtype, readonly=False)
+    try:
+        et = PyEasyTransfer(**kwargs, save_read_data=ring, log=log)
+        et.start_saving()                   # Every record goes to the ring, the GUI process decides what to keep
+        await et.open()
+    except Exception as e:
+        status.send(('error', f"{type(e).__name__}: {e}"))
+        ring.close()
+        return
+    status.send(('opened', None))
+
+    # Commands are received on a thread, Connection.recv blocks and can not be awaited on every platform
+    queue: asyncio.Queue = asyncio.Queue()
+    def receive_commands():
+        while True:
+            try:
+                command = commands.recv()
+            except (EOFError, OSError):
+                command = ('stop', None)        # The GUI process is gone
+            loop.call_soon_threadsafe(queue.put_nowait, command)
+            if command[0] == 'stop':
+                return
+    threading.Thread(target=receive_commands, name='acquisition commands', daemon=True).start()
+
+    def send_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            log.error(f"Sending data failed: {task.exception()}")
+
+    async def send_status():
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            status.send(('status', {'resync': asdict(et.get_resync_stats()) if et.get_resync_stats() else None,
+                                    'rtt': et.get_rtt_stats(),
+                                    'arrival': et.arrival_stats.summary() if hasattr(et, 'arrival_stats') else None,
+                                    'send': asdict(et.send_stats)}))
+    status_task = loop.create_task(send_status())
+
+    try:
+        while True:
+            command, argument = await queue.get()
+            if command == 'send':
+                record, force = argument
+                et.write_data.record_bytes[:] = record
+                loop.create_task(et.send_data(force)).add_done_callback(send_done)     # The send scheduler merges the updates
+            elif command == 'start_capture':
+                et.start_capture(*argument)
+            elif command == 'stop_capture':
+                et.stop_capture()
+            elif command == 'stop':
+                break
+    finally:
+        status_task.cancel()
+        await et.close()
+        ring.close()
+
+
+class AcquisitionProcess:
+    """Runs a PyEasyTransfer in a worker process, so reading the serial port never waits behind the GUI.
+
+    The worker decodes the frames in batches and appends the records to a SharedRecordRing, which this (GUI) process maps
+    read-only. The records are copied out of the ring every poll_interval, into read_data and, while saving, into save_read_data.
+    The object has the interface of a PyEasyTransfer used by the GUI: read_data, write_data, save_read_data, open, close,
+    send_data, listen, start_saving, stop_saving, set_log, get_resync_stats and get_rtt_stats.
+    send_data returns once the write_data has been handed to the worker, which sends it with its send scheduler.
+
+    Args:
+        com_port, baud_rate, input_struct_def, output_struct_def, byte_format, mode, save_read_data, log, name:
+            The same as for PyEasyTransfer
+        ring_capacity: int
+            The number of records in the ring, the GUI process must read the ring before the worker writes this many records
+        poll_interval: float
+            The number of seconds between two reads of the ring
+        log_level: int
+            The lowest level of the worker log records forwarded to log
+        **kwargs:
+            Passed on to the PyEasyTransfer in the worker process, they must be picklable (e.g. no lambda connection_factory).
+            input_packet_types is not supported.
+    """
+    def __init__(self, com_port: str, baud_rate: int,
+                 input_struct_def: Optional[dict[str, np.dtype]] = None,
+                 output_struct_def: Optional[dict[str, np.dtype]] = None,
+                 byte_format: str = 'little-endian',
+                 mode: str = 'both',
+                 save_read_data: Optional[ETDataArrays] = None,
+                 log: logging.Logger = None,
+                 name: str = 'AcquisitionProcess',
+                 ring_capacity: int = RING_CAPACITY,
+                 poll_interval: float = POLL_INTERVAL,
+                 log_level: int = logging.INFO,
+                 **kwargs):
+        if mode not in ['input', 'output', 'both']:
+            raise ValueError("Invalid mode. Mode must be one of 'input', 'output', 'both'")
+        if mode in ['input', 'both'] and not input_struct_def:
+            raise ValueError("An input_struct_def must be provided when mode is 'input' or 'both'.")
+        if mode in ['output', 'both'] and not output_struct_def:
+            raise ValueError("An output_struct_def must be provided when mode is 'output' or 'both'.")
+        if kwargs.get('input_packet_types'):
+            raise ValueError("input_packet_types is not supported by AcquisitionProcess, the ring holds the records of one struct_def.")
+
+        self.com_port = com_port
+        self.baud_rate = baud_rate
+        self.mode = mode
+        self.name = name
+        self.log = log
+        self.log_level = log_level
+        self.ring_capacity = ring_capacity
+        self.poll_interval = poll_interval
+        self.save_read_data = save_read_data
+        self.start_saving_data = False
+        self.records_lost = 0                   # Number of records overwritten in the ring before this process read them
+        self.status: dict[str, Any] = {}        # Last status message of the worker process
+        self.process: Optional[multiprocessing.Process] = None
+        self.ring: Optional[SharedRecordRing] = None
+        self._position = 0                      # Write count of the ring up to which the records have been read
+        self._poll_task: Optional[asyncio.Task] = None
+        self._reading_paused = False            # True while a 'block' frames() subscriber is full, the records wait in the ring
+        self.frame_broadcaster = FrameBroadcaster(self._pause_reading, self._resume_reading)     # Hands the records read from the ring to the frames() subscribers
+        self._commands = None                   # Sends the commands to the worker process
+        self._status = None                     # Receives the status, log and error messages of the worker process
+        self._kwargs = dict(kwargs, com_port=com_port, baud_rate=baud_rate, input_struct_def=input_struct_def, output_struct_def=output_struct_def,
+                            byte_format=byte_format, mode=mode, name=name)
+        if self._kwargs.get('input_framing', 'standard') == 'standard':
+            self._kwargs['batch_decode'] = True     # The worker only hands blocks of records to the ring
+
+        if mode in ['input', 'both']:
+            self.record_dtype_read = create_record_dtype(byte_format, input_struct_def)
+            self.read_data = ETData(input_struct_def, name=name, record_dtype=self.record_dtype_read)
+        if mode in ['output', 'both']:
+            self.write_data = ETData(output_struct_def, name=name, record_dtype=create_record_dtype(byte_format, output_struct_def))     # The field types are checked when they are set
+
+    def set_log(self, log: logging.Logger):
+        """Set the log object"""
+        self.log = log
+
+    def start_saving(self, start_saving_data: bool = True):
+        """Start copying the records read from the ring to save_read_data"""
+        self.start_saving_data = start_saving_data
+
+    def stop_saving(self, stop_saving_data: bool = True):
+        """Stop copying the records read from the ring to save_read_data"""
+        self.start_saving_data = not stop_saving_data
+
+    def _send_command(self, command: str, argument: Any = None):
+        """Send a command to the worker process, which only exists between open() and close()"""
+        if self.process is None:
+            raise RuntimeError(f"'{self.name}': The acquisition process is not open, call open() first")
+        self._commands.send((command, argument))
+
+    def start_capture(self, capture_path: str, flush_interval: float = 0.25):
+        """Start writing every raw chunk received by the worker process to a capture file"""
+        self._send_command('start_capture', (capture_path, flush_interval))
+
+    def stop_capture(self):
+        """Stop the raw capture of the worker process"""
+        self._send_command('stop_capture')
+
+    def _pause_reading(self):
+        """Stop reading the ring, while a 'block' frames() subscriber is full"""
+        self._reading_paused = True
+
+    def _resume_reading(self):
+        """Resume reading the ring"""
+        self._reading_paused = False
+
+    def frames(self, max_batch: int = FRAMES_MAX_BATCH, maxsize: int = FRAMES_MAXSIZE, overflow: str = 'drop_oldest') -> AsyncIterator[FrameBatch]:
+        """Iterate over the records read from the ring as they are polled, until the process is closed, see PyEasyTransfer.frames.
+        A full 'block' subscriber stops the reading of the ring, the worker keeps acquiring until the ring laps the reader."""
+        if self.mode not in ['input', 'both']:
+            raise ValueError("The AcquisitionProcess object is not in input mode. There are no frames to subscribe to.")
+        return self.frame_broadcaster.frames(max_batch, maxsize, overflow)
+
+    def get_resync_stats(self) -> Optional[ResyncStats]:
+        """Return the frame resynchronization statistics of the worker process, as of its last status message"""
+        return ResyncStats(**self.status['resync']) if self.status.get('resync') else None
+
+    def get_rtt_stats(self) -> Optional[dict[str, float]]:
+        """Return the command round-trip time statistics of the worker process, as of its last status message"""
+        return self.status.get('rtt')
+
+    def get_send_stats(self) -> Optional[SendStats]:
+        """Return the send scheduler statistics of the worker process, as of its last status message"""
+        return SendStats(**self.status['send']) if self.status.get('send') else None
+
+    async def open(self):
+        """Start the worker process and wait for it to open the connection"""
+        record_dtype = self.record_dtype_read if self.mode in ['input', 'both'] else np.dtype([('unused', np.uint8)])
+        self.ring = SharedRecordRing.create(record_dtype, self.ring_capacity, readonly=True)
+        context = multiprocessing.get_context('spawn')      # A forked copy of the GUI process would inherit the Qt and asyncio state
+        commands_receive, self._commands = context.Pipe(duplex=False)
+        self._status, status_send = context.Pipe(duplex=False)
+        self.process = context.Process(target=run_acquisition, name=f"{self.name} acquisition", daemon=True,
+                                       args=(self.ring.name, record_dtype, self._kwargs, commands_receive, status_send, self.log_level))
+        self.process.start()
+        commands_receive.close()
+        status_send.close()
+
+        # Wait for the worker to report that the connection is open
+        deadline = time.monotonic() + OPEN_TIMEOUT
+        while True:
+            message = self._receive_status()
+            if message == 'opened':
+                break
+            if message == 'error' or not self.process.is_alive() or time.monotonic() > deadline:
+                error = self.status.get('error', 'timed out' if self.process.is_alive() else f"exit code {self.process.exitcode}")
+                await self.close()
+                raise ConnectionError(f"'{self.name}': The acquisition process could not open {self.com_port}: {error}")
+            await asyncio.sleep(0.01)
+        self._poll_task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def close(self):
+        """Stop the worker process, read the last records and unmap the ring"""
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self.process:
+            try:
+                self._commands.send(('stop', None))
+            except (OSError, ValueError):
+                pass
+            deadline = time.monotonic() + CLOSE_TIMEOUT
+            while self.process.is_alive() and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process.join()
+            self.process = None
+            self._reading_paused = False
+            self.poll()
+            self._commands.close()
+            self._status.close()
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+        self.frame_broadcaster.close()
+
+    async def send_data(self, force: bool = False):
+        """Hand the write_data to the worker process, which sends it with its send scheduler (see PyEasyTransfer.send_data)"""
+        if self.mode not in ['both', 'output']:
+            raise ValueError("The AcquisitionProcess object is not in output mode. Data sending is not allowed.")
+        self._send_command('send', (self.write_data.record_bytes.tobytes(), force))
+        await asyncio.sleep(0)
+
+    async def listen(self):
+        """Wait while the ring is read, until the connection is closed"""
+        if self.mode not in ['both', 'input']:
+            raise ValueError("The AcquisitionProcess object is not in input mode. Listening is not allowed.")
+        poll_task = self._poll_task
+        if poll_task:
+            try:
+                await asyncio.shield(poll_task)
+            except asyncio.CancelledError:
+                if not poll_task.cancelled():       # Only the listener itself was cancelled
+                    raise
+
+    async def _poll_loop(self):
+        """Read the ring every poll_interval"""
+        while True:
+            self.poll()
+            await asyncio.sleep(self.poll_interval)
+
+    def _receive_status(self) -> Optional[str]:
+        """Handle the messages of the worker process, returns the type of the last one"""
+        message_type = None
+        while self._status.poll():
+            try:
+                message_type, argument = self._status.recv()
+            except (EOFError, OSError):
+                break
+            if message_type == 'status':
+                self.status.update(argument)
+            elif message_type == 'log':
+                if self.log:
+                    self.log.log(*argument)
+            elif message_type == 'error':
+                self.status['error'] = argument
+                if self.log:
+                    self.log.error(f"'{self.name}': Acquisition process error: {argument}")
+        return message_type
+
+    def poll(self) -> int:
+        """Copy the records written to the ring since the last poll into read_data and, while saving, save_read_data.
+        Returns the number of new records."""
+        if self._status and not self._status.closed:
+            self._receive_status()
+        if self.ring is None or self.mode not in ['both', 'input'] or self._reading_paused:
+            return 0
+        records, host_time_ns, self._position, lost = self.ring.read(self._position)
+        if lost:
+            self.records_lost += lost
+            if self.log:
+                self.log.warning(f"'{self.name}': {lost} records were overwritten in the ring before they were read, increase ring_capacity")
+        if len(records) == 0:
+            return 0
+
+        self.read_data.record[0] = records[-1]
+        self.read_data.io_count = self._position
+        self.read_data.host_time_ns = int(host_time_ns[-1])
+        if self.save_read_data and self.start_saving_data:
+            num_saved = self.save_read_data.append_records(records, host_time_ns)
+            if num_saved < len(records):
+                self.start_saving_data = False      # Flip flag due to max elements reached
+                if self.log:
+                    self.log.error(f"Could not save data to the ETDataArrays object because the max element count has been reached. Stopping data collection.")
+        if self.frame_broadcaster:
+            self.frame_broadcaster.publish(records, host_time_ns)
+        return len(records)
@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+
+JITTER_GAIN = 1/16          # Gain of the smoothed jitter estimate, as for the RTP interarrival jitter (RFC 3550)
+
+
+@dataclass
+class ArrivalStats:
+    """Running statistics of the host arrival times of the received frames.
+
+    The inter-arrival statistics only use the host timestamps. When the struct has a device time field the transit time
+    (host arrival time - device time) of every frame is also tracked. The host and device clocks are not synchronised, so
+    the transport latency is reported relative to the fastest frame seen, and the jitter is the smoothed variation of the
+    transit time between consecutive frames (RFC 3550 interarrival jitter).
+
+    Args:
+        device_time_field: str
+            The device time field of the struct_def, None to only track the host timestamps
+        device_time_scale: float
+            The number of seconds per unit of the device time field
+        device_time_bits: int
+            The number of bits of the device time counter, used to unwrap it, 0 if it does not wrap
+    """
+    device_time_field: Optional[str] = None
+    device_time_scale: float = 1e-3
+    device_time_bits: int = 0
+    frames: int = 0                             # Number of frames timestamped
+    first_host_time_ns: int = 0                 # Host time of the first frame
+    last_host_time_ns: int = 0                  # Host time of the last frame
+    interarrival_mean_s: float = 0.0            # Mean time between consecutive frames
+    interarrival_min_s: float = np.inf          # Shortest time between consecutive frames
+    interarrival_max_s: float = 0.0             # Longest time between consecutive frames
+    jitter_s: float = 0.0                       # Smoothed transit time variation between consecutive frames
+    latency_mean_s: float = 0.0                 # Mean transit time, relative to the fastest frame
+    latency_max_s: float = 0.0                  # Longest transit time, relative to the fastest frame
+
+    def __post_init__(self):
+        self._interarrival_m2 = 0.0             # Sum of the squared deviations of the inter-arrival times (Welford)
+        self._device_time = 0                   # Unwrapped device time of the last frame, in device time units
+        self._last_device_raw = None            # Raw device time of the last frame
+        self._last_transit_s = None             # Transit time of the last frame
+        self._transit_sum_s = 0.0               # Sum of the transit times
+        self._transit_min_s = np.inf
+        self._transit_max_s = -np.inf
+
+    @classmethod
+    def for_struct_def(cls, struct_def: dict[str, np.dtype]) -> 'ArrivalStats':
+        """Create the stats for a struct_def, using its time_us or time_ms field as the device time if it has one"""
+        for field, scale in [('time_us', 1e-6), ('time_ms', 1e-3)]:
+            if field in struct_def:
+                dtype = np.dtype(struct_def[field])
+                return cls(field, scale, dtype.itemsize*8 if dtype.kind == 'u' else 0)
+        return cls()
+
+    @property
+    def interarrival_std_s(self) -> float:
+        """Standard deviation of the time between consecutive frames"""
+        return float(np.sqrt(self._interarrival_m2 / (self.frames - 1))) if self.frames > 1 else 0.0
+
+    def _unwrap(self, device_time) -> np.ndarray:
+        """Unwrap the raw device times of consecutive frames, continuing from the last frame"""
+        device_time = np.asarray(device_time, dtype=np.int64)
+        if self._last_device_raw is None:
+            steps = np.diff(device_time, prepend=device_time[0])
+        else:
+            steps = np.diff(device_time, prepend=self._last_device_raw)
+        if self.device_time_bits:
+            steps %= 2**self.device_time_bits
+        unwrapped = self._device_time + np.cumsum(steps)
+        self._last_device_raw = int(device_time[-1])
+        self._device_time = int(unwrapped[-1])
+        return unwrapped
+
+    def update(self, host_time_ns: int, device_time=None):
+        """Add a single frame, the scalar equivalent of update_block which is cheaper for one frame"""
+        if self.frames:
+            interval_s = (host_time_ns - self.last_host_time_ns) / 1e9
+            delta = interval_s - self.interarrival_mean_s
+            self.interarrival_mean_s += delta / self.frames
+            self._interarrival_m2 += delta * (interval_s - self.interarrival_mean_s)
+            if interval_s < self.interarrival_min_s:
+                self.interarrival_min_s = interval_s
+            if interval_s > self.interarrival_max_s:
+                self.interarrival_max_s = interval_s
+        else:
+            self.first_host_time_ns = host_time_ns
+        self.frames += 1
+        self.last_host_time_ns = host_time_ns
+
+        if device_time is not None and self.device_time_field:
+            device_time = int(device_time)
+            if self._last_device_raw is not None:
+                step = device_time - self._last_device_raw
+                self._device_time += step % 2**self.device_time_bits if self.device_time_bits else step
+            self._last_device_raw = device_time
+            transit_s = (host_time_ns - self.first_host_time_ns) / 1e9 - self._device_time * self.device_time_scale
+            self._transit_sum_s += transit_s
+            if transit_s < self._transit_min_s:
+                self._transit_min_s = transit_s
+            if transit_s > self._transit_max_s:
+                self._transit_max_s = transit_s
+            self.latency_mean_s = self._transit_sum_s / self.frames - self._transit_min_s
+            self.latency_max_s = self._transit_max_s - self._transit_min_s
+            if self._last_transit_s is not None:
+                self.jitter_s += (abs(transit_s - self._last_transit_s) - self.jitter_s) * JITTER_GAIN
+            self._last_transit_s = transit_s
+
+    def update_block(self, host_times_ns: np.ndarray, device_times: Optional[np.ndarray] = None):
+        """Add a block of consecutive frames.
+
+        Args:
+            host_times_ns: np.ndarray
+                The host arrival time of each frame in nanoseconds
+            device_times: np.ndarray
+                The raw device time field of each frame, None if the struct has no device time field
+        """
+        num = len(host_times_ns)
+        if num == 0:
+            return
+        host_times_ns = np.asarray(host_times_ns, dtype=np.int64)
+
+        # Inter-arrival times, the block statistics are merged into the running ones (Chan et al.)
+        if self.frames:
+            intervals_s = np.diff(host_times_ns, prepend=self.last_host_time_ns) / 1e9
+        else:
+            self.first_host_time_ns = int(host_times_ns[0])
+            intervals_s = np.diff(host_times_ns) / 1e9
+        if len(intervals_s):
+            count = max(self.frames - 1, 0)
+            block_mean = float(intervals_s.mean())
+            block_m2 = float(np.sum((intervals_s - block_mean)**2))
+            total = count + len(intervals_s)
+            delta = block_mean - self.interarrival_mean_s
+            self.interarrival_mean_s += delta * len(intervals_s) / total
+            self._interarrival_m2 += block_m2 + delta**2 * count * len(intervals_s) / total
+            self.interarrival_min_s = min(self.interarrival_min_s, float(intervals_s.min()))
+            self.interarrival_max_s = max(self.interarrival_max_s, float(intervals_s.max()))
+        self.frames += num
+        self.last_host_time_ns = int(host_times_ns[-1])
+
+        # Transit times, relative to the first frame to keep the float precision
+        if device_times is not None and self.device_time_field:
+            device_s = self._unwrap(device_times) * self.device_time_scale
+            transit_s = (host_times_ns - self.first_host_time_ns) / 1e9 - device_s
+            self._transit_sum_s += float(transit_s.sum())
+            self._transit_min_s = min(self._transit_min_s, float(transit_s.min()))
+            self._transit_max_s = max(self._transit_max_s, float(transit_s.max()))
+            self.latency_mean_s = self._transit_sum_s / self.frames - self._transit_min_s
+            self.latency_max_s = self._transit_max_s - self._transit_min_s
+
+            # Smoothed jitter J += (|D| - J) * gain, applied to the whole block in closed form
+            if self._last_transit_s is None:
+                differences = np.abs(np.diff(transit_s))
+            else:
+                differences = np.abs(np.diff(transit_s, prepend=self._last_transit_s))
+            if len(differences):
+                decay = 1 - JITTER_GAIN
+                weights = JITTER_GAIN * decay**np.arange(len(differences) - 1, -1, -1)
+                self.jitter_s = self.jitter_s * decay**len(differences) + float(np.dot(weights, differences))
+            self._last_transit_s = float(transit_s[-1])
+
+    def summary(self) -> dict[str, float]:
+        """Return the statistics as a dictionary"""
+        return {'frames': self.frames,
+                'interarrival_mean_s': self.interarrival_mean_s,
+                'interarrival_std_s': self.interarrival_std_s,
+                'interarrival_min_s': self.interarrival_min_s if self.frames > 1 else 0.0,
+                'interarrival_max_s': self.interarrival_max_s,
+                'jitter_s': self.jitter_s,
+                'latency_mean_s': self.latency_mean_s,
+                'latency_max_s': self.latency_max_s}
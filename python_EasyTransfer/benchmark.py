@@ -0,0 +1,303 @@
+"""Throughput benchmarks for the pyEasyTransfer receive and send paths.
+
+Sweeps struct size, chunk fragmentation, corruption rate, storage, decode mode and checksum, and writes one JSON object per case
+(frames/s, bytes/s, us per frame and allocations per frame) so results can be saved and compared against a baseline:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+import numpy as np
+
+# Add the controller directory to the path so that the struct definitions can be imported
+sys.path.append(os.path.join(Path(__file__).parent.parent, "controller"))
+from struct_defs import monitor_input_struct_def, driver_input_struct_def, monitor_output_struct_def
+from pyEasyTransfer import PyEasyTransfer, EasyTransferReceiver, create_record_dtype, encode_frames, calculate_checksum
+from checksums import CHECKSUMS, CHECKSUM_FUNCTIONS, valid_rows
+from ETData import ETDataArrays
+
+# The 6-field struct used by test_both_in_out
+test_input_struct_def = {"time_ms": np.uint32,
+                         "sensor": np.float32,
+                         "pc_time_ms_received": np.uint32,
+                         "hello_received": np.bool_,
+                         "checksum_received": np.uint8,
+                         "checksum_expected": np.uint8}
+
+STRUCT_DEFS = {'test': test_input_struct_def, 'driver': driver_input_struct_def, 'monitor': monitor_input_struct_def}
+CHUNKINGS = ['1_byte', 'partial_frame', 'frame', 'burst_64k']
+CORRUPTION_RATES = [0.0, 0.01, 0.1]
+DECODE_MODES = ['per_frame', 'batch']
+CASE_DEFAULTS = {'checksum': 'xor'}         # Value of the case keys missing from results saved before they were added
+
+log = logging.getLogger('benchmark')
+log.addHandler(logging.NullHandler())
+log.propagate = False           # Corrupted frames log errors, keep the logging cost out of the measurements
+
+
+def make_records(struct_def: dict[str, np.dtype], num_frames: int, rng: np.random.Generator) -> np.ndarray:
+    """Create random records for the struct_def"""
+    records = np.zeros(num_frames, dtype=create_record_dtype('little-endian', struct_def))
+    for variable, _dtype in struct_def.items():
+        if np.dtype(_dtype).kind == 'f':
+            records[variable] = rng.normal(25, 5, num_frames)
+        elif np.dtype(_dtype).kind == 'b':
+            records[variable] = rng.integers(0, 2, num_frames)
+        else:
+            records[variable] = rng.integers(0, 200, num_frames)
+    return records
+
+
+def make_stream(struct_def: dict[str, np.dtype], num_frames: int, corruption_rate: float, rng: np.random.Generator,
+                checksum: str = 'xor') -> tuple[bytes, int]:
+    """Create an encoded stream of random frames, corrupting one packet byte of a fraction of the frames.
+    Returns the stream and the number of valid frames in it."""
+    frames = encode_frames(make_records(struct_def, num_frames, rng), checksum=checksum)
+    corrupted = np.flatnonzero(rng.random(num_frames) < corruption_rate)
+    packet_bytes = rng.integers(3, frames.shape[1] - CHECKSUMS[checksum], len(corrupted))
+    frames[corrupted, packet_bytes] ^= 0x5A
+    return frames.tobytes(), num_frames - len(corrupted)
+
+
+def make_chunks(stream: bytes, chunking: str, frame_size: int, rng: np.random.Generator) -> list[bytes]:
+    """Split the stream the way the serial transport could deliver it"""
+    if chunking == '1_byte':
+        sizes = itertools.repeat(1)
+    elif chunking == 'partial_frame':
+        sizes = iter(rng.integers(1, frame_size, len(stream)).tolist())
+    elif chunking == 'frame':
+        sizes = itertools.repeat(frame_size)
+    elif chunking == 'burst_64k':
+        sizes = itertools.repeat(64*1024)
+    else:
+        raise ValueError(f"Invalid chunking '{chunking}'. Must be one of {CHUNKINGS}")
+    chunks = []
+    offset = 0
+    for size in sizes:
+        if offset >= len(stream):
+            break
+        chunks.append(stream[offset:offset+size])
+        offset += size
+    return chunks
+
+
+def measure(run: Callable[[], int], num_bytes: int, measure_allocations: bool = True) -> dict:
+    """Time run(), which returns the number of frames processed, then run it again under tracemalloc to count the allocations"""
+    start = time.perf_counter()
+    frames = run()
+    seconds = time.perf_counter() - start
+    result = {'frames': frames, 'bytes': num_bytes, 'seconds': seconds,
+              'frames_per_s': frames/seconds if seconds else 0.0,
+              'bytes_per_s': num_bytes/seconds if seconds else 0.0,
+              'us_per_frame': seconds*1e6/frames if frames else None}
+    if measure_allocations:
+        # tracemalloc only sees live blocks, so count the allocated bytes per frame as the peak over the run plus the blocks still held at the end
+        tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+        frames = run()
+        _, peak = tracemalloc.get_traced_memory()
+        blocks_after = sys.getallocatedblocks()
+        tracemalloc.stop()
+        result['peak_alloc_bytes_per_frame'] = peak/frames if frames else None
+        result['retained_blocks_per_frame'] = (blocks_after - blocks_before)/frames if frames else None
+    return result
+
+
+def create_pyeasytransfer(struct_def: dict[str, np.dtype], batch_decode: bool, max_elements: int, storage: bool, checksum: str = 'xor') -> PyEasyTransfer:
+    """Create a PyEasyTransfer object which is not connected to a serial port"""
+    save_read_data = ETDataArrays(struct_def, max_elements=max_elements, name='benchmark') if storage else None
+    et = PyEasyTransfer(com_port='benchmark', baud_rate=115200, input_struct_def=struct_def, output_struct_def=monitor_output_struct_def,
+                        save_read_data=save_read_data, log=log, name='benchmark', batch_decode=batch_decode, checksum=checksum)
+    et.start_saving(storage)
+    return et
+
+
+def bench_receiver(struct_name: str, chunking: str, corruption_rate: float, storage: bool, mode: str, num_frames: int, seed: int,
+                   checksum: str = 'xor') -> dict:
+    """Benchmark the full receive path, EasyTransferReceiver.data_received"""
+    rng = np.random.default_rng(seed)
+    struct_def = STRUCT_DEFS[struct_name]
+    stream, _ = make_stream(struct_def, num_frames, corruption_rate, rng, checksum)
+    frame_size = len(stream) // num_frames
+    chunks = make_chunks(stream, chunking, frame_size, rng)
+
+    def run() -> int:
+        et = create_pyeasytransfer(struct_def, mode == 'batch', num_frames, storage, checksum)
+        receiver = EasyTransferReceiver(et)
+        for chunk in chunks:
+            receiver.data_received(chunk)
+        return et.read_data.io_count
+
+    result = measure(run, len(stream))
+    result.update({'benchmark': 'EasyTransferReceiver.data_received', 'struct': struct_name, 'fields': len(struct_def),
+                   'packet_size': frame_size - 3 - CHECKSUMS[checksum], 'chunking': chunking, 'corruption_rate': corruption_rate, 'storage': storage,
+                   'mode': mode, 'checksum': checksum})
+    return result
+
+
+def bench_checksum(struct_name: str, checksum: str, mode: str, num_frames: int, seed: int) -> dict:
+    """Benchmark the frame checksum alone, either frame by frame as in the live receive path or all frames at once as when
+    decoding a capture. checksum 'calculate_checksum' is the XOR checksum through calculate_checksum, the live path before
+    the checksum became selectable."""
+    rng = np.random.default_rng(seed)
+    struct_def = STRUCT_DEFS[struct_name]
+    frame_checksum = 'xor' if checksum == 'calculate_checksum' else checksum
+    frames = encode_frames(make_records(struct_def, num_frames, rng), checksum=frame_checksum)
+    footer_size = CHECKSUMS[frame_checksum]
+    checked = [frame[2:-footer_size].tobytes() for frame in frames]        # Size byte and packet
+
+    if mode == 'bulk':
+        def run() -> int:
+            return int(np.count_nonzero(valid_rows(frames[:, 2:], frame_checksum, '<')))
+    elif checksum == 'calculate_checksum':
+        def run() -> int:
+            for data in checked:
+                calculate_checksum(data[1:])
+            return len(checked)
+    else:
+        def run() -> int:
+            checksum_function = CHECKSUM_FUNCTIONS[checksum]
+            for data in checked:
+                checksum_function(data)
+            return len(checked)
+
+    result = measure(run, frames.size, measure_allocations=False)
+    result.update({'benchmark': 'checksum', 'struct': struct_name, 'packet_size': frames.shape[1] - 3 - footer_size, 'mode': mode, 'checksum': checksum})
+    return result
+
+
+def bench_packet_decode(struct_name: str, storage: bool, num_frames: int, seed: int) -> dict:
+    """Benchmark decoding a packet into read_data, PyEasyTransfer.data_received"""
+    rng = np.random.default_rng(seed)
+    struct_def = STRUCT_DEFS[struct_name]
+    packets = [record.tobytes() for record in make_records(struct_def, num_frames, rng)]
+
+    def run() -> int:
+        et = create_pyeasytransfer(struct_def, False, num_frames, storage)
+        for packet in packets:
+            et.data_received(packet)
+        return et.read_data.io_count
+
+    result = measure(run, sum(len(packet) for packet in packets))
+    result.update({'benchmark': 'PyEasyTransfer.data_received', 'struct': struct_name, 'fields': len(struct_def),
+                   'packet_size': len(packets[0]), 'storage': storage})
+    return result
+
+
+def bench_save(struct_name: str, num_frames: int, seed: int) -> dict:
+    """Benchmark storing read_data in the ETDataArrays object, PyEasyTransfer.save_data_recevied"""
+    rng = np.random.default_rng(seed)
+    struct_def = STRUCT_DEFS[struct_name]
+    packet = make_records(struct_def, 1, rng)[0].tobytes()
+
+    def run() -> int:
+        et = create_pyeasytransfer(struct_def, False, num_frames, True)
+        et.read_codec.decode_into(packet, et.read_data)
+        for _ in range(num_frames):
+            et.save_data_recevied()
+        return et.save_read_data.io_count
+
+    result = measure(run, len(packet)*num_frames)
+    result.update({'benchmark': 'PyEasyTransfer.save_data_recevied', 'struct': struct_name, 'fields': len(struct_def), 'packet_size': len(packet)})
+    return result
+
+
+class NullWriter:
+    """Transport stand-in which discards everything written"""
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        self.bytes_written += len(data)
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+
+def bench_send(num_frames: int) -> dict:
+    """Benchmark packing and writing write_data, PyEasyTransfer.send_data"""
+    et = create_pyeasytransfer(test_input_struct_def, False, 0, False)
+    et.writer = NullWriter()
+    et.write_data.reset_time = np.bool_(False)
+    et.write_data.heater_block_enable = np.bool_(True)
+    et.write_data.rope_heater_enable = np.bool_(True)
+    et.write_data.heat_flux = np.float32(10.0)
+    et.write_data.inlet_fluid_temp_setpoint_c = np.float32(30.0)
+
+    async def send_all():
+        for _ in range(num_frames):
+            await et.send_data(force=True)     # The write_data never changes, force every frame out
+
+    def run() -> int:
+        asyncio.run(send_all())
+        return num_frames
+
+    result = measure(run, num_frames*et.write_codec.frame_size)
+    result.update({'benchmark': 'PyEasyTransfer.send_data', 'struct': 'monitor_output', 'fields': len(monitor_output_struct_def),
+                   'packet_size': et.write_codec.packet_size})
+    return result
+
+
+def run_benchmarks(num_frames: int, seed: int = 0, quick: bool = False):
+    """Run every benchmark case, yielding the result of each"""
+    structs = ['test', 'monitor'] if quick else list(STRUCT_DEFS.keys())
+    corruption_rates = [0.0, 0.1] if quick else CORRUPTION_RATES
+    for struct_name, chunking, corruption_rate, storage, mode, checksum in itertools.product(structs, CHUNKINGS, corruption_rates, [False, True],
+                                                                                           DECODE_MODES, CHECKSUMS):
+        frames = num_frames // 10 if chunking == '1_byte' else num_frames     # One call per byte is slow, keep the run time reasonable
+        yield bench_receiver(struct_name, chunking, corruption_rate, storage, mode, frames, seed, checksum)
+    for struct_name in structs:
+        for checksum in ['calculate_checksum', *CHECKSUMS]:
+            yield bench_checksum(struct_name, checksum, 'per_frame', num_frames, seed)
+        for checksum in CHECKSUMS:
+            yield bench_checksum(struct_name, checksum, 'bulk', num_frames, seed)
+    for struct_name, storage in itertools.product(structs, [False, True]):
+        yield bench_packet_decode(struct_name, storage, num_frames, seed)
+    for struct_name in structs:
+        yield bench_save(struct_name, num_frames, seed)
+    yield bench_send(num_frames)
+
+
+def case_key(result: dict) -> tuple:
+    """Key identifying a benchmark case, used to match results against a baseline"""
+    return tuple(result.get(key, CASE_DEFAULTS.get(key)) for key in ['benchmark', 'struct', 'chunking', 'corruption_rate', 'storage', 'mode', 'checksum'])
+
+
+def load_results(file_path: str) -> dict[tuple, dict]:
+    """Load results written with --output"""
+    with open(file_path) as f:
+        return {case_key(result): result for result in map(json.loads, f) if result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pyEasyTransfer receive and send paths")
+    parser.add_argument('--frames', type=int, default=20000, help="Number of frames per case")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the random data")
+    parser.add_argument('--quick', action='store_true', help="Run a reduced sweep")
+    parser.add_argument('--output', type=str, default=None, help="Write the results as JSON lines to this file")
+    parser.add_argument('--compare', type=str, default=None, help="Compare the us per frame against results saved with --output")
+    args = parser.parse_args()
+
+    baseline = load_results(args.compare) if args.compare else {}
+    output = open(args.output, 'w') if args.output else None
+    for result in run_benchmarks(args.frames, args.seed, args.quick):
+        base: Optional[dict] = baseline.get(case_key(result))
+        if base and base.get('us_per_frame') and result.get('us_per_frame'):
+            result['baseline_us_per_frame'] = base['us_per_frame']
+            result['speedup'] = base['us_per_frame'] / result['us_per_frame']
+        line = json.dumps(result)
+        print(line, flush=True)
+        if output:
+            output.write(line + '\n')
+    if output:
+        output.close()
@@ -0,0 +1,171 @@
+from dataclasses import dataclass
+import os
+import numpy as np
+from ETData import ETDataArrays
+from pyEasyTransfer import BYTE_FORMATS, create_record_dtype, find_frames, decode_frames
+from checksums import CHECKSUMS
+from extended_framing import EXTENDED_PREFIX_SIZE, MAX_SAMPLES_PER_FRAME, decode_extended_frames, find_extended_frames
+from raw_capture import load_raw_capture
+
+DECODE_CHUNK_SIZE = 16*1024*1024        # Number of bytes of the capture decoded at once
+
+
+@dataclass
+class CaptureDecodeStats:
+    """Statistics of an offline decode of a raw EasyTransfer capture"""
+    total_bytes: int = 0                    # Number of bytes in the capture
+    frames_decoded: int = 0                 # Number of frames with a valid size and checksum
+    records_decoded: int = 0                # Number of records of the valid frames, more than frames_decoded for extended frames
+    bad_frames: int = 0                     # Number of complete frames which failed the size or checksum validation
+    bytes_skipped: int = 0                  # Number of bytes which were not part of a valid frame (corrupt frames, noise, truncated tail)
+
+
+def decode_capture_buffer(buffer: np.ndarray, struct_def: dict[str, np.dtype], byte_format: str = 'little-endian',
+                          header_bytes: bytes = b'\x06\x85', chunk_size: int = DECODE_CHUNK_SIZE, checksum: str = 'xor',
+                          framing: str = 'standard', max_samples: int = MAX_SAMPLES_PER_FRAME) -> tuple[np.ndarray, CaptureDecodeStats]:
+    """Decode a raw EasyTransfer byte stream into a numpy structured array, chunk by chunk.
+
+    Args:
+        buffer: np.ndarray
+            The raw byte stream as a uint8 array, can be a np.memmap or a raw_capture.CaptureStream
+        struct_def: dict[str, np.dtype]
+            The struct definition of the packets in the stream, exactly as defined in the Arduino code
+        byte_format: str
+            The byte order of the packets. Must be one of the keys of BYTE_FORMATS
+        header_bytes: bytes
+            The header bytes which start every frame
+        chunk_size: int
+            The number of bytes to decode at once, bounds the memory used by the decode
+        checksum: str
+            The checksum mode of the frames, one of CHECKSUMS. The checksums of a whole chunk are validated at once
+        framing: str
+            The framing of the stream, 'standard' (one record per frame) or 'extended' (see extended_framing.py)
+        max_samples: int
+            The maximum number of records accepted in one extended frame
+
+    Returns:
+        [records: np.ndarray, stats: CaptureDecodeStats]
+    """
+    if byte_format not in BYTE_FORMATS:
+        raise ValueError(f"Invalid byte_format '{byte_format}'. Must be one of {list(BYTE_FORMATS.keys())}")
+    record_dtype = create_record_dtype(byte_format, struct_def)
+    header_size = len(header_bytes)
+    if checksum not in CHECKSUMS:
+        raise ValueError(f"Invalid checksum '{checksum}'. Must be one of {list(CHECKSUMS)}")
+    if framing not in ['standard', 'extended']:
+        raise ValueError(f"Invalid framing '{framing}'. Must be 'standard' or 'extended'")
+    frame_overhead = header_size + (EXTENDED_PREFIX_SIZE if framing == 'extended' else 1) + CHECKSUMS[checksum]
+    max_frame_size = frame_overhead + record_dtype.itemsize*(max_samples if framing == 'extended' else 1)
+    chunk_size = max(chunk_size, 2*max_frame_size)      # A chunk must always be able to hold a complete frame
+
+    stats = CaptureDecodeStats(total_bytes=len(buffer))
+    decoded = []
+    offset = 0
+    while offset < len(buffer):
+        chunk = np.asarray(buffer[offset:offset+chunk_size])
+        if framing == 'extended':
+            record_starts, counts, consumed, bad_frames = find_extended_frames(chunk, record_dtype.itemsize, header_bytes, BYTE_FORMATS[byte_format],
+                                                                               max_samples, checksum)
+            if len(record_starts):
+                decoded.append(decode_extended_frames(chunk, record_starts, counts, record_dtype))
+            num_frames, num_records = len(record_starts), int(counts.sum())
+        else:
+            frame_starts, consumed, bad_frames = find_frames(chunk, record_dtype.itemsize, header_bytes, checksum, BYTE_FORMATS[byte_format])
+            if len(frame_starts):
+                decoded.append(decode_frames(chunk, frame_starts, record_dtype, header_size))
+            num_frames = num_records = len(frame_starts)
+        if offset + len(chunk) >= len(buffer):
+            consumed = len(chunk)           # Last chunk, any incomplete frame at the end is truncated
+        stats.frames_decoded += num_frames
+        stats.records_decoded += num_records
+        stats.bad_frames += bad_frames
+        offset += consumed
+    stats.bytes_skipped = stats.total_bytes - stats.frames_decoded*frame_overhead - stats.records_decoded*record_dtype.itemsize
+
+    records = np.concatenate(decoded) if decoded else np.empty(0, dtype=record_dtype)
+    return records, stats
+
+
+def decode_capture_file(file_path: str, struct_def: dict[str, np.dtype], byte_format: str = 'little-endian',
+                        header_bytes: bytes = b'\x06\x85', chunk_size: int = DECODE_CHUNK_SIZE, checksum: str = 'xor',
+                        framing: str = 'standard', max_samples: int = MAX_SAMPLES_PER_FRAME) -> tuple[np.ndarray, CaptureDecodeStats]:
+    """Decode a raw EasyTransfer capture file into a numpy structured array. The file is memory-mapped so only the chunk
+    being decoded is read into memory.
+
+    Args:
+        file_path: str
+            The path to the raw byte dump of the serial stream
+        struct_def: dict[str, np.dtype]
+            The struct definition of the packets in the stream, exactly as defined in the Arduino code
+        byte_format: str
+            The byte order of the packets. Must be one of the keys of BYTE_FORMATS
+        header_bytes: bytes
+            The header bytes which start every frame
+        chunk_size: int
+            The number of bytes to decode at once
+        checksum: str
+            The checksum mode of the frames, one of CHECKSUMS
+        framing: str
+            The framing of the stream, 'standard' or 'extended'
+        max_samples: int
+            The maximum number of records accepted in one extended frame
+
+    Returns:
+        [records: np.ndarray, stats: CaptureDecodeStats]
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"File '{file_path}' does not exist")
+    if os.path.getsize(file_path) == 0:
+        buffer = np.empty(0, dtype=np.uint8)           # np.memmap can not map an empty file
+    else:
+        buffer = np.memmap(file_path, dtype=np.uint8, mode='r')
+    return decode_capture_buffer(buffer, struct_def, byte_format, header_bytes, chunk_size, checksum, framing, max_samples)
+
+
+def decode_raw_capture_file(file_path: str, struct_def: dict[str, np.dtype], byte_format: str = 'little-endian',
+                            header_bytes: bytes = b'\x06\x85', chunk_size: int = DECODE_CHUNK_SIZE, checksum: str = 'xor',
+                            framing: str = 'standard', max_samples: int = MAX_SAMPLES_PER_FRAME) -> tuple[np.ndarray, CaptureDecodeStats]:
+    """Decode a timestamped capture file written by PyEasyTransfer.start_capture into a numpy structured array.
+
+    Args:
+        file_path: str
+            The path to the capture file written by raw_capture.RawCaptureWriter
+        struct_def: dict[str, np.dtype]
+            The struct definition of the packets in the stream, exactly as defined in the Arduino code
+        byte_format: str
+            The byte order of the packets. Must be one of the keys of BYTE_FORMATS
+        header_bytes: bytes
+            The header bytes which start every frame
+        chunk_size: int
+            The number of bytes to decode at once
+        checksum: str
+            The checksum mode of the frames, one of CHECKSUMS
+        framing: str
+            The framing of the stream, 'standard' or 'extended'
+        max_samples: int
+            The maximum number of records accepted in one extended frame
+
+    Returns:
+        [records: np.ndarray, stats: CaptureDecodeStats]
+    """
+    _, _, stream = load_raw_capture(file_path)
+    return decode_capture_buffer(stream, struct_def, byte_format, header_bytes, chunk_size, checksum, framing, max_samples)
+
+
+def records_to_ETDataArrays(records: np.ndarray, struct_def: dict[str, np.dtype], name: str) -> ETDataArrays:
+    """Create an ETDataArrays object holding the given decoded records.
+
+    Args:
+        records: np.ndarray
+            The decoded records, as returned by decode_capture_file
+        struct_def: dict[str, np.dtype]
+            The struct definition of the records
+        name: str
+            The name of the ETDataArrays object
+
+    Returns:
+        data: ETDataArrays
+    """
+    data = ETDataArrays(struct_def, max_elements=len(records), name=name)
+    data.append_records(records)
+    return data
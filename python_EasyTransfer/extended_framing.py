@@ -0,0 +1,151 @@
+from struct import Struct
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from checksums import CHECKSUM_FUNCTIONS, checksum_struct
+
+""" Extended EasyTransfer framing
+
+    The standard frame limits the packet to 255 bytes and carries a single struct. An extended frame carries several
+    consecutive records of the struct_def:
+        header bytes        0x06 0x85
+        uint16 length       number of bytes after the length field up to the checksum (2 + count*record size)
+        uint16 count        number of records in the frame
+        records             count packed structs
+        checksum            XOR (1 byte) or CRC-16 (2 bytes) of the length, count and record bytes, see checksums.py
+    The length and count use the byte order of the link. See include/et_extended.h for the Teensy side.
+"""
+EXTENDED_PREFIX_SIZE = 4                    # The length and count fields
+EXTENDED_MAX_LENGTH = 2**16 - 1             # Maximum value of the length field
+MAX_SAMPLES_PER_FRAME = 64                  # Default maximum number of records accepted in one frame, bounds the resync latency
+
+
+def extended_prefix_struct(byte_order: str) -> Struct:
+    """Return the Struct for the length and count fields of an extended frame"""
+    return Struct(byte_order + 'HH')
+
+
+def max_samples_for_record_size(record_size: int) -> int:
+    """Return the maximum number of records of record_size bytes which fit in an extended frame"""
+    return (EXTENDED_MAX_LENGTH - 2) // record_size
+
+
+def find_extended_frames(buffer: np.ndarray, record_size: int, header_bytes: bytes = b'\x06\x85', byte_order: str = '<',
+                         max_samples: int = MAX_SAMPLES_PER_FRAME, checksum: str = 'xor') -> tuple[np.ndarray, np.ndarray, int, int]:
+    """Find every complete extended frame with a valid length, count and checksum in a buffer.
+
+    The header candidates are found with vectorized operations, then validated in order. A candidate which fails the
+    validation is a false header, so the candidates after it (including ones inside it) are still considered.
+
+    Args:
+        buffer: np.ndarray
+            The received bytes as a uint8 array
+        record_size: int
+            The size of one record (the struct_def) in bytes
+        header_bytes: bytes
+            The header bytes which start every frame
+        byte_order: str
+            The struct byte order character of the length and count fields
+        max_samples: int
+            The maximum number of records accepted in one frame
+        checksum: str
+            The checksum mode, one of CHECKSUMS
+
+    Returns:
+        [record_starts: np.ndarray, counts: np.ndarray, consumed: int, num_bad_frames: int]
+            The index of the first record and the number of records of each valid frame, the number of bytes at the start
+            of the buffer that can be discarded, and the number of candidates which failed the validation
+    """
+    header_size = len(header_bytes)
+    prefix = extended_prefix_struct(byte_order)
+    footer = checksum_struct(checksum, byte_order)
+    checksum_function = CHECKSUM_FUNCTIONS[checksum]
+    buffer_size = len(buffer)
+    if buffer_size < header_size:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), 0, 0
+    candidates = sliding_window_view(buffer, header_size) == np.frombuffer(bytes(header_bytes), dtype=np.uint8)
+    candidates = np.flatnonzero(candidates.all(axis=1))
+
+    record_starts = []
+    counts = []
+    num_bad_frames = 0
+    frame_end = 0                                   # End of the last valid frame
+    consumed = None
+    for start in candidates.tolist():
+        if start < frame_end:
+            continue                                # False header inside a valid frame
+        if start + header_size + EXTENDED_PREFIX_SIZE > buffer_size:
+            consumed = start                        # Incomplete prefix, wait for more bytes
+            break
+        length, count = prefix.unpack_from(buffer, start + header_size)
+        if not 0 < count <= max_samples or length != 2 + count*record_size:
+            num_bad_frames += 1
+            continue
+        end = start + header_size + 2 + length + footer.size
+        if end > buffer_size:
+            consumed = start                        # Incomplete frame, wait for at most one frame of bytes
+            break
+        if checksum_function(buffer[start + header_size:end - footer.size]) != footer.unpack_from(buffer, end - footer.size)[0]:
+            num_bad_frames += 1
+            continue
+        record_starts.append(start + header_size + EXTENDED_PREFIX_SIZE)
+        counts.append(count)
+        frame_end = end
+    if consumed is None:
+        consumed = max(frame_end, buffer_size - header_size + 1)       # Keep bytes which could be the start of a header
+    return np.array(record_starts, dtype=np.intp), np.array(counts, dtype=np.intp), consumed, num_bad_frames
+
+
+def decode_extended_frames(buffer: np.ndarray, record_starts: np.ndarray, counts: np.ndarray, record_dtype: np.dtype) -> np.ndarray:
+    """Decode the records of the given extended frames into a numpy structured array, copying them in one pass.
+
+    Args:
+        buffer: np.ndarray
+            The received bytes as a uint8 array
+        record_starts: np.ndarray
+            The index of the first record of each frame, as returned by find_extended_frames
+        counts: np.ndarray
+            The number of records of each frame
+        record_dtype: np.dtype
+            The packed structured dtype of the records, see create_record_dtype
+
+    Returns:
+        records: np.ndarray
+    """
+    if len(record_starts) == 1:
+        size = int(counts[0])*record_dtype.itemsize
+        return buffer[record_starts[0]:record_starts[0] + size].copy().view(record_dtype)
+    return np.concatenate([buffer[start:start + count*record_dtype.itemsize] for start, count in zip(record_starts.tolist(), counts.tolist())]).view(record_dtype)
+
+
+def encode_extended_frames(records: np.ndarray, samples_per_frame: int, header_bytes: bytes = b'\x06\x85', byte_order: str = '<',
+                           checksum: str = 'xor') -> bytes:
+    """Encode records into extended frames of up to samples_per_frame records each.
+
+    Args:
+        records: np.ndarray
+            The records as a packed numpy structured array with the byte order of the link
+        samples_per_frame: int
+            The maximum number of records per frame
+        header_bytes: bytes
+            The header bytes which start every frame
+        byte_order: str
+            The struct byte order character of the length and count fields
+        checksum: str
+            The checksum mode, one of CHECKSUMS
+
+    Returns:
+        frames: bytes
+    """
+    if not 0 < samples_per_frame <= max_samples_for_record_size(records.dtype.itemsize):
+        raise ValueError(f"Invalid samples_per_frame {samples_per_frame}, must be between 1 and {max_samples_for_record_size(records.dtype.itemsize)}")
+    prefix = extended_prefix_struct(byte_order)
+    footer = checksum_struct(checksum, byte_order)
+    checksum_function = CHECKSUM_FUNCTIONS[checksum]
+    record_bytes = records.view(np.uint8).reshape(-1) if len(records) else np.empty(0, dtype=np.uint8)
+    parts = []
+    for first in range(0, len(records), samples_per_frame):
+        count = min(samples_per_frame, len(records) - first)
+        data = record_bytes[first*records.dtype.itemsize:(first + count)*records.dtype.itemsize]
+        checked = prefix.pack(2 + count*records.dtype.itemsize, count) + data.tobytes()
+        parts += [bytes(header_bytes), checked, footer.pack(checksum_function(checked))]
+    return b''.join(parts)
@@ -0,0 +1,199 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+import numpy as np
+
+""" Frame subscriptions
+
+    A FrameBroadcaster hands every block of decoded records to the FrameSubscriptions attached to it. The block is made
+    read-only once and the same array is queued for every subscriber, only the batches built from several blocks are copied.
+    Each subscription is a queue bounded to maxsize records, and its overflow policy decides what happens when a consumer
+    falls behind:
+        'drop_oldest'   the oldest queued records are dropped, the newest maxsize records are kept
+        'coalesce'      the queued records are replaced by the newest record, for consumers which only need the latest state
+        'block'         no record is dropped, the broadcaster pauses reading from the connection until the queue has drained
+                        to half of maxsize (the device or the OS buffers the data meanwhile). If the connection can not pause
+                        its reading, the oldest records are dropped as for 'drop_oldest'
+"""
+OVERFLOW_POLICIES = ['drop_oldest', 'coalesce', 'block']
+FRAMES_MAX_BATCH = 256                  # Default maximum number of records in one batch
+FRAMES_MAXSIZE = 4096                   # Default maximum number of records queued for a subscriber
+
+
+@dataclass
+class FrameBatch:
+    """Records received since the previous batch of a subscription"""
+    records: np.ndarray                     # Read-only structured array of the records, oldest first
+    host_time_ns: np.ndarray                # Read-only int64 array of the time.perf_counter_ns() when each record arrived
+    dropped: int = 0                        # Number of records dropped or coalesced by the overflow policy before this batch
+
+
+class FrameSubscription:
+    """Bounded queue of the records of one subscriber, see FrameBroadcaster.subscribe.
+
+    Args:
+        broadcaster: FrameBroadcaster
+            The broadcaster feeding the queue
+        maxsize: int
+            The maximum number of records queued
+        overflow: str
+            The overflow policy, one of OVERFLOW_POLICIES
+    """
+    def __init__(self, broadcaster: 'FrameBroadcaster', maxsize: int = FRAMES_MAXSIZE, overflow: str = 'drop_oldest'):
+        if maxsize <= 0:
+            raise ValueError(f"Invalid maxsize {maxsize}, must be positive")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy '{overflow}'. Must be one of {OVERFLOW_POLICIES}")
+        self.broadcaster = broadcaster
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.size = 0                           # Number of records queued
+        self.dropped = 0                        # Total number of records dropped or coalesced
+        self.closed = False
+        self._blocks: deque[tuple[np.ndarray, np.ndarray]] = deque()
+        self._dropped_since_batch = 0
+        self._event = asyncio.Event()           # Set when records are queued or the subscription is closed
+
+    def put(self, records: np.ndarray, host_time_ns: np.ndarray):
+        """Queue a read-only block of records, applying the overflow policy"""
+        self._blocks.append((records, host_time_ns))
+        self.size += len(records)
+        if self.size > self.maxsize:
+            if self.overflow == 'drop_oldest':
+                self._drop(self.size - self.maxsize)
+            elif self.overflow == 'coalesce':
+                self._drop(self.size - 1)
+            elif not self.broadcaster.subscription_full(self):
+                self._drop(self.size - self.maxsize)        # The reading can not be paused, drop the oldest records instead
+        self._event.set()
+
+    def _drop(self, num: int):
+        """Drop the num oldest queued records"""
+        self.dropped += num
+        self._dropped_since_batch += num
+        self.size -= num
+        while num:
+            records, host_time_ns = self._blocks[0]
+            if len(records) <= num:
+                self._blocks.popleft()
+                num -= len(records)
+            else:
+                self._blocks[0] = (records[num:], host_time_ns[num:])
+                num = 0
+
+    async def get(self, max_batch: int = FRAMES_MAX_BATCH) -> Optional[FrameBatch]:
+        """Wait for records and return up to max_batch of them, None once the subscription is closed and empty"""
+        while not self._blocks:
+            if self.closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+
+        records, host_time_ns = [], []
+        num = 0
+        while self._blocks and num < max_batch:
+            block_records, block_times = self._blocks[0]
+            take = min(len(block_records), max_batch - num)
+            if take == len(block_records):
+                self._blocks.popleft()
+            else:
+                self._blocks[0] = (block_records[take:], block_times[take:])
+                block_records, block_times = block_records[:take], block_times[:take]
+            records.append(block_records)
+            host_time_ns.append(block_times)
+            num += take
+        self.size -= num
+        if len(records) == 1:
+            batch = FrameBatch(records[0], host_time_ns[0])             # A slice of the shared block, no copy
+        else:
+            batch = FrameBatch(np.concatenate(records), np.concatenate(host_time_ns))
+            batch.records.flags.writeable = False
+            batch.host_time_ns.flags.writeable = False
+        batch.dropped, self._dropped_since_batch = self._dropped_since_batch, 0
+        if self.overflow == 'block' and self.size <= self.maxsize // 2:
+            self.broadcaster.subscription_drained(self)
+        return batch
+
+    def close(self):
+        """End the subscription, get returns the records still queued and then None"""
+        self.closed = True
+        self._event.set()
+
+
+class FrameBroadcaster:
+    """Hands the received records to every subscription, false while there is none so the receive path can skip it.
+
+    Args:
+        pause_reading: Callable
+            Called when a 'block' subscription is full, to stop reading from the connection. Returns False if the connection can not
+            pause its reading, the full 'block' subscriptions then drop their oldest records
+        resume_reading: Callable
+            Called once every full 'block' subscription has drained
+    """
+    def __init__(self, pause_reading: Optional[Callable[[], Optional[bool]]] = None, resume_reading: Optional[Callable[[], None]] = None):
+        self.pause_reading = pause_reading
+        self.resume_reading = resume_reading
+        self.subscriptions: list[FrameSubscription] = []
+        self._full: set[int] = set()            # ids of the 'block' subscriptions holding back the reading
+        self.can_pause = pause_reading is not None      # False once the connection failed to pause its reading
+
+    def __bool__(self) -> bool:
+        return bool(self.subscriptions)
+
+    def subscribe(self, maxsize: int = FRAMES_MAXSIZE, overflow: str = 'drop_oldest') -> FrameSubscription:
+        """Attach a new subscription, it receives the records published from now on"""
+        subscription = FrameSubscription(self, maxsize, overflow)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: FrameSubscription):
+        """Detach a subscription and close it"""
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        subscription.close()
+        self.subscription_drained(subscription)
+
+    async def frames(self, max_batch: int = FRAMES_MAX_BATCH, maxsize: int = FRAMES_MAXSIZE, overflow: str = 'drop_oldest') -> AsyncIterator[FrameBatch]:
+        """Subscribe and yield the batches of the subscription until it is closed, it is detached when the iteration stops"""
+        subscription = self.subscribe(maxsize, overflow)
+        try:
+            while True:
+                batch = await subscription.get(max_batch)
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            self.unsubscribe(subscription)
+
+    def publish(self, records: np.ndarray, host_time_ns):
+        """Queue a block of records for every subscription, host_time_ns is a single value or one per record.
+        The block must not be modified afterwards, it is shared by the subscriptions."""
+        records.flags.writeable = False
+        host_time_ns = np.asarray(host_time_ns, dtype=np.int64)
+        if host_time_ns.ndim == 0:
+            host_time_ns = np.full(len(records), host_time_ns, dtype=np.int64)
+        host_time_ns.flags.writeable = False
+        for subscription in self.subscriptions:
+            subscription.put(records, host_time_ns)
+
+    def subscription_full(self, subscription: FrameSubscription) -> bool:
+        """Pause reading while a 'block' subscription is over its maxsize, returns False if the reading can not be paused"""
+        if not self._full and self.can_pause and self.pause_reading() is False:
+            self.can_pause = False
+        if not self.can_pause:
+            return False
+        self._full.add(id(subscription))
+        return True
+
+    def subscription_drained(self, subscription: FrameSubscription):
+        """Resume reading once no 'block' subscription is full anymore"""
+        if id(subscription) in self._full:
+            self._full.discard(id(subscription))
+            if not self._full and self.resume_reading:
+                self.resume_reading()
+
+    def close(self):
+        """Close every subscription, their consumers stop once they have read the queued records"""
+        for subscription in list(self.subscriptions):
+            self.unsubscribe(subscription)
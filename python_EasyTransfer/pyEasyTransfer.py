@@ -1,12 +1,22 @@
 import asyncio
+from dataclasses import dataclass, field
 import logging
-from math import e
 import time
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from struct import Struct
-from typing import Optional, Any
+from operator import attrgetter
+from typing import Optional, Any, AsyncIterator, Callable
 import serial_asyncio
 from ETData import ETData, ETDataArrays
+from receive_buffer import ReceiveBuffer, RECEIVE_BUFFER_SIZE
+from raw_capture import RawCaptureWriter
+from snapshot_publisher import SNAPSHOT_WINDOW, SnapshotPublisher
+from frame_subscription import FRAMES_MAX_BATCH, FRAMES_MAXSIZE, FrameBatch, FrameBroadcaster
+from arrival_stats import ArrivalStats
+from rtt_tracker import RttTracker
+from checksums import CHECKSUMS, CHECKSUM_FUNCTIONS, checksum_struct, checksum_rows, checksum_to_bytes, valid_rows
+from extended_framing import MAX_SAMPLES_PER_FRAME, EXTENDED_PREFIX_SIZE, max_samples_for_record_size, find_extended_frames, decode_extended_frames
 
 BYTE_FORMATS = {
     'little-endian': '<',
@@ -16,6 +26,11 @@ BYTE_FORMATS = {
     'little-endian-no-alignment': '=',
 }
 
+NUMPY_BYTE_ORDERS = {'<': '<', '>': '>', '!': '>', '@': '=', '=': '='}      # numpy byte order of each struct byte order character
+
+INPUT_FRAMINGS = ['standard', 'extended']       # Framing of the received frames, see extended_framing.py for the extended frames
+RESET_TIME_FIELD = 'reset_time'                 # Output field which makes the device reset its clock, a frame with it set is never skipped as unchanged
+
 
 def numpy_dtype_to_struct_format(dtype: np.dtype) -> str:
     """Given a numpy dtype, return the corresponding struct format character
@@ -78,6 +93,22 @@ def data_to_bytes(data: Any, format_string: str) -> bytes:
     """
     return Struct(format_string).pack(*data)
 
+def xor_checksum(size: int, byte_data: bytes) -> int:
+    """Calculates the EasyTransfer checksum (XOR of the size byte and every data byte) with a single vectorized reduction.
+    
+    Args:
+        size: int
+            The size byte of the packet
+        byte_data: bytes
+            The data to calculate the checksum for, any object supporting the buffer protocol
+    
+    Returns:
+        checksum: int
+    """
+    if len(byte_data) == 0:
+        return size
+    return size ^ int(np.bitwise_xor.reduce(np.frombuffer(byte_data, dtype=np.uint8)))
+
 def calculate_checksum(byte_data: bytes) -> tuple[np.uint8, np.uint8]:
     """Calculates the checksum from byte data.
     
@@ -89,15 +120,300 @@ def calculate_checksum(byte_data: bytes) -> tuple[np.uint8, np.uint8]:
         [checksum: np.uint8, data_size: np.uint8]
     """
     size = np.uint8(len(byte_data))
-    checksum = size
-    for b in byte_data:
-        int_b = int(b)
-        checksum ^= int_b
-    checksum = np.uint8(checksum)   # Convert the checksum to a uint8
+    checksum = np.uint8(xor_checksum(int(size), byte_data))
     return checksum, size      
 
+def create_record_dtype(byte_format: str, struct_def: dict[str, np.dtype]) -> np.dtype:
+    """Given a byte order and a struct definition, return the numpy structured dtype matching the packed struct layout
+    
+    Args:
+        byte_format: str
+            The byte order to use. Must be one of 'little-endian', 'big-endian', 'network', 'native', or 'little-endian-no-alignment'
+        struct_def: dict[str, np.dtype]
+            The struct definition to use. Must be a dictionary of {field_name: dtype} pairs.
+    
+    Returns:
+        record_dtype: np.dtype
+    """
+    byte_order = BYTE_FORMATS[byte_format]
+    fields = [(variable, np.dtype(_dtype).newbyteorder(NUMPY_BYTE_ORDERS[byte_order])) for variable, _dtype in struct_def.items()]
+    record_dtype = np.dtype(fields, align=(byte_order == '@'))        # Native byte format uses C alignment, the same as the struct module
+    if byte_order == '@':
+        # The struct module does not pad the end of a native struct, so the record is the size of the packet
+        packet_size = Struct(create_struct_format(byte_format, struct_def)).size
+        record_dtype = np.dtype({'names': record_dtype.names, 'formats': [record_dtype.fields[name][0] for name in record_dtype.names],
+                                 'offsets': [record_dtype.fields[name][1] for name in record_dtype.names], 'itemsize': packet_size})
+    return record_dtype
+
+def find_frames(buffer: np.ndarray, packet_size: int, header_bytes: bytes, checksum: str = 'xor', byte_order: str = '<') -> tuple[np.ndarray, int, int]:
+    """Find every complete frame with a valid checksum in a buffer using vectorized operations.
+    
+    A frame is [header bytes, size byte, packet, checksum bytes]. Only frames whose size byte matches packet_size are accepted.
+    
+    Args:
+        buffer: np.ndarray
+            The received bytes as a uint8 array
+        packet_size: int
+            The expected size of the packet (the ETData data) in bytes
+        header_bytes: bytes
+            The header bytes which start every frame
+        checksum: str
+            The checksum mode, one of CHECKSUMS
+        byte_order: str
+            The struct byte order character of the link, used for the 2 byte checksums
+    
+    Returns:
+        [frame_starts: np.ndarray, consumed: int, num_bad_frames: int]
+            The start index of each valid frame, the number of bytes at the start of the buffer that can be discarded, 
+            and the number of complete frames which failed the size or checksum validation
+    """
+    header_size = len(header_bytes)
+    packet_start = header_size + 1                          # Offset of the packet from the start of the frame (header + size byte)
+    frame_size = packet_start + packet_size + CHECKSUMS[checksum]        # Header, size byte, packet, checksum bytes
+    buffer_size = len(buffer)
+    if buffer_size < frame_size:
+        # No complete frame can be in the buffer, keep everything from the first possible header
+        candidates = np.flatnonzero(buffer == header_bytes[0])
+        return np.empty(0, dtype=np.intp), int(candidates[0]) if len(candidates) else buffer_size, 0
+
+    # Find every candidate header in the buffer
+    candidates = buffer[:buffer_size-header_size+1] == header_bytes[0]
+    for i in range(1, header_size):
+        candidates &= buffer[i:buffer_size-header_size+1+i] == header_bytes[i]
+    candidates = np.flatnonzero(candidates)
+    complete = candidates[candidates + frame_size <= buffer_size]
+
+    # Validate the size byte, then the checksum of all frames at once
+    sized = complete[buffer[complete + header_size] == packet_size]
+    frame_bytes = sliding_window_view(buffer, frame_size)[sized, header_size:]     # Copies only the candidate frames
+    valid = valid_rows(frame_bytes, checksum, byte_order)
+    frame_starts = sized[valid]
+
+    # A false header inside a valid frame can also validate, keep only non-overlapping frames
+    if len(frame_starts) > 1 and np.any(np.diff(frame_starts) < frame_size):
+        keep = []
+        next_start = 0
+        for start in frame_starts.tolist():
+            if start >= next_start:
+                keep.append(start)
+                next_start = start + frame_size
+        frame_starts = np.array(keep, dtype=np.intp)
+
+    # Count the complete candidates which are neither a valid frame nor a false header inside a valid frame
+    frame_index = np.searchsorted(frame_starts, complete, side='right') - 1
+    inside_frame = (frame_index >= 0) & (complete < frame_starts[np.maximum(frame_index, 0)] + frame_size) if len(frame_starts) else np.zeros(len(complete), dtype=bool)
+    num_bad_frames = int(np.count_nonzero(~inside_frame))
+
+    # Everything before the last valid frame end can be discarded, keep any incomplete frame after it
+    last_end = int(frame_starts[-1]) + frame_size if len(frame_starts) else 0
+    incomplete = candidates[(candidates + frame_size > buffer_size) & (candidates >= last_end)]
+    if len(incomplete):
+        consumed = int(incomplete[0])
+    else:
+        consumed = buffer_size - header_size + 1        # Keep bytes which could be the start of a header
+        consumed = max(consumed, last_end)
+    return frame_starts, consumed, num_bad_frames
+
+def decode_frames(buffer: np.ndarray, frame_starts: np.ndarray, record_dtype: np.dtype, header_size: int=2) -> np.ndarray:
+    """Decode the packets of the given frames into a numpy structured array in one pass.
+    
+    Args:
+        buffer: np.ndarray
+            The received bytes as a uint8 array
+        frame_starts: np.ndarray
+            The start index of each frame, as returned by find_frames
+        record_dtype: np.dtype
+            The structured dtype of the packet, as returned by create_record_dtype
+        header_size: int
+            The number of header bytes before the size byte
+    
+    Returns:
+        records: np.ndarray
+    """
+    packet_start = header_size + 1
+    packet_bytes = sliding_window_view(buffer, packet_start + record_dtype.itemsize)[frame_starts, packet_start:]
+    return np.ascontiguousarray(packet_bytes).view(record_dtype)[:, 0]
+
+def encode_frames(records: np.ndarray, header_bytes: bytes = b'\x06\x85', checksum: str = 'xor', byte_order: str = '<') -> np.ndarray:
+    """Encode a numpy structured array of packets into EasyTransfer frames in one pass, the inverse of decode_frames.
+    
+    Args:
+        records: np.ndarray
+            The packets to encode, with the dtype returned by create_record_dtype
+        header_bytes: bytes
+            The header bytes which start every frame
+        checksum: str
+            The checksum mode, one of CHECKSUMS
+        byte_order: str
+            The struct byte order character of the link, used for the 2 byte checksums
+    
+    Returns:
+        frames: np.ndarray
+            A (num_records, frame_size) uint8 array, use .tobytes() to get the byte stream
+    """
+    header_size = len(header_bytes)
+    packet_size = records.dtype.itemsize
+    footer_size = CHECKSUMS[checksum]
+    frames = np.empty((len(records), header_size + 1 + packet_size + footer_size), dtype=np.uint8)
+    frames[:, :header_size] = np.frombuffer(bytes(header_bytes), dtype=np.uint8)
+    frames[:, header_size] = packet_size
+    frames[:, header_size+1:-footer_size] = np.ascontiguousarray(records).view(np.uint8).reshape(len(records), packet_size)
+    frames[:, -footer_size:] = checksum_to_bytes(checksum_rows(frames[:, header_size:-footer_size], checksum), checksum, byte_order)
+    return frames
+
+
+class ETCodec:
+    """Precompiled encoder and decoder for the frames of one struct_def.
+    
+    Everything that only depends on the struct_def is resolved once at construction: the Struct for the packet, the accepted python 
+    types of each field, and a preallocated frame buffer with the header and size byte already written. Encoding packs the values 
+    into the frame buffer in place and writes the checksum, decoding unpacks straight into the attributes of the target object.
+    When the target is an ETData whose record has the record_dtype of the codec, the packet bytes are copied into or out of the 
+    record instead, without unpacking the fields.
+    
+    Args:
+        struct_def: dict[str, np.dtype]
+            The struct definition to use. Must be a dictionary of {field_name: dtype} pairs.
+        byte_format: str
+            The byte order to use. Must be one of 'little-endian', 'big-endian', 'network', 'native', or 'little-endian-no-alignment'
+        header_bytes: bytes
+            The header bytes which start every frame
+        name: str
+            The name used in error messages
+        packet_type: int
+            The packet type byte which precedes the struct in the packet on a multiplexed link, None if the link carries a single struct
+        checksum: str
+            The checksum mode, one of CHECKSUMS
+    """
+    def __init__(self, struct_def: dict[str, np.dtype], byte_format: str = 'little-endian', header_bytes: bytes = b'\x06\x85', name: str = 'ETCodec',
+                 packet_type: Optional[int] = None, checksum: str = 'xor'):
+        self.struct_def = struct_def
+        self.name = name
+        self.packet_type = packet_type
+        self.keys = tuple(struct_def.keys())
+        self.packet_struct = Struct(create_struct_format(byte_format, struct_def))      # Struct for the ETData data
+        self.record_dtype = create_record_dtype(byte_format, struct_def)                # Structured dtype of the ETData data, the layout of the struct in the packet
+        self.struct_offset = 0 if packet_type is None else 1                            # Offset of the struct in the packet, after the packet type byte
+        self.packet_size = self.struct_offset + self.packet_struct.size
+        if self.packet_size > 255:
+            raise ValueError(f"'{name}': The packet is {self.packet_size} bytes, the size byte limits packets to 255 bytes")
+        self.header_size = len(header_bytes)
+        self.packet_start = self.header_size + 1                                        # Header bytes then the size byte
+        self.footer_start = self.packet_start + self.packet_size                        # Offset of the checksum bytes
+        self.footer_struct = checksum_struct(checksum, BYTE_FORMATS[byte_format])
+        self.frame_size = self.footer_start + self.footer_struct.size                   # Header, size byte, packet, checksum bytes
+        self._checksum_function = CHECKSUM_FUNCTIONS[checksum]
+        
+        # Resolve the python types accepted for each field, python bools are accepted for np.bool_ fields
+        self._accepted_types = tuple((np.dtype(dtype).type, bool) if np.dtype(dtype).type is np.bool_ else (np.dtype(dtype).type,) 
+                                     for dtype in struct_def.values())
+        self._getter = attrgetter(*self.keys) if len(self.keys) > 1 else (lambda data, _getter=attrgetter(self.keys[0]): (_getter(data),))
+        
+        # Preallocate the frame, the header and the size byte never change
+        self.frame = bytearray(self.frame_size)
+        self.frame[:self.header_size] = header_bytes
+        self.frame[self.header_size] = self.packet_size
+        if packet_type is not None:
+            self.frame[self.packet_start] = packet_type
+        self._checked_bytes = np.frombuffer(self.frame, dtype=np.uint8)[self.header_size:self.footer_start]     # Size byte and packet, view into the frame
+        self._struct_bytes = memoryview(self.frame)[self.packet_start + self.struct_offset:self.footer_start]  # The struct in the packet, view into the frame
+        self._matching_dtype = self.record_dtype        # Last record_dtype found equal to the codec's, comparing structured dtypes is slow
+
+    def has_record_layout(self, data: Any) -> bool:
+        """Return True if data is an ETData whose record has the layout of the struct in the packet"""
+        if not isinstance(data, ETData):
+            return False
+        if data.record_dtype is not self._matching_dtype:
+            if data.record_dtype != self.record_dtype:
+                return False
+            self._matching_dtype = data.record_dtype
+        return True
         
+    def encode(self, data: Any) -> bytearray:
+        """Pack the struct_def fields of data into the preallocated frame and return it. The returned frame is overwritten by the next call.
+        
+        Args:
+            data: Any
+                The object to read the struct_def fields from, usually an ETData object
+        
+        Returns:
+            frame: bytearray
+        """
+        if self.has_record_layout(data):
+            self._struct_bytes[:] = data.record_bytes      # The types were checked when the fields were set
+        else:
+            values = self._getter(data)
+            for value, accepted_types, key in zip(values, self._accepted_types, self.keys):
+                if type(value) not in accepted_types:
+                    raise TypeError(f"'{self.name}': Data type for {key} is {type(value)}, but should be {accepted_types[0]}")
+            self.packet_struct.pack_into(self.frame, self.packet_start + self.struct_offset, *values)
+        self.footer_struct.pack_into(self.frame, self.footer_start, self._checksum_function(self._checked_bytes))
+        return self.frame
+    
+    def decode_into(self, packet: bytes, target: Any, offset: int = 0) -> Optional[tuple]:
+        """Unpack a packet straight into the struct_def attributes of target, returns the unpacked values. An ETData with the 
+        record_dtype of the codec gets a copy of the packet bytes in its record instead, and None is returned.
+        
+        Args:
+            packet: bytes
+                The packet (the packet type byte if any and the ETData data, without header, size or checksum), any object supporting the buffer protocol
+            target: Any
+                The object to set the struct_def fields on, usually an ETData object
+            offset: int
+                The offset of the packet in the given buffer
+        
+        Returns:
+            unpacked_data: Optional[tuple]
+        """
+        start = offset + self.struct_offset
+        if self.has_record_layout(target):
+            target.record_bytes[:] = packet[start:start + self.packet_struct.size]
+            return None
+        unpacked_data = self.packet_struct.unpack_from(packet, start)
+        for key, value in zip(self.keys, unpacked_data):
+            setattr(target, key, value)
+        return unpacked_data
+
+
 
+@dataclass
+class PacketType:
+    """One of the packet types of a multiplexed link. Every packet starts with the type_id byte followed by the struct,
+    so on the Arduino the struct must begin with a uint8_t set to the type_id (which is not part of the struct_def here).
+
+    Args:
+        type_id: int
+            The packet type byte, 0 to 255
+        name: str
+            The name of the packet type, used to look up its data
+        struct_def: dict[str, np.dtype]
+            The struct definition of the packet, after the packet type byte
+        save_data: ETDataArrays
+            The ETDataArrays object the packets are stored in while saving, None to not store them
+    """
+    type_id: int
+    name: str
+    struct_def: dict[str, np.dtype]
+    save_data: Optional[ETDataArrays] = None
+    data: ETData = field(init=False)                    # The most recent packet of this type
+    codec: ETCodec = field(init=False)
+    arrival_stats: ArrivalStats = field(init=False)
+
+    def __post_init__(self):
+        if not 0 <= self.type_id <= 255:
+            raise ValueError(f"Invalid type_id {self.type_id} for packet type '{self.name}'. Must fit in a byte")
+
+
+@dataclass
+class SendStats:
+    """Statistics of the send scheduler of a PyEasyTransfer object"""
+    requests: int = 0                       # Number of send_data calls
+    frames_sent: int = 0                    # Number of frames written to the transport
+    coalesced: int = 0                      # Number of calls merged into a frame which was already pending
+    unchanged: int = 0                      # Number of frames skipped because they were identical to the last frame sent
+    drain_waits: int = 0                    # Number of times sending waited for the transport write buffer to drain
+
+        
 class PyEasyTransfer:
     def __init__(self, com_port: str, baud_rate: int,
                  input_struct_def: Optional[dict[str, np.dtype]] = None,
@@ -106,12 +422,32 @@ class PyEasyTransfer:
                  mode: str = 'both',
                  save_read_data: Optional[ETDataArrays]=None,
                  log: logging.Logger=None,
-                 name: str='PyEasyTransfer object'):
+                 name: str='PyEasyTransfer object',
+                 batch_decode: bool=False,
+                 receive_buffer_size: int=RECEIVE_BUFFER_SIZE,
+                 capture_path: Optional[str]=None,
+                 connection_factory: Optional[Callable]=None,
+                 input_packet_types: Optional[list[PacketType]]=None,
+                 send_window: float=0.0,
+                 send_min_interval: float=0.0,
+                 send_only_changed: bool=True,
+                 write_high_water: Optional[int]=None,
+                 input_framing: str='standard',
+                 max_samples_per_frame: int=MAX_SAMPLES_PER_FRAME,
+                 checksum: str='xor',
+                 publish_name: Optional[str]=None,
+                 publish_window: int=SNAPSHOT_WINDOW):
 
         if mode not in ['input', 'output', 'both']:
             raise ValueError("Invalid mode. Mode must be one of 'input', 'output', 'both'")
+        if input_framing not in INPUT_FRAMINGS:
+            raise ValueError(f"Invalid input_framing '{input_framing}'. Must be one of {INPUT_FRAMINGS}")
+        if checksum not in CHECKSUMS:
+            raise ValueError(f"Invalid checksum '{checksum}'. Must be one of {list(CHECKSUMS)}")
 
-        self.data_received_event = asyncio.Event()           # Event to indicate when data has been received
+        self.data_received_event = asyncio.Event()           # Set when data has been received, cleared by wait_for_data
+        self.connected = False                               # True while the serial connection is open
+        self.frame_broadcaster = FrameBroadcaster(self._pause_reading, self._resume_reading)     # Hands the received records to the frames() subscribers
         self.buffer = bytearray()                            # Buffer to store the data received over the serial connection
         self.log = log                                       # Logger object for logging events, can init as None and be set later                         
         self.com_port = com_port                             # COM port to connect to
@@ -120,39 +456,113 @@ class PyEasyTransfer:
         self.byte_format = byte_format                       # The byte format to use when packing and unpacking data
         self.byte_order = BYTE_FORMATS[byte_format]          # Byte order character to use when packing and unpacking data
         self.name = name
+        self.batch_decode = batch_decode                     # Decode every complete frame in a received chunk at once instead of frame by frame
+        self.receive_buffer_size = receive_buffer_size       # Capacity of the receive buffer in bytes
+        self.input_framing = input_framing                   # 'standard' frames carry one struct, 'extended' frames carry up to max_samples_per_frame structs
+        self.max_samples_per_frame = max_samples_per_frame   # Maximum number of records accepted in one extended frame
+        self.checksum = checksum                             # Checksum of the frames in both directions, 'xor' (EasyTransfer) or 'crc16', see checksums.py
+        self.raw_capture: Optional[RawCaptureWriter] = None  # Writes every raw chunk received to a capture file when set
+        self.connection_factory = connection_factory or serial_asyncio.create_serial_connection     # Coroutine creating the (transport, protocol), see replay_transport.create_replay_connection
+        if capture_path:
+            self.start_capture(capture_path)
+
+        # Send scheduler, see send_data
+        self.send_window = send_window                       # Seconds to wait for further updates of write_data before sending, they are merged into one frame
+        self.send_min_interval = send_min_interval           # Minimum number of seconds between two frames sent
+        self.send_only_changed = send_only_changed           # Skip sending a frame identical to the last one sent, except a frame with reset_time set
+        self.write_high_water = write_high_water             # High-water mark of the transport write buffer in bytes, None for the transport default
+        self.send_stats = SendStats()
+        self.writing_resumed = asyncio.Event()               # Cleared while the transport write buffer is above its high-water mark
+        self.writing_resumed.set()
+        self._last_sent_frame: Optional[bytes] = None
+        self._last_send_time = -np.inf
+        self._send_pending: Optional[asyncio.Future] = None  # Resolved once the coalesced frame has been sent
         
         # Create the header, size, and checksum formats
         self.header_bytes = bytearray([0x06, 0x85])          # Header bytes to look for when receiving data
         self.header_size = len(self.header_bytes)            # Size of the header in bytes
         self.header_format = 'BB'                            # Format string for the header bytes (uint8_t x 2)
         
-        self.size_dtype = np.dtype(np.uint8).newbyteorder(self.byte_order)      # Data type for the size byte
+        self.size_dtype = np.dtype(np.uint8).newbyteorder(NUMPY_BYTE_ORDERS[self.byte_order])      # Data type for the size byte
         self.size_size = self.size_dtype.itemsize                               # Size of the size byte in bytes
         self.size_format = numpy_dtype_to_struct_format(self.size_dtype)        # Format string for the size byte (uint8_t)
         
-        self.footer_dtype = np.dtype(np.uint8).newbyteorder(self.byte_order)    # Data type for the footer checksum byte
-        self.footer_size = self.footer_dtype.itemsize                           # Size of the footer checksum byte in bytes
-        self.footer_format = numpy_dtype_to_struct_format(self.footer_dtype)    # Format string for the footer checksum byte (uint8_t)
+        self.footer_dtype = np.dtype(np.uint8 if CHECKSUMS[checksum] == 1 else np.uint16).newbyteorder(NUMPY_BYTE_ORDERS[self.byte_order])    # Data type for the footer checksum
+        self.footer_size = self.footer_dtype.itemsize                           # Size of the footer checksum in bytes
+        self.footer_format = numpy_dtype_to_struct_format(self.footer_dtype)    # Format string for the footer checksum (uint8_t or uint16_t)
+        self.footer_struct = checksum_struct(checksum, self.byte_order)         # Struct to unpack the footer checksum
+        self.checksum_function = CHECKSUM_FUNCTIONS[checksum]                   # Checksum of the checked bytes of a frame (size byte and packet)
+
+        # A multiplexed link routes each packet to the data of its packet type, read_data is the data of the first packet type
+        self.packet_types: dict[int, PacketType] = {}                 # Dispatch table of the packet types by type_id, empty for a single struct link
+        if input_packet_types:
+            if input_struct_def or save_read_data:
+                raise ValueError("Give either input_packet_types, with a save_data per packet type, or an input_struct_def and save_read_data.")
+            if batch_decode:
+                raise ValueError("batch_decode is not supported with input_packet_types, the packets do not have a fixed size.")
+            if input_framing == 'extended':
+                raise ValueError("input_framing 'extended' is not supported with input_packet_types, the records of a frame share one struct_def.")
+            for packet_type in input_packet_types:
+                if packet_type.type_id in self.packet_types:
+                    raise ValueError(f"Duplicate type_id {packet_type.type_id} for packet type '{packet_type.name}'")
+                packet_type.data = ETData(packet_type.struct_def, name=f"{name} {packet_type.name}", record_dtype=create_record_dtype(self.byte_format, packet_type.struct_def))
+                packet_type.codec = ETCodec(packet_type.struct_def, self.byte_format, self.header_bytes, name=f"{name} {packet_type.name}", packet_type=packet_type.type_id,
+                                            checksum=checksum)
+                packet_type.arrival_stats = ArrivalStats.for_struct_def(packet_type.struct_def)
+                self.packet_types[packet_type.type_id] = packet_type
+            input_struct_def = input_packet_types[0].struct_def
+            save_read_data = input_packet_types[0].save_data
+        self.unknown_packets = 0                                      # Number of valid frames with a packet type which is not in packet_types
 
         # Depending on the mode, initialize the appropriate data classes
         if self.mode in ['input', 'both']:
             if not input_struct_def:
                 raise ValueError("An input_struct_def must be provided when mode is 'input' or 'both'.")
-            self.read_data = ETData(input_struct_def, name=name)           # Read from this to get the data from the Arduino
+            self.read_data = ETData(input_struct_def, name=name, record_dtype=create_record_dtype(self.byte_format, input_struct_def))     # Read from this to get the data from the Arduino
             self.buffer_size = self.read_data.struct_bytes      # Size of the buffer in bytes
 
         if self.mode in ['output', 'both']:
             if not output_struct_def:
                 raise ValueError("An output_struct_def must be provided when mode is 'output' or 'both'.")
-            self.write_data = ETData(output_struct_def, name=name)         # Write to this to send data to the Arduino
+            self.write_data = ETData(output_struct_def, name=name, record_dtype=create_record_dtype(self.byte_format, output_struct_def))  # Write to this to send data to the Arduino
 
         self.save_read_data = save_read_data    # This is the ETDataArrays object which is used to store the data. If this is not initialized then the data will not be stored
         self.start_saving_data = False          # This is used to indicate when to start saving data
 
         if self.mode in ['input', 'both']:
             self.struct_format_read = create_struct_format(self.byte_format, self.read_data.struct_def)
+            self.record_dtype_read = create_record_dtype(self.byte_format, self.read_data.struct_def)
+            if self.input_framing == 'extended':
+                # Extended frames are decoded as blocks of records, the struct is not limited by the size byte so there is no codec
+                if not 0 < max_samples_per_frame <= max_samples_for_record_size(self.record_dtype_read.itemsize):
+                    raise ValueError(f"Invalid max_samples_per_frame {max_samples_per_frame}, must be between 1 and {max_samples_for_record_size(self.record_dtype_read.itemsize)}")
+                self.read_codec = None
+                self.max_frame_size = self.header_size + EXTENDED_PREFIX_SIZE + max_samples_per_frame*self.record_dtype_read.itemsize + self.footer_size
+                self.receive_buffer_size = max(self.receive_buffer_size, 2*self.max_frame_size)      # The buffer must hold a complete frame
+            else:
+                self.read_codec = ETCodec(self.read_data.struct_def, self.byte_format, self.header_bytes, name=name, checksum=checksum)
+            self.arrival_stats = ArrivalStats.for_struct_def(self.read_data.struct_def)     # Inter-arrival, jitter and latency statistics of the received frames
+            if self.packet_types:
+                first_type = input_packet_types[0]
+                self.read_data, self.read_codec, self.arrival_stats = first_type.data, first_type.codec, first_type.arrival_stats
+            self.packet_sizes = frozenset(packet_type.codec.packet_size for packet_type in self.packet_types.values()) or frozenset([self.read_codec.packet_size] if self.read_codec else [])     # Valid values of the size byte
         if self.mode in ['output', 'both']:
             self.struct_format_write = create_struct_format(self.byte_format, self.write_data.struct_def)
+            self.write_codec = ETCodec(self.write_data.struct_def, self.byte_format, self.header_bytes, name=name, checksum=checksum)
+            self._reset_time_field = RESET_TIME_FIELD if RESET_TIME_FIELD in self.write_data.struct_def else None
+
+        # Round-trip time of the commands, if the device echoes the tag of the last command received
+        self.rtt_tracker: Optional[RttTracker] = None
+        if self.mode == 'both':
+            input_fields = dict(input_struct_def)
+            for packet_type in self.packet_types.values():
+                input_fields.update(packet_type.struct_def)
+            self.rtt_tracker = RttTracker.for_struct_defs(output_struct_def, input_fields)
+
+        # Live snapshot of the received records for other local processes, see snapshot_publisher.SnapshotReader
+        self.publisher: Optional[SnapshotPublisher] = None
+        if publish_name:
+            self.start_publishing(publish_name, publish_window)
 
     def set_log(self, log: logging.Logger):
         """Set the log object for this PyEasyTransfer instance."""
@@ -166,76 +576,203 @@ class PyEasyTransfer:
         """Stop saving data to the given ETDataArrays object."""
         self.start_saving_data = not stop_saving_data
 
+    def start_capture(self, capture_path: str, flush_interval: float = 0.25):
+        """Start writing every raw chunk received from the serial connection to a capture file, see raw_capture.load_raw_capture to read it back."""
+        self.stop_capture()
+        self.raw_capture = RawCaptureWriter(capture_path, flush_interval=flush_interval)
+
+    def stop_capture(self):
+        """Stop the raw capture and close the capture file."""
+        if self.raw_capture:
+            self.raw_capture.close()
+            self.raw_capture = None
+
+    def start_publishing(self, publish_name: str, publish_window: int = SNAPSHOT_WINDOW):
+        """Start publishing the latest record and the publish_window most recent records into the shared memory segment publish_name,
+        other local processes read them with snapshot_publisher.SnapshotReader(publish_name)."""
+        if self.mode not in ['input', 'both']:
+            raise ValueError("The PyEasyTransfer object is not in input mode. There is no data to publish.")
+        if self.packet_types:
+            raise ValueError("Publishing is not supported with input_packet_types, the packets do not share one struct_def.")
+        self.stop_publishing()
+        self.publisher = SnapshotPublisher(publish_name, self.record_dtype_read, publish_window,
+                                           metadata={'name': self.name, 'byte_format': self.byte_format,
+                                                     'struct_def': {key: np.dtype(value).str for key, value in self.read_data.struct_def.items()}})
+
+    def stop_publishing(self):
+        """Stop publishing and remove the shared memory segment."""
+        if self.publisher:
+            self.publisher.close()
+            self.publisher = None
+
+    def _pause_reading(self) -> bool:
+        """Stop reading from the serial connection, while a 'block' frames() subscriber is full. Returns False if the transport
+        can not pause its reading, the 'block' subscribers then drop their oldest records."""
+        transport = getattr(self, '_transport', None)
+        if transport is None:
+            return True
+        try:
+            transport.pause_reading()
+        except NotImplementedError:
+            if self.log:
+                self.log.warning(f"'{self.name}': {type(transport).__name__} can not pause reading, the full 'block' frames() subscribers drop their oldest records")
+            return False
+        return True
+
+    def _resume_reading(self):
+        """Resume reading from the serial connection"""
+        transport = getattr(self, '_transport', None)
+        if transport is not None and not transport.is_closing():
+            transport.resume_reading()
+
+    def frames(self, max_batch: int = FRAMES_MAX_BATCH, maxsize: int = FRAMES_MAXSIZE, overflow: str = 'drop_oldest') -> AsyncIterator[FrameBatch]:
+        """Iterate over the received records as they arrive, until the connection is closed: async for batch in et.frames(): ...
+
+        Args:
+            max_batch: int
+                The maximum number of records in one batch
+            maxsize: int
+                The maximum number of records queued for this subscriber
+            overflow: str
+                What to do when more than maxsize records are queued, see frame_subscription.OVERFLOW_POLICIES
+
+        Returns:
+            batches: AsyncIterator[FrameBatch]
+                The records received since the previous batch (read-only, shared with the other subscribers), their host times
+                and the number of records dropped by the overflow policy
+        """
+        if self.mode not in ['input', 'both']:
+            raise ValueError("The PyEasyTransfer object is not in input mode. There are no frames to subscribe to.")
+        if self.packet_types:
+            raise ValueError("frames() is not supported with input_packet_types, the packets do not share one struct_def.")
+        return self.frame_broadcaster.frames(max_batch, maxsize, overflow)
+
+    def connection_lost(self):
+        """The serial connection was closed, end the frames() subscriptions and wake up the listeners."""
+        self.connected = False
+        self.frame_broadcaster.close()
+        self.data_received_event.set()
+
+    def get_rtt_stats(self) -> Optional[dict[str, float]]:
+        """Return the round-trip time statistics of the commands (count, p50_s, p95_s, p99_s, ...), None if the device does not echo the command tag."""
+        return self.rtt_tracker.summary() if self.rtt_tracker else None
+
+    def get_resync_stats(self) -> Optional['ResyncStats']:
+        """Return the resynchronization statistics of the receiver, None if the connection has not been opened for input."""
+        reader = getattr(self, 'reader', None)
+        return reader.resync_stats if reader is not None else None
+
     async def open(self):
         """Open the serial connection"""
         loop = asyncio.get_running_loop()
         if self.mode in ['input', 'both']:
-            self._transport, self.reader = await serial_asyncio.create_serial_connection(loop, EasyTransferReceiver, self.com_port, baudrate=self.baud_rate)
-            self.reader.pyeasytransfer = self
+            self._transport, self.reader = await self.connection_factory(loop, lambda: EasyTransferReceiver(self, self.receive_buffer_size), self.com_port, baudrate=self.baud_rate)
         if self.mode in ['output', 'both']:
             self.writer = self._transport
+            if self.write_high_water is not None and hasattr(self.writer, 'set_write_buffer_limits'):
+                self.writer.set_write_buffer_limits(high=self.write_high_water)
+        self.connected = True
 
     async def close(self):
         """Close the serial connection"""
         if self._transport:
             self._transport.close()
-            await self._transport._closing
+            closing = getattr(self._transport, '_closing', None)       # serial_asyncio and the replay transport resolve this future once closed
+            if asyncio.isfuture(closing):
+                await closing
+        self.stop_capture()
+        self.stop_publishing()
+        self.connection_lost()
         
-    async def send_data(self):
-        """Send the data to the serial connection"""
-        if self.mode in ['both', 'output']:
-            # Get the data from the write_data object
-            data = [getattr(self.write_data, key) for key in self.write_data.struct_def.keys()]
-
-            # Check the data has the write dtype
-            for i, (key, dtype) in enumerate(self.write_data.struct_def.items()):
-                if type(data[i]) != dtype:
-                    if type(data[i]) == bool:
-                        # If bool then set to np.bool_
-                        setattr(self.write_data, key, np.bool_(data[i]))
-                    else:
-                        raise TypeError(f"'{self.name}': Data type for {key} is {type(data[i])}, but should be {dtype}")
-
-            # Get the packed data and calculate the checksum
-            packed_data = data_to_bytes(data, self.struct_format_write)
-            checksum, packed_data_size = calculate_checksum(packed_data)
-                
-            # Create the format string for the header and footer
-            full_format = self.byte_order + self.header_format + self.size_format + self.struct_format_write.replace(self.byte_order, "") + self.footer_format
-
-            # Pack the data into a byte array and send it
-            byte_data_with_checksum = Struct(full_format).pack(self.header_bytes[0], self.header_bytes[1], packed_data_size, *data, checksum)
-            self.writer.write(byte_data_with_checksum)
-            await asyncio.sleep(0)          # yield control to the event loop
-            self.log.debug(f"Sent data: {data}. Checksum sent: {checksum}")
-        else:
+    async def send_data(self, force: bool = False):
+        """Send the write_data to the serial connection.
+
+        The frame is sent immediately unless send_window or send_min_interval delay it. Calls made while a frame is delayed are
+        merged into it, and every caller returns once it has been sent with the write_data at that time. A frame identical to the
+        last one sent is skipped when send_only_changed is set, unless its reset_time field is set (the device resets its clock on
+        every such frame). Writing waits while the transport write buffer is above its high-water mark.
+
+        Args:
+            force: bool
+                Send immediately, even if the frame did not change, without waiting for the send window (e.g. an emergency stop)
+        """
+        if self.mode not in ['both', 'output']:
             raise ValueError("The PyEasyTransfer object is not in output mode. Data sending is not allowed.")
+        self.send_stats.requests += 1
+        loop = asyncio.get_running_loop()
+        if force or (self._send_pending is None and self.send_window <= 0 and loop.time() >= self._last_send_time + self.send_min_interval):
+            await self._send_frame(force)
+            return
+
+        # Merge into the pending frame, or schedule a new one
+        if self._send_pending is None:
+            self._send_pending = loop.create_future()
+            loop.create_task(self._send_delayed(self._send_pending))
+        else:
+            self.send_stats.coalesced += 1
+        await asyncio.shield(self._send_pending)
+
+    async def _send_delayed(self, pending: asyncio.Future):
+        """Send the pending frame once the send window and the minimum interval have passed"""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(self.send_window, self._last_send_time + self.send_min_interval - loop.time()))
+        self._send_pending = None           # Calls from now on need a new frame as the write_data is encoded below
+        try:
+            await self._send_frame()
+        except Exception as e:
+            pending.set_exception(e)
+        else:
+            pending.set_result(None)
+
+    async def _send_frame(self, force: bool = False):
+        """Encode the write_data and write the frame once the transport is below its high-water mark"""
+        if not self.writing_resumed.is_set():
+            self.send_stats.drain_waits += 1
+            await self.writing_resumed.wait()
+
+        # Pack the write_data object into the preallocated frame, including the header, size and checksum
+        if self.rtt_tracker:
+            setattr(self.write_data, self.rtt_tracker.tag_field, self.rtt_tracker.last_tag)       # Compare with the same tag as the last frame sent
+        frame = self.write_codec.encode(self.write_data)
+        resets_time = self._reset_time_field is not None and getattr(self.write_data, self._reset_time_field)
+        if self.send_only_changed and not force and not resets_time and frame == self._last_sent_frame:
+            self.send_stats.unchanged += 1
+            return
+        if self.rtt_tracker:
+            setattr(self.write_data, self.rtt_tracker.tag_field, self.rtt_tracker.next_tag(time.perf_counter_ns()))
+            frame = self.write_codec.encode(self.write_data)
+
+        # The transport keeps a reference to the data if it can not be written immediately, so write a copy of the frame
+        self._last_sent_frame = bytes(frame)
+        self.writer.write(self._last_sent_frame)
+        self._last_send_time = asyncio.get_running_loop().time()
+        self.send_stats.frames_sent += 1
+        await asyncio.sleep(0)          # yield control to the event loop
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(f"Sent data: {self.write_codec.packet_struct.unpack_from(frame, self.write_codec.packet_start)}. Checksum sent: 0x{self._last_sent_frame[-self.footer_size:].hex()}")
 
     async def listen(self):
-        """Continuously listen to the COM port"""
+        """Continuously listen to the COM port, until the connection is closed"""
         if self.mode in ['both', 'input']:
-            while True:
+            while self.connected:
                 await self.wait_for_data()
         else:
             raise ValueError("The PyEasyTransfer object is not in input mode. Listening is not allowed.")
 
     async def wait_for_data(self):
-        """Wait for data via listening to the COM port"""
+        """Wait until data is received from the COM port, or the connection is closed"""
         if self.mode in ['both', 'input']:
             await self.data_received_event.wait()
+            self.data_received_event.clear()
         else:
             raise ValueError("The PyEasyTransfer object is not in input mode. Waiting for data is not allowed.")
 
-    def save_data_recevied(self):
-        """Save the current read_data ETData object to the ETDataArrays object."""
-        io_count = self.save_read_data.io_count
-        if self.save_read_data.max_elements > 0 and io_count <= self.save_read_data.max_elements:
-            #keys = list(self.read_data.struct_def.keys())
-            for key in self.read_data.struct_def.keys():
-                #key = keys[i]
-                value = getattr(self.read_data, key)
-                getattr(self.save_read_data, key)[io_count] = value
-            self.save_read_data.io_count += 1
+    def save_data_recevied(self, read_data: Optional[ETData] = None, save_read_data: Optional[ETDataArrays] = None):
+        """Save the current read_data ETData object to the ETDataArrays object, or the given ones for a packet type of a multiplexed link."""
+        read_data = read_data or self.read_data
+        save_read_data = save_read_data or self.save_read_data
+        io_count = save_read_data.io_count
+        if save_read_data.append_record(read_data):
             if io_count % 100 == 0:
                 self.log.debug(f"Saved data to the ETDataArrays object for '{self.name}'. IO count: {io_count}.")
         else:
@@ -253,17 +790,28 @@ class PyEasyTransfer:
                 string += f"{ele}, "
         return string[:-2]      # Remove the last comma and space  
     
-    def data_received(self, packet: bytes):
-        """Data received from the COM port, unpack it and store it in the read_data object."""
+    def data_received(self, packet: bytes, host_time_ns: Optional[int] = None):
+        """Data received from the COM port, unpack it and store it in the read_data object.
+        host_time_ns is the time.perf_counter_ns() when the packet arrived, the current time is used if it is not given."""
         if self.mode in ['both', 'input']:
-            # Unpack the data into the read_data object
-            unpacked_data = Struct(self.struct_format_read).unpack(bytes(packet))
-            # Set the data in the read_data object
-            for key, value in zip(self.read_data.struct_def.keys(), unpacked_data):
-                setattr(self.read_data, key, value)
+            if self.packet_types:
+                self.dispatch_packet(packet, host_time_ns)
+                return
+            # Unpack the data straight into the read_data object
+            self.read_codec.decode_into(packet, self.read_data)
             self.read_data.io_count += 1    # Increment the io count
+            self.read_data.host_time_ns = host_time_ns = host_time_ns or time.perf_counter_ns()
+            device_time_field = self.arrival_stats.device_time_field
+            self.arrival_stats.update(host_time_ns, getattr(self.read_data, device_time_field) if device_time_field else None)
+            if self.rtt_tracker:
+                self.rtt_tracker.echo_received(getattr(self.read_data, self.rtt_tracker.echo_field), host_time_ns)
             if self.read_data.io_count % 100 == 0:
-                self.log.debug(f"'{self.name}': Received data: [{PyEasyTransfer.format_unpacked_data_for_printing(unpacked_data)}], io_count: {self.read_data.io_count}")
+                self.log.debug(f"'{self.name}': Received data: [{PyEasyTransfer.format_unpacked_data_for_printing(self.read_data.record[0].tolist())}], io_count: {self.read_data.io_count}")
+            if self.publisher:
+                self.publisher.publish_packet(packet, host_time_ns)
+            if self.frame_broadcaster:
+                self.frame_broadcaster.publish(np.frombuffer(bytes(packet), dtype=self.record_dtype_read), host_time_ns)
+            self.data_received_event.set()
             #self.log.debug(f"Received data: {unpacked_data}. Checksum received: {unpacked_data[-1]}, io_count: {self.read_data.io_count}")
             # If there is a save data object, then save the data
             if self.save_read_data and self.start_saving_data:
@@ -271,69 +819,301 @@ class PyEasyTransfer:
         else:
             raise ValueError("The PyEasyTransfer object is not in input mode. Data receiving is not allowed.")
 
+    def dispatch_packet(self, packet: bytes, host_time_ns: Optional[int] = None):
+        """Route a packet of a multiplexed link to the data of its packet type, the first byte of the packet is the packet type."""
+        packet_type = self.packet_types.get(packet[0])
+        if packet_type is None or len(packet) != packet_type.codec.packet_size:
+            self.unknown_packets += 1
+            self.log.error(f"'{self.name}': Received a {len(packet)} byte packet with unknown packet type {packet[0]}")
+            return
+        data = packet_type.data
+        packet_type.codec.decode_into(packet, data)
+        data.io_count += 1
+        data.host_time_ns = host_time_ns = host_time_ns or time.perf_counter_ns()
+        device_time_field = packet_type.arrival_stats.device_time_field
+        packet_type.arrival_stats.update(host_time_ns, getattr(data, device_time_field) if device_time_field else None)
+        if self.rtt_tracker and self.rtt_tracker.echo_field in packet_type.struct_def:
+            self.rtt_tracker.echo_received(getattr(data, self.rtt_tracker.echo_field), host_time_ns)
+        if packet_type.save_data and self.start_saving_data:
+            self.save_data_recevied(data, packet_type.save_data)
+        self.data_received_event.set()
+
+    def get_packet_type(self, name: str) -> PacketType:
+        """Return the packet type with the given name, use its data attribute to read the most recent packet of that type."""
+        for packet_type in self.packet_types.values():
+            if packet_type.name == name:
+                return packet_type
+        raise ValueError(f"Unknown packet type '{name}'. Must be one of {[packet_type.name for packet_type in self.packet_types.values()]}")
+
+    def records_received(self, records: np.ndarray, host_time_ns: Optional[int] = None):
+        """Batch of packets received from the COM port and decoded into a numpy structured array, store the last one in the read_data object.
+        host_time_ns is the time.perf_counter_ns() when the packets arrived, the current time is used if it is not given."""
+        if self.mode in ['both', 'input']:
+            # Set the most recent data in the read_data object
+            last_record = records[-1]
+            self.read_data.record[0] = last_record
+            previous_io_count = self.read_data.io_count
+            self.read_data.io_count += len(records)    # Increment the io count
+            self.read_data.host_time_ns = host_time_ns = host_time_ns or time.perf_counter_ns()
+            device_time_field = self.arrival_stats.device_time_field
+            self.arrival_stats.update_block(np.full(len(records), host_time_ns, dtype=np.int64), records[device_time_field] if device_time_field else None)
+            if self.rtt_tracker:
+                # Only the records where the echoed tag changes can match a command
+                echoes = records[self.rtt_tracker.echo_field]
+                for echo in echoes[np.flatnonzero(np.diff(echoes.astype(np.int64), prepend=-1))].tolist():
+                    self.rtt_tracker.echo_received(echo, host_time_ns)
+            if self.read_data.io_count // 100 != previous_io_count // 100:
+                self.log.debug(f"'{self.name}': Received {len(records)} packets, last data: [{PyEasyTransfer.format_unpacked_data_for_printing(last_record.tolist())}], io_count: {self.read_data.io_count}")
+            if self.publisher:
+                self.publisher.publish_records(records, host_time_ns)
+            if self.frame_broadcaster:
+                self.frame_broadcaster.publish(records, host_time_ns)
+            self.data_received_event.set()
+            # If there is a save data object, then save the data
+            if self.save_read_data and self.start_saving_data:
+                self.save_records_received(records, host_time_ns)
+        else:
+            raise ValueError("The PyEasyTransfer object is not in input mode. Data receiving is not allowed.")
+
+    def save_records_received(self, records: np.ndarray, host_time_ns: Optional[int] = None):
+        """Save a batch of decoded packets, and the host time they were received, to the ETDataArrays object."""
+        io_count = self.save_read_data.io_count
+        num_saved = self.save_read_data.append_records(records, host_time_ns)
+        if io_count // 100 != self.save_read_data.io_count // 100:
+            self.log.debug(f"Saved data to the ETDataArrays object for '{self.name}'. IO count: {self.save_read_data.io_count}.")
+        if num_saved < len(records):
+            self.start_saving_data = False      # Flip flag due to max elements reached
+            self.log.error(f"Could not save data to the ETDataArrays object because the max element count has been reached. Stopping data collection.")
+
+
+
+@dataclass
+class ResyncStats:
+    """Statistics of the frame resynchronization of an EasyTransferReceiver"""
+    resync_events: int = 0                  # Number of times the frame sync was lost after a valid frame
+    bytes_skipped: int = 0                  # Number of bytes which were not part of a valid frame
+    bytes_discarded: int = 0                # Number of unprocessed bytes thrown away because the receive buffer was full
+    bad_frames: int = 0                     # Number of header candidates which failed the size or checksum validation
+    recoveries: int = 0                     # Number of times the frame sync was regained after being lost
+    last_recovery_time_s: float = 0.0       # Time from losing to regaining the sync, for the last recovery
+    max_recovery_time_s: float = 0.0        # Longest recovery time
+    total_recovery_time_s: float = 0.0      # Sum of the recovery times
 
+    def add_recovery(self, recovery_time_ns: int):
+        """Record a recovery which took recovery_time_ns nanoseconds"""
+        recovery_time_s = recovery_time_ns / 1e9
+        self.recoveries += 1
+        self.last_recovery_time_s = recovery_time_s
+        self.max_recovery_time_s = max(self.max_recovery_time_s, recovery_time_s)
+        self.total_recovery_time_s += recovery_time_s
 
-class EasyTransferReceiver(asyncio.Protocol):
-    def __init__(self):
-        self.pyeasytransfer: PyEasyTransfer = None
-        self.buffer = bytearray()
+
+class EasyTransferReceiver(asyncio.BufferedProtocol):
+    """Protocol for receiving EasyTransfer packets from the serial port.
+    
+    Transports which support asyncio.BufferedProtocol read directly into the ReceiveBuffer via get_buffer() and buffer_updated(), 
+    other transports (such as serial_asyncio) call data_received() and the data is copied into the ReceiveBuffer.
+    """
+    def __init__(self, pyeasytransfer: Optional['PyEasyTransfer'] = None, buffer_size: int = RECEIVE_BUFFER_SIZE):
+        self.pyeasytransfer: PyEasyTransfer = pyeasytransfer
+        self.buffer = ReceiveBuffer(buffer_size, on_overflow=self._buffer_overflow)
+        self.resync_stats = ResyncStats()
+        self._in_sync = False                       # True once a valid frame has been received, until a bad byte or frame is found
+        self._sync_lost_ns = None                   # time.perf_counter_ns() when the sync was lost
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         """Method called when the serial connection is made. This method is called by the asyncio loop and should not be called directly."""
         self.transport: asyncio.BaseTransport = transport
 
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        """Method called when the serial connection is closed or lost. This method is called by the asyncio loop and should not be called directly."""
+        if exc is not None and self.pyeasytransfer.log:
+            self.pyeasytransfer.log.error(f"'{self.pyeasytransfer.name}': Serial connection lost: {exc}")
+        self.pyeasytransfer.connection_lost()
+
+    def pause_writing(self) -> None:
+        """Method called when the transport write buffer goes above its high-water mark, send_data waits until resume_writing is called."""
+        self.pyeasytransfer.writing_resumed.clear()
+
+    def resume_writing(self) -> None:
+        """Method called when the transport write buffer drains below its low-water mark."""
+        self.pyeasytransfer.writing_resumed.set()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        """Return the free space of the receive buffer for the transport to read into. This method is called by the asyncio loop and should not be called directly."""
+        return self.buffer.get_write_buffer(sizehint)
+
+    def buffer_updated(self, nbytes: int) -> None:
+        """Method called when the transport has written nbytes into the receive buffer. This method is called by the asyncio loop and should not be called directly."""
+        host_time_ns = time.perf_counter_ns()
+        self.buffer.commit(nbytes)
+        if self.pyeasytransfer.raw_capture:
+            self.pyeasytransfer.raw_capture.write(bytes(self.buffer.view(len(self.buffer) - nbytes)))
+        self.process_buffer(host_time_ns)
+
     def data_received(self, data: bytes) -> None:
         """Protocol for receiving data from the serial port. Once data is received, it is added to the buffer and then the buffer is checked for a complete packet.
         Once a complete packet is found, the packet is sent PyEasyTransfer object for unpacking and processing.
         """
-        self.buffer.extend(data)
+        host_time_ns = time.perf_counter_ns()
+        if self.pyeasytransfer.raw_capture:
+            self.pyeasytransfer.raw_capture.write(bytes(data))
+        data = memoryview(data)
+        while data:
+            # Copy as much as fits into the receive buffer, process it, then continue with the rest
+            nbytes = self.buffer.write(data)
+            data = data[nbytes:]
+            self.process_buffer(host_time_ns)
+
+    def process_buffer(self, host_time_ns: Optional[int] = None) -> None:
+        """Process all of the complete packets in the receive buffer, host_time_ns is the time.perf_counter_ns() when the last bytes arrived.
+
+        The buffer is resynchronized on every header candidate: a candidate whose size byte is not one of the known packet sizes,
+        or whose checksum fails, is a false header so only its first byte is skipped and the scan restarts from the next byte.
+        A valid frame hidden inside a corrupted one is therefore never thrown away, and since the size byte is validated before
+        waiting for the rest of the frame, recovery never waits for more than one frame of bytes.
+        """
+        et = self.pyeasytransfer
+        if et.input_framing == 'extended':
+            self.process_buffer_extended(host_time_ns)
+            return
+        if et.batch_decode:
+            self.process_buffer_batch(host_time_ns)
+            return
+
+        packet_start = et.header_size + et.size_size                    # Offset of the packet from the start of the frame
 
         # Look for the header in the buffer
-        index = self.buffer.find(self.pyeasytransfer.header_bytes)
+        index = self.buffer.find(et.header_bytes)
         while index != -1:
             # Remove all bytes before the header
-            self.buffer = self.buffer[index:]
+            if index:
+                self._lose_sync()
+                self._skip(index)
 
             # Check that we have enough bytes for the header and the size byte
-            if len(self.buffer) < self.pyeasytransfer.header_size + self.pyeasytransfer.size_size:
+            if len(self.buffer) < packet_start:
                 break
 
-            # Extract the size of the packet (excluding the header and the size byte itself)
-            packet_size = np.frombuffer(self.buffer[self.pyeasytransfer.header_size:self.pyeasytransfer.header_size+self.pyeasytransfer.size_size], dtype=self.pyeasytransfer.size_dtype)[0]
-            
-            # Check that we have enough bytes for the complete packet, including the checksum byte
-            full_expected_size = self.pyeasytransfer.header_size + self.pyeasytransfer.size_size + packet_size + self.pyeasytransfer.footer_size
-            if len(self.buffer) < full_expected_size:
-                self.pyeasytransfer.log.warning(f"Not enough bytes for the complete packet, expected {full_expected_size}, got {len(self.buffer)}")
-                break
-
-            # Extract the packet of data (the ETData data)
-            packet_start_index = self.pyeasytransfer.header_size + self.pyeasytransfer.size_size        
-            packet_end_index = packet_start_index + packet_size
-            packet = self.buffer[packet_start_index:packet_end_index]
-            
-            # Extract the checksum byte
-            received_checksum = self.buffer[packet_end_index]
+            # The size byte must match a known packet size, otherwise this is a false header or a corrupted size byte
+            packet_size = self.buffer.view(et.header_size, packet_start)[0]
+            if packet_size not in et.packet_sizes:
+                self._lose_sync()
+                self.resync_stats.bad_frames += 1
+                self._skip(1)
+                index = self.buffer.find(et.header_bytes)
+                continue
 
-            # Remove the extracted bytes from the buffer
-            end_index = packet_end_index + self.pyeasytransfer.footer_size
-            self.buffer = self.buffer[end_index:]
+            # Wait for the rest of the frame, this is at most one frame as the size has been validated
+            packet_end = packet_start + packet_size                     # Offset of the checksum bytes from the start of the frame
+            frame_size = packet_end + et.footer_size
+            if len(self.buffer) < frame_size:
+                break
 
-            # Compute the expected checksum, note, each item is a byte in the packet, packet_size is the number of bytes in the packet as a byte
-            # expected_checksum = packet_size
-            # for item in packet:
-            #     item = int(item)
-            #     expected_checksum ^= item
-            expected_checksum, _ = calculate_checksum(packet)
+            # Extract the packet of data (the ETData data), this is a view into the receive buffer
+            packet = self.buffer.view(packet_start, packet_end)
+            received_checksum, = et.footer_struct.unpack_from(self.buffer.view(packet_end, frame_size))
+            expected_checksum = et.checksum_function(self.buffer.view(et.header_size, packet_end))     # Checksum of the size byte and packet
 
-            # If the checksums match, pass the packet to PyEasyTransfer
+            # If the checksums match, pass the packet to PyEasyTransfer, otherwise rescan from the byte after the header
             if expected_checksum == received_checksum:
-                self.pyeasytransfer.data_received(packet)
+                self._regain_sync()
+                et.data_received(packet, host_time_ns)
+                self.buffer.consume(frame_size)     # Remove the extracted bytes from the buffer
             else:
-                self.pyeasytransfer.log.error(f"Checksum validation failed. Received: {received_checksum}, expected: {expected_checksum}")
+                if self._in_sync:
+                    et.log.error(f"Checksum validation failed. Received: {received_checksum}, expected: {expected_checksum}")
+                self._lose_sync()
+                self.resync_stats.bad_frames += 1
+                self._skip(1)
 
             # Look for the next header in the remaining buffer
-            index = self.buffer.find(self.pyeasytransfer.header_bytes)
+            index = self.buffer.find(et.header_bytes)
+        else:
+            # No header in the buffer, keep only the bytes which could be the start of the next header
+            nbytes = max(len(self.buffer) - et.header_size + 1, 0)
+            if nbytes:
+                self._lose_sync()
+                self._skip(nbytes)
+
+    def _buffer_overflow(self, nbytes: int) -> None:
+        """The receive buffer was full of unprocessed bytes and nbytes of them were thrown away"""
+        self.resync_stats.bytes_discarded += nbytes
+        et = self.pyeasytransfer
+        if et is not None and et.log:
+            et.log.warning(f"'{et.name}': Receive buffer full, {nbytes} unprocessed bytes were discarded, increase the receive_buffer_size")
+
+    def _skip(self, nbytes: int) -> None:
+        """Discard nbytes from the start of the receive buffer while resyncing"""
+        self.buffer.discard(nbytes)
+        self.resync_stats.bytes_skipped += int(nbytes)
+
+    def _lose_sync(self) -> None:
+        """Record the loss of frame sync, consecutive bad bytes and frames count as a single resync event"""
+        if self._in_sync:
+            self._in_sync = False
+            self._sync_lost_ns = time.perf_counter_ns()
+            self.resync_stats.resync_events += 1
+
+    def _regain_sync(self) -> None:
+        """Record a valid frame, updating the recovery time if the sync had been lost"""
+        if not self._in_sync:
+            self._in_sync = True
+            if self._sync_lost_ns is not None:
+                self.resync_stats.add_recovery(time.perf_counter_ns() - self._sync_lost_ns)
+                self._sync_lost_ns = None
+
+    def process_buffer_batch(self, host_time_ns: Optional[int] = None) -> None:
+        """Find every complete packet in the buffer, validate the checksums and decode the packets in one vectorized pass.
+        The decoded packets are sent to the PyEasyTransfer object as a numpy structured array.
+        """
+        et = self.pyeasytransfer
+        buffer = self.buffer.array()
+        frame_starts, consumed, num_bad_frames = find_frames(buffer, et.read_codec.packet_size, et.header_bytes, et.checksum, et.byte_order)
+        records = decode_frames(buffer, frame_starts, et.record_dtype_read, et.header_size) if len(frame_starts) else None
+
+        # Remove the processed bytes from the buffer, counting the bytes that were not part of a valid packet as discarded
+        frame_size = et.read_codec.frame_size
+        skipped = consumed - len(frame_starts)*frame_size
+        self.buffer.discard(skipped)
+        self.buffer.consume(len(frame_starts)*frame_size)
+
+        # The order of the bad and valid frames within the chunk is not known, so the recovery time is measured between chunks
+        self.resync_stats.bytes_skipped += int(skipped)
+        self.resync_stats.bad_frames += num_bad_frames
+        if skipped:
+            if num_bad_frames and self._in_sync:
+                et.log.error(f"Size or checksum validation failed for {num_bad_frames} packets")
+            self._lose_sync()
+        if records is not None:
+            self._regain_sync()
+            et.records_received(records, host_time_ns)
+
+    def process_buffer_extended(self, host_time_ns: Optional[int] = None) -> None:
+        """Find every complete extended frame in the buffer and decode all of their records in one pass.
+        The records are sent to the PyEasyTransfer object as a single numpy structured array.
+        """
+        et = self.pyeasytransfer
+        buffer = self.buffer.array()
+        record_starts, counts, consumed, num_bad_frames = find_extended_frames(buffer, et.record_dtype_read.itemsize, et.header_bytes,
+                                                                               et.byte_order, et.max_samples_per_frame, et.checksum)
+        records = decode_extended_frames(buffer, record_starts, counts, et.record_dtype_read) if len(record_starts) else None
+
+        # Remove the processed bytes from the buffer, counting the bytes that were not part of a valid frame as discarded
+        frame_bytes = int(counts.sum())*et.record_dtype_read.itemsize + len(counts)*(et.header_size + EXTENDED_PREFIX_SIZE + et.footer_size)
+        skipped = consumed - frame_bytes
+        self.buffer.discard(skipped)
+        self.buffer.consume(frame_bytes)
+
+        self.resync_stats.bytes_skipped += int(skipped)
+        self.resync_stats.bad_frames += num_bad_frames
+        if skipped:
+            if num_bad_frames and self._in_sync:
+                et.log.error(f"Length, count or checksum validation failed for {num_bad_frames} extended frames")
+            self._lose_sync()
+        if records is not None:
+            self._regain_sync()
+            et.records_received(records, host_time_ns)
 
 
 def get_data_struct_size_from_struct_def(struct_def: dict[str, np.dtype]) -> int:
@@ -0,0 +1,176 @@
+from collections import deque
+import os
+import threading
+import time
+from struct import Struct
+import numpy as np
+
+""" Raw capture file format
+
+    The file starts with the CAPTURE_MAGIC bytes, followed by one record per chunk received from the serial transport:
+        uint64  host monotonic timestamp of the chunk in nanoseconds (time.monotonic_ns)
+        uint32  number of bytes in the chunk
+        bytes   the raw chunk
+    All integers are little-endian.
+"""
+CAPTURE_MAGIC = b'ETCAP\x01'
+CHUNK_HEADER = Struct('<QI')
+
+
+class RawCaptureWriter:
+    """Writes every raw chunk received from a serial transport to a capture file, tagged with the host monotonic timestamp.
+
+    write() only appends the chunk to a thread-safe queue, a background thread batches the queued chunks into a single file write
+    every flush_interval seconds so the event loop never blocks on file I/O.
+
+    Args:
+        file_path: str
+            The path of the capture file, it is overwritten if it exists
+        flush_interval: float
+            The number of seconds between batched writes to the file
+    """
+    def __init__(self, file_path: str, flush_interval: float = 0.25):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.bytes_captured = 0                         # Number of raw bytes captured (not including the chunk headers)
+        self.chunks_captured = 0                        # Number of chunks captured
+        self._queue = deque()                           # Chunks waiting to be written, deque append/popleft are thread-safe
+        self._stop_event = threading.Event()
+        self._file = open(file_path, 'wb')
+        self._file.write(CAPTURE_MAGIC)
+        self._thread = threading.Thread(target=self._run, name=f"RawCaptureWriter({os.path.basename(file_path)})", daemon=True)
+        self._thread.start()
+
+    def write(self, data: bytes):
+        """Queue a raw chunk for writing, data must not be modified afterwards (pass bytes, not a view into a reused buffer)"""
+        self._queue.append((time.monotonic_ns(), data))
+
+    def _write_queued(self):
+        """Write every queued chunk to the file in one call"""
+        parts = []
+        num_bytes = 0
+        while self._queue:
+            timestamp_ns, data = self._queue.popleft()
+            parts.append(CHUNK_HEADER.pack(timestamp_ns, len(data)))
+            parts.append(data)
+            num_bytes += len(data)
+        if parts:
+            self._file.write(b''.join(parts))
+            self._file.flush()
+            self.bytes_captured += num_bytes
+            self.chunks_captured += len(parts) // 2
+
+    def _run(self):
+        """Background thread, writes the queued chunks until close() is called"""
+        while not self._stop_event.wait(self.flush_interval):
+            self._write_queued()
+        self._write_queued()
+
+    def close(self):
+        """Write the remaining chunks and close the capture file"""
+        if self._thread.is_alive():
+            self._stop_event.set()
+            self._thread.join()
+            self._file.close()
+
+
+class CaptureStream:
+    """The raw stream of a capture file, read lazily from a memory map of the file.
+
+    The chunks are interleaved with their headers in the file, so the stream is not one array. Slicing it returns a uint8 array
+    of the requested bytes: a view of the map if they are in one chunk, or a copy of just those bytes otherwise. Only the
+    slices in use are held in memory, so captures larger than the RAM can be decoded (see capture_decoder.decode_capture_buffer)
+    or replayed.
+
+    Args:
+        data: np.ndarray
+            The uint8 memory map of the capture file
+        file_offsets: np.ndarray
+            The offset of the data of each chunk in the file
+        chunk_offsets: np.ndarray
+            The offset of each chunk in the stream
+        sizes: np.ndarray
+            The number of bytes of each chunk
+    """
+    def __init__(self, data: np.ndarray, file_offsets: np.ndarray, chunk_offsets: np.ndarray, sizes: np.ndarray):
+        self._data = data
+        self._file_offsets = file_offsets
+        self._chunk_offsets = chunk_offsets
+        self._sizes = sizes
+        self.size = int(sizes.sum())
+        self.dtype = np.dtype(np.uint8)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            index = index + self.size if index < 0 else index
+            if not 0 <= index < self.size:
+                raise IndexError(f"Index {index} is out of range for a stream of {self.size} bytes")
+            return self[index:index + 1][0]
+        start, stop, step = index.indices(self.size)
+        if step != 1:
+            return self[start:stop][::step] if start < stop else np.empty(0, dtype=np.uint8)
+        if start >= stop:
+            return np.empty(0, dtype=np.uint8)
+        first = int(np.searchsorted(self._chunk_offsets, start, side='right')) - 1
+        last = int(np.searchsorted(self._chunk_offsets, stop, side='left'))
+        parts = []
+        for chunk in range(first, last):
+            chunk_start = int(self._chunk_offsets[chunk])
+            begin = max(start, chunk_start) - chunk_start
+            end = min(stop, chunk_start + int(self._sizes[chunk])) - chunk_start
+            if end > begin:
+                file_offset = int(self._file_offsets[chunk])
+                parts.append(self._data[file_offset + begin:file_offset + end])
+        if len(parts) == 1:
+            return parts[0].view(np.ndarray)
+        return np.concatenate(parts)
+
+    def tobytes(self) -> bytes:
+        """Return the whole stream as bytes, it is read into memory"""
+        return self[:].tobytes()
+
+    def __array__(self, dtype=None, copy=None):
+        stream = self[:]
+        return stream if dtype is None else stream.astype(dtype)
+
+
+def load_raw_capture(file_path: str) -> tuple[np.ndarray, np.ndarray, CaptureStream]:
+    """Load a capture file written by RawCaptureWriter. The file is memory-mapped and only the chunk headers are read, 
+    the stream is read lazily as it is sliced.
+
+    Args:
+        file_path: str
+            The path of the capture file
+
+    Returns:
+        [timestamps_ns: np.ndarray, chunk_offsets: np.ndarray, stream: CaptureStream]
+            The host monotonic timestamp of each chunk, the offset of each chunk in the stream,
+            and the raw stream, which can be sliced as a uint8 array (and passed to capture_decoder.decode_capture_buffer)
+    """
+    with open(file_path, 'rb') as f:
+        magic = f.read(len(CAPTURE_MAGIC))
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"File '{file_path}' is not a raw capture file")
+    data = np.memmap(file_path, dtype=np.uint8, mode='r')
+    file_size = len(data)
+
+    # Walk the chunk headers, the data of the chunks stays in the map
+    timestamps_ns = []
+    file_offsets = []
+    sizes = []
+    offset = len(CAPTURE_MAGIC)
+    while offset + CHUNK_HEADER.size <= file_size:
+        timestamp_ns, size = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        size = min(size, file_size - offset)        # The last chunk can be truncated if the capture did not close cleanly
+        timestamps_ns.append(timestamp_ns)
+        file_offsets.append(offset)
+        sizes.append(size)
+        offset += size
+    sizes = np.array(sizes, dtype=np.int64)
+    chunk_offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64) if len(sizes) else np.empty(0, dtype=np.int64)
+    stream = CaptureStream(data, np.array(file_offsets, dtype=np.int64), chunk_offsets, sizes)
+    return np.array(timestamps_ns, dtype=np.uint64), chunk_offsets, stream
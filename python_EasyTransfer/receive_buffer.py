@@ -0,0 +1,103 @@
+import numpy as np
+from typing import Callable, Optional
+
+RECEIVE_BUFFER_SIZE = 64*1024       # Default capacity of the receive buffer in bytes
+
+
+class ReceiveBuffer:
+    """Fixed capacity receive buffer with read and write cursors.
+
+    Bytes are written at the write cursor and consumed from the read cursor, so removing a processed frame only moves the read cursor
+    instead of copying the rest of the buffer. The unread bytes are moved to the start of the buffer only when there is no room left
+    at the end for new data, which keeps the cost per received byte constant.
+
+    Args:
+        capacity: int
+            The size of the buffer in bytes, this is the maximum number of unread bytes that can be held
+        on_overflow: Callable[[int], None]
+            Called with the number of unread bytes thrown away when the buffer is full
+    """
+    def __init__(self, capacity: int = RECEIVE_BUFFER_SIZE, on_overflow: Optional[Callable[[int], None]] = None):
+        self.capacity = capacity
+        self.on_overflow = on_overflow
+        self._buffer = bytearray(capacity)                      # Backing storage, never resized so the views below stay valid
+        self._view = memoryview(self._buffer)                   # Memoryview for zero-copy slicing
+        self._array = np.frombuffer(self._buffer, dtype=np.uint8)   # Numpy view for vectorized searching and overlap safe moves
+        self.read_pos = 0                                       # Index of the first unread byte
+        self.write_pos = 0                                      # Index after the last written byte
+        self.high_water_mark = 0                                # Maximum number of unread bytes held at once
+        self.bytes_discarded = 0                                # Number of bytes thrown away while resyncing or on overflow
+        self.bytes_overflowed = 0                               # Number of unread bytes thrown away because the buffer was full
+
+    def __len__(self) -> int:
+        """Return the number of unread bytes in the buffer"""
+        return self.write_pos - self.read_pos
+
+    def _compact(self):
+        """Move the unread bytes to the start of the buffer"""
+        size = len(self)
+        if self.read_pos > 0:
+            self._array[:size] = self._array[self.read_pos:self.write_pos]
+            self.read_pos = 0
+            self.write_pos = size
+
+    def get_write_buffer(self, size_hint: int = -1) -> memoryview:
+        """Return a writable memoryview of the free space after the write cursor. Call commit() with the number of bytes written.
+
+        Args:
+            size_hint: int
+                The number of bytes the caller would like to write, -1 if unknown
+        """
+        free = self.capacity - self.write_pos
+        if free == 0 or (size_hint > free and self.read_pos > 0):
+            self._compact()
+            free = self.capacity - self.write_pos
+        if free == 0:
+            # The buffer is full of unprocessed bytes, throw away the oldest half to make room
+            nbytes = len(self) // 2
+            self.discard(nbytes)
+            self._compact()
+            self.bytes_overflowed += nbytes
+            if self.on_overflow:
+                self.on_overflow(nbytes)
+        return self._view[self.write_pos:]
+
+    def commit(self, nbytes: int):
+        """Advance the write cursor after nbytes have been written into the buffer returned by get_write_buffer()"""
+        self.write_pos += nbytes
+        self.high_water_mark = max(self.high_water_mark, len(self))
+
+    def write(self, data: bytes) -> int:
+        """Copy data into the buffer, returns the number of bytes written which can be less than the length of data if the buffer is full"""
+        write_buffer = self.get_write_buffer(len(data))
+        nbytes = min(len(data), len(write_buffer))
+        write_buffer[:nbytes] = data[:nbytes]
+        self.commit(nbytes)
+        return nbytes
+
+    def find(self, sub: bytes, start: int = 0) -> int:
+        """Return the index of sub in the unread bytes (relative to the read cursor), -1 if not found"""
+        index = self._buffer.find(sub, self.read_pos + start, self.write_pos)
+        return index - self.read_pos if index != -1 else -1
+
+    def view(self, start: int = 0, end: Optional[int] = None) -> memoryview:
+        """Return a zero-copy memoryview of the unread bytes between start and end (relative to the read cursor).
+        The view is only valid until the next write to the buffer."""
+        end = len(self) if end is None else end
+        return self._view[self.read_pos + start:self.read_pos + end]
+
+    def array(self) -> np.ndarray:
+        """Return a zero-copy uint8 numpy view of the unread bytes, only valid until the next write to the buffer"""
+        return self._array[self.read_pos:self.write_pos]
+
+    def consume(self, nbytes: int):
+        """Mark nbytes of processed data as read"""
+        self.read_pos += min(nbytes, len(self))
+        if self.read_pos == self.write_pos:
+            self.read_pos = self.write_pos = 0         # Buffer is empty, rewind the cursors for free
+
+    def discard(self, nbytes: int):
+        """Throw away nbytes of unread data which could not be processed, these are counted in bytes_discarded"""
+        nbytes = min(nbytes, len(self))
+        self.bytes_discarded += nbytes
+        self.consume(nbytes)
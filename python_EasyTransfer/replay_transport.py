@@ -0,0 +1,261 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+import numpy as np
+from ETData import ETDataArrays
+from pyEasyTransfer import BYTE_FORMATS, create_record_dtype, encode_frames
+from capture_decoder import decode_capture_buffer
+from raw_capture import load_raw_capture
+
+
+@dataclass
+class ReplaySource:
+    """A recorded EasyTransfer byte stream and when each part of it was received.
+
+    times_s[i] is the time in seconds (from the start of the recording) at which the byte before offsets[i] was received.
+    If no times are given the stream is paced at the baud rate of the connection.
+    """
+    stream: np.ndarray                              # The raw byte stream as a uint8 array, or the CaptureStream of a capture file
+    offsets: Optional[np.ndarray] = None            # Stream offsets where the receive time is known
+    times_s: Optional[np.ndarray] = None            # Receive time of the byte before each offset, in seconds
+    num_frames: Optional[int] = None                # Number of records in the valid frames of the stream, if known
+
+    @classmethod
+    def from_raw_dump(cls, file_path: str) -> 'ReplaySource':
+        """Create a source from a raw byte dump of the serial stream, paced at the baud rate of the connection"""
+        return cls(stream=np.fromfile(file_path, dtype=np.uint8))
+
+    @classmethod
+    def from_raw_capture(cls, file_path: str) -> 'ReplaySource':
+        """Create a source from a timestamped capture written by PyEasyTransfer.start_capture, replaying the recorded chunk timing"""
+        timestamps_ns, chunk_offsets, stream = load_raw_capture(file_path)
+        chunk_ends = np.append(chunk_offsets[1:], len(stream))
+        times_s = (timestamps_ns - timestamps_ns[0]).astype(np.float64) / 1e9 if len(timestamps_ns) else np.empty(0)
+        return cls(stream=stream, offsets=chunk_ends, times_s=times_s)
+
+    @classmethod
+    def from_ETDataArrays(cls, data: ETDataArrays, byte_format: str = 'little-endian', time_field: str = 'time_us',
+                          time_scale: float = 1e-6, header_bytes: bytes = b'\x06\x85', checksum: str = 'xor') -> 'ReplaySource':
+        """Create a source by re-encoding the saved elements of an ETDataArrays object as frames.
+
+        Args:
+            data: ETDataArrays
+                The saved data to replay
+            byte_format: str
+                The byte order to encode the frames with
+            time_field: str
+                The device time field used to pace the frames, if it is not in the struct_def the frames are paced at the baud rate
+            time_scale: float
+                The number of seconds per unit of time_field
+            header_bytes: bytes
+                The header bytes which start every frame
+            checksum: str
+                The checksum mode to encode the frames with, see checksums.CHECKSUMS
+        """
+        records = data.get_records(create_record_dtype(byte_format, data.struct_def))
+        frames = encode_frames(records, header_bytes, checksum, BYTE_FORMATS[byte_format])
+        offsets = times_s = None
+        if time_field in data.struct_def and len(records):
+            device_time = records[time_field].astype(np.int64)
+            if np.dtype(data.struct_def[time_field]) == np.uint32:
+                device_time = np.concatenate(([0], np.cumsum(np.diff(device_time) % 2**32)))     # Unwrap the 32-bit counter
+            times_s = (device_time - device_time[0]) * time_scale
+            offsets = np.arange(1, len(records) + 1) * frames.shape[1]
+        return cls(stream=frames.reshape(-1), offsets=offsets, times_s=times_s, num_frames=len(records))
+
+
+@dataclass
+class ReplayStats:
+    """Statistics of a replay"""
+    bytes_sent: int = 0                     # Number of bytes delivered to the protocol
+    chunks_sent: int = 0                    # Number of chunks delivered to the protocol
+    elapsed_s: float = 0.0                  # Wall time of the replay in seconds
+    frames_expected: int = 0                # Number of valid frames in the replayed stream
+    frames_received: int = 0                # Number of frames decoded by the PyEasyTransfer object
+    frames_lost: int = 0                    # frames_expected - frames_received
+    frames_per_second: float = 0.0          # Frames decoded per second of wall time
+
+
+class ReplayTransport(asyncio.Transport):
+    """Transport which feeds a recorded byte stream into a protocol in place of a serial port.
+
+    Args:
+        loop: asyncio.AbstractEventLoop
+            The event loop to run the replay on
+        protocol: asyncio.BaseProtocol
+            The protocol to deliver the bytes to, asyncio.BufferedProtocol is written to in place
+        source: ReplaySource
+            The recorded stream
+        speed: float
+            Playback speed relative to the recording (1.0 is real-time, 100.0 is 100x), None to replay as fast as possible
+        chunk_size: Union[int, tuple[int, int], None]
+            The number of bytes delivered at once, a (min, max) tuple for random fragmentation,
+            or None to use the recorded chunks (one frame per chunk for an ETDataArrays source, 4096 bytes if the source has no timing)
+        baud_rate: int
+            The baud rate used to pace a source without receive times
+        seed: int
+            Seed for the random fragmentation
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, protocol: asyncio.BaseProtocol, source: ReplaySource,
+                 speed: Optional[float] = 1.0, chunk_size: Union[int, tuple[int, int], None] = None,
+                 baud_rate: int = 115200, seed: Optional[int] = None):
+        super().__init__()
+        self._loop = loop
+        self._protocol = protocol
+        self.source = source
+        self.speed = speed
+        self.bytes_written = 0                          # Number of bytes written to the transport (commands to the device are discarded)
+        self._stats = ReplayStats()
+        self._start_time = loop.time()
+        self._closed = False
+        self._finished = False                          # Set once the whole stream has been delivered
+        self._reading = asyncio.Event()                 # Cleared while the protocol paused the reading, the replay waits
+        self._reading.set()
+        self._closing = loop.create_future()            # Resolved once closed, PyEasyTransfer.close awaits this as with serial_asyncio
+        self.done = loop.create_future()                # Resolved with the ReplayStats once the whole stream has been delivered
+
+        # Split the stream into the chunks to deliver
+        stream_size = len(source.stream)
+        if chunk_size is None and source.offsets is not None:
+            chunk_ends = np.asarray(source.offsets, dtype=np.int64)
+        elif isinstance(chunk_size, tuple):
+            rng = np.random.default_rng(seed)
+            sizes = rng.integers(chunk_size[0], chunk_size[1] + 1, size=stream_size // max(chunk_size[0], 1) + 1)
+            chunk_ends = np.cumsum(sizes)
+        else:
+            chunk_ends = np.arange(chunk_size or 4096, stream_size + (chunk_size or 4096), chunk_size or 4096)
+        self._chunk_ends = np.minimum(chunk_ends[:np.searchsorted(chunk_ends, stream_size) + 1], stream_size)
+
+        # Receive time of the last byte of each chunk
+        if source.times_s is not None and len(source.times_s):
+            self._chunk_times_s = np.interp(self._chunk_ends, source.offsets, source.times_s)
+        else:
+            self._chunk_times_s = self._chunk_ends * 10.0 / baud_rate      # 10 bits per byte on the wire (start, 8 data, stop)
+
+        self._start_io_count = self._get_io_count()
+        self._task = loop.create_task(self._run())
+        loop.call_soon(protocol.connection_made, self)
+
+    def _get_io_count(self) -> int:
+        """Return the number of frames decoded by the PyEasyTransfer object behind the protocol"""
+        pyeasytransfer = getattr(self._protocol, 'pyeasytransfer', None)
+        return pyeasytransfer.read_data.io_count if pyeasytransfer is not None else 0
+
+    def _deliver(self, chunk: np.ndarray):
+        """Deliver a chunk of the stream to the protocol"""
+        if isinstance(self._protocol, asyncio.BufferedProtocol):
+            data = memoryview(chunk)
+            while data:
+                buffer = self._protocol.get_buffer(len(data))
+                nbytes = min(len(buffer), len(data))
+                buffer[:nbytes] = data[:nbytes]
+                self._protocol.buffer_updated(nbytes)
+                data = data[nbytes:]
+        else:
+            self._protocol.data_received(chunk.tobytes())
+
+    async def _run(self):
+        """Deliver every chunk at its (scaled) receive time"""
+        await asyncio.sleep(0)                          # Let connection_made run first
+        start_time = self._start_time = self._loop.time()
+        start = 0
+        for end, chunk_time_s in zip(self._chunk_ends.tolist(), self._chunk_times_s.tolist()):
+            delay = start_time + chunk_time_s/self.speed - self._loop.time() if self.speed else 0
+            await asyncio.sleep(max(delay, 0))          # Always yield so the rest of the application keeps running
+            if not self._reading.is_set():
+                paused_time = self._loop.time()
+                await self._reading.wait()
+                start_time += self._loop.time() - paused_time      # The rest of the stream keeps its pacing after the pause
+            if self._closed:
+                return
+            self._deliver(self.source.stream[start:end])
+            self._stats.bytes_sent += end - start
+            self._stats.chunks_sent += 1
+            start = end
+        self._stats.elapsed_s = self._loop.time() - start_time
+        self._finished = True                           # stats() only reports the lost frames once the replay is finished
+        self.done.set_result(self.stats())
+
+    def stats(self) -> ReplayStats:
+        """Return the statistics of the replay so far, frames_expected is computed from the stream if the source does not know it"""
+        if self.source.num_frames is None:
+            pyeasytransfer = getattr(self._protocol, 'pyeasytransfer', None)
+            if pyeasytransfer is not None:
+                # Decode with the settings of the receiver, the extended frames are counted in records as read_data.io_count is
+                _, decode_stats = decode_capture_buffer(self.source.stream, pyeasytransfer.read_data.struct_def, pyeasytransfer.byte_format,
+                                                        pyeasytransfer.header_bytes, checksum=pyeasytransfer.checksum,
+                                                        framing=pyeasytransfer.input_framing, max_samples=pyeasytransfer.max_samples_per_frame)
+                self.source.num_frames = decode_stats.records_decoded
+        stats = self._stats
+        stats.frames_expected = self.source.num_frames or 0
+        stats.frames_received = self._get_io_count() - self._start_io_count
+        stats.frames_lost = stats.frames_expected - stats.frames_received if self._finished else 0
+        elapsed_s = stats.elapsed_s if self._finished else self._loop.time() - self._start_time
+        stats.frames_per_second = stats.frames_received / elapsed_s if elapsed_s > 0 else 0.0
+        return stats
+
+    def pause_reading(self):
+        """Stop delivering the stream until resume_reading is called"""
+        self._reading.clear()
+
+    def resume_reading(self):
+        """Continue delivering the stream"""
+        self._reading.set()
+
+    def is_reading(self) -> bool:
+        return not self._closed and self._reading.is_set()
+
+    def write(self, data: bytes):
+        """Writes to the device are counted and discarded"""
+        self.bytes_written += len(data)
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def is_closing(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Stop the replay and close the connection"""
+        if self._closed:
+            return
+        self._closed = True
+        self._task.cancel()
+        self._loop.call_soon(self._protocol.connection_lost, None)
+        self._closing.set_result(None)
+
+    def abort(self):
+        self.close()
+
+
+async def create_replay_connection(loop: asyncio.AbstractEventLoop, protocol_factory: Callable[[], asyncio.BaseProtocol],
+                                   url: Optional[str] = None, baudrate: int = 115200, *, source: ReplaySource,
+                                   speed: Optional[float] = 1.0, chunk_size: Union[int, tuple[int, int], None] = None,
+                                   seed: Optional[int] = None) -> tuple[ReplayTransport, asyncio.BaseProtocol]:
+    """Drop-in replacement for serial_asyncio.create_serial_connection which replays a recorded stream.
+    Use with functools.partial to set the source and speed, and pass it as the connection_factory of PyEasyTransfer.
+
+    Args:
+        loop: asyncio.AbstractEventLoop
+            The event loop
+        protocol_factory: Callable
+            Factory for the protocol, as for create_serial_connection
+        url: str
+            The COM port, ignored
+        baudrate: int
+            The baud rate, used to pace a source without receive times
+        source: ReplaySource
+            The recorded stream
+        speed: float
+            Playback speed relative to the recording, None to replay as fast as possible
+        chunk_size: Union[int, tuple[int, int], None]
+            The number of bytes delivered at once, or a (min, max) tuple for random fragmentation
+        seed: int
+            Seed for the random fragmentation
+
+    Returns:
+        [transport: ReplayTransport, protocol: asyncio.BaseProtocol]
+    """
+    protocol = protocol_factory()
+    transport = ReplayTransport(loop, protocol, source, speed=speed, chunk_size=chunk_size, baud_rate=baudrate, seed=seed)
+    return transport, protocol
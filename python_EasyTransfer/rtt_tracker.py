@@ -0,0 +1,108 @@
+from typing import Optional
+import numpy as np
+
+RTT_WINDOW = 1000           # Number of most recent round-trip times kept for the percentiles
+
+
+class RttTracker:
+    """Measures the round-trip time of the commands sent to a device which echoes a tag back.
+
+    Every frame sent is tagged with a sequence number in tag_field (0 is never used, so it means no command received yet),
+    and the device copies the tag of the last command it received into echo_field of the frames it sends back.
+    The round-trip time of a command is the time from writing it to receiving the first frame echoing its tag, so it includes
+    the wait for the next frame sent by the device (up to one period of its data rate).
+
+    Args:
+        tag_field: str
+            The field of the output struct_def holding the tag
+        echo_field: str
+            The field of the input struct_def the device echoes the tag in
+        tag_dtype: np.dtype
+            The dtype of the tag field, the sequence number wraps at its maximum
+        window: int
+            The number of most recent round-trip times kept for the percentiles
+        max_pending: int
+            The maximum number of commands waiting for their echo, older ones are counted as expired
+    """
+    def __init__(self, tag_field: str = 'pc_seq', echo_field: str = 'pc_seq_received', tag_dtype: np.dtype = np.uint32,
+                 window: int = RTT_WINDOW, max_pending: int = 256):
+        self.tag_field = tag_field
+        self.echo_field = echo_field
+        self.tag_type = np.dtype(tag_dtype).type
+        self.max_tag = int(np.iinfo(tag_dtype).max)
+        self.max_pending = max_pending
+        self.count = 0                          # Number of round-trip times measured
+        self.superseded = 0                     # Number of commands replaced by a newer one before the device echoed them
+        self.expired = 0                        # Number of commands dropped from the pending commands without an echo
+        self.last_rtt_s = np.nan                # Most recent round-trip time
+        self._rtts_s = np.full(window, np.nan)  # Ring buffer of the most recent round-trip times
+        self._pending: dict[int, int] = {}      # Send time in ns of each tag waiting for its echo, oldest first
+        self._tag = 0
+        self._last_echo = 0
+
+    @classmethod
+    def for_struct_defs(cls, output_struct_def: dict[str, np.dtype], input_struct_def: dict[str, np.dtype],
+                        tag_field: str = 'pc_seq', echo_field: str = 'pc_seq_received') -> Optional['RttTracker']:
+        """Create a tracker if the output struct_def has the tag field and the input struct_def has the echo field, otherwise return None"""
+        if output_struct_def and input_struct_def and tag_field in output_struct_def and echo_field in input_struct_def:
+            return cls(tag_field, echo_field, output_struct_def[tag_field])
+        return None
+
+    @property
+    def last_tag(self):
+        """The tag of the last command sent, as the dtype of the tag field"""
+        return self.tag_type(self._tag)
+
+    def next_tag(self, send_time_ns: int):
+        """Return the tag for a command sent at send_time_ns (time.perf_counter_ns()), as the dtype of the tag field"""
+        self._tag = self._tag % self.max_tag + 1
+        self._pending[self._tag] = send_time_ns
+        if len(self._pending) > self.max_pending:
+            del self._pending[next(iter(self._pending))]
+            self.expired += 1
+        return self.tag_type(self._tag)
+
+    def echo_received(self, echo, host_time_ns: int) -> Optional[float]:
+        """Match the echoed tag of a received frame against the pending commands, returns the round-trip time in seconds
+        if this frame is the first to echo a pending command."""
+        echo = int(echo)
+        if echo == self._last_echo:
+            return None
+        self._last_echo = echo
+        send_time_ns = self._pending.pop(echo, None)
+        if send_time_ns is None:
+            return None
+
+        # Commands sent before this one will not be echoed anymore
+        for tag in [tag for tag, time_ns in self._pending.items() if time_ns <= send_time_ns]:
+            del self._pending[tag]
+            self.superseded += 1
+
+        self.last_rtt_s = (host_time_ns - send_time_ns) / 1e9
+        self._rtts_s[self.count % len(self._rtts_s)] = self.last_rtt_s
+        self.count += 1
+        return self.last_rtt_s
+
+    def rtts(self) -> np.ndarray:
+        """Return the most recent round-trip times in seconds, oldest first"""
+        if self.count <= len(self._rtts_s):
+            return self._rtts_s[:self.count].copy()
+        return np.roll(self._rtts_s, -(self.count % len(self._rtts_s)))
+
+    def percentiles(self, q: list[float] = [50, 95, 99]) -> np.ndarray:
+        """Return the given percentiles of the most recent round-trip times in seconds, nan if none have been measured"""
+        rtts = self.rtts()
+        return np.percentile(rtts, q) if len(rtts) else np.full(len(q), np.nan)
+
+    def summary(self) -> dict[str, float]:
+        """Return the round-trip statistics as a dictionary"""
+        rtts = self.rtts()
+        p50, p95, p99 = self.percentiles()
+        return {'count': self.count,
+                'p50_s': float(p50), 'p95_s': float(p95), 'p99_s': float(p99),
+                'mean_s': float(rtts.mean()) if len(rtts) else np.nan,
+                'max_s': float(rtts.max()) if len(rtts) else np.nan,
+                'last_s': self.last_rtt_s,
+                'pending': len(self._pending),
+                'superseded': self.superseded,
+                'expired': self.expired}
@@ -0,0 +1,200 @@
+import json
+import lzma
+from struct import Struct
+from typing import Optional
+import zlib
+import numpy as np
+from ETData import ETDataArrays, dtype_to_json
+
+""" Run archive format
+
+    A compressed, columnar file of the elements 0 to io_count of an ETDataArrays, for keeping and sharing the test data. Each
+    struct_def variable and the host_time_ns are stored as a separate column, split in chunks of chunk_rows values, and every
+    chunk is encoded and compressed on its own, so a reader only decompresses the columns it needs. The file starts with the
+    ARCHIVE_MAGIC bytes, followed by:
+        uint32          number of bytes of the JSON header, little-endian
+        header          JSON object: version, name, struct_def, record_dtype, byte_format, io_count, chunk_rows, compression, and
+                        for each column its dtype, encoding and the [offset, size] of each of its chunks after the header
+        chunks          the compressed chunks
+    The encodings, applied to the values in native byte order before the compression:
+        'delta'         integers and bools, the difference to the previous value (wrapping around), the first value is stored
+                        as is. Counters like time_ms become a constant and flags a few non-zero values.
+        'shuffle'       floats, the bytes are grouped by their position in the value (all first bytes, then all second bytes,
+                        ...), so the slowly changing sign and exponent bytes of the measurements end up next to each other.
+        'raw'           anything else
+"""
+ARCHIVE_MAGIC = b'ETARC\x01'
+ARCHIVE_FILE_EXTENSION = '.etarc'
+ARCHIVE_FILE_VERSION = 1
+ARCHIVE_CHUNK_ROWS = 64*1024            # Default number of values in a chunk of a column
+ARCHIVE_HEADER_SIZE = Struct('<I')
+ARCHIVE_COMPRESSIONS = {                # Compress and decompress functions of each compression
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+HOST_TIME_COLUMN = 'host_time_ns'       # Name of the column of the host receive times
+
+
+def _column_encoding(dtype: np.dtype) -> str:
+    """Return the encoding of a column of dtype"""
+    if dtype.kind in 'iub':
+        return 'delta'
+    if dtype.kind == 'f':
+        return 'shuffle'
+    return 'raw'
+
+
+def _encode(values: np.ndarray, encoding: str) -> bytes:
+    """Encode a chunk of a column, see the encodings above"""
+    values = values.astype(values.dtype.newbyteorder('='))
+    if encoding == 'delta':
+        if values.dtype.kind == 'b':
+            values = values.view(np.uint8)
+        delta = values.copy()
+        np.subtract(values[1:], values[:-1], out=delta[1:])
+        return delta.tobytes()
+    if encoding == 'shuffle':
+        return values.view(np.uint8).reshape(len(values), values.dtype.itemsize).T.tobytes()
+    return values.tobytes()
+
+
+def _decode(data: bytes, dtype: np.dtype, encoding: str) -> np.ndarray:
+    """Decode a chunk of a column, the inverse of _encode"""
+    native = dtype.newbyteorder('=')
+    if encoding == 'delta':
+        storage = np.dtype(np.uint8) if native.kind == 'b' else native
+        values = np.cumsum(np.frombuffer(data, dtype=storage), dtype=storage).view(native)
+    elif encoding == 'shuffle':
+        values = np.frombuffer(data, dtype=np.uint8).reshape(native.itemsize, -1).T.copy().view(native).ravel()
+    else:
+        values = np.frombuffer(data, dtype=native)
+    return values.astype(dtype)
+
+
+def write_archive(data: ETDataArrays, file_path: str, compression: str = 'zlib', chunk_rows: int = ARCHIVE_CHUNK_ROWS) -> None:
+    """Write the elements 0 to io_count of an ETDataArrays object to a run archive.
+
+    Args:
+        data: ETDataArrays
+            The ETDataArrays object to write
+        file_path: str
+            The path of the archive, it is overwritten if it exists
+        compression: str
+            The compression of the chunks, one of ARCHIVE_COMPRESSIONS. lzma is smaller and several times slower than zlib.
+        chunk_rows: int
+            The number of values in a chunk of a column
+    """
+    if compression not in ARCHIVE_COMPRESSIONS:
+        raise ValueError(f"Invalid compression '{compression}'. Must be one of {list(ARCHIVE_COMPRESSIONS)}")
+    if chunk_rows <= 0:
+        raise ValueError(f"Invalid chunk_rows {chunk_rows}, must be positive")
+    compress, _ = ARCHIVE_COMPRESSIONS[compression]
+    io_count = data.io_count
+    records = data.records[:io_count]
+    columns = [(variable, records[variable]) for variable in data.struct_def.keys()]
+    columns.append((HOST_TIME_COLUMN, np.asarray(data.host_time_ns[:io_count], dtype='<i8')))
+
+    blobs = []
+    offset = 0
+    header_columns = {}
+    for name, values in columns:
+        encoding = _column_encoding(values.dtype)
+        chunks = []
+        for start in range(0, io_count, chunk_rows):
+            blob = compress(_encode(values[start:start+chunk_rows], encoding))
+            chunks.append([offset, len(blob)])
+            blobs.append(blob)
+            offset += len(blob)
+        header_columns[name] = {'dtype': values.dtype.str, 'encoding': encoding, 'chunks': chunks}
+
+    formats = [data.record_dtype.fields[variable][0].str for variable in data.record_dtype.names]
+    header = {'version': ARCHIVE_FILE_VERSION, 'name': data.name,
+              'struct_def': {variable: np.dtype(_dtype).str for variable, _dtype in data.struct_def.items()},
+              'record_dtype': dtype_to_json(data.record_dtype),
+              'byte_format': 'big-endian' if any(_format.startswith('>') for _format in formats) else 'little-endian',
+              'io_count': io_count, 'chunk_rows': chunk_rows, 'compression': compression, 'columns': header_columns}
+    header_bytes = json.dumps(header).encode()
+    with open(file_path, 'wb') as f:
+        f.write(ARCHIVE_MAGIC)
+        f.write(ARCHIVE_HEADER_SIZE.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+
+
+def read_archive_header(file_path: str) -> dict:
+    """Return the JSON header of a run archive, see the run archive format above"""
+    with open(file_path, 'rb') as f:
+        if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError(f"File '{file_path}' is not a run archive")
+        header_size, = ARCHIVE_HEADER_SIZE.unpack(f.read(ARCHIVE_HEADER_SIZE.size))
+        header = json.loads(f.read(header_size))
+        header['data_offset'] = f.tell()
+    if header['version'] != ARCHIVE_FILE_VERSION:
+        raise ValueError(f"File '{file_path}' has the run archive version {header['version']}, only version {ARCHIVE_FILE_VERSION} is supported")
+    return header
+
+
+def read_archive(file_path: str, columns: Optional[list[str]] = None) -> tuple[dict, dict[str, np.ndarray]]:
+    """Read columns of a run archive, only the chunks of these columns are read and decompressed.
+
+    Args:
+        file_path: str
+            The path of the archive
+        columns: list[str]
+            The names of the struct_def variables to read, and/or HOST_TIME_COLUMN. If None, every column is read.
+
+    Returns:
+        [header: dict, columns: dict[str, np.ndarray]]
+            The JSON header, and the array of each column read by its name, in the order of the file
+    """
+    header = read_archive_header(file_path)
+    if columns is None:
+        columns = list(header['columns'])
+    unknown = [name for name in columns if name not in header['columns']]
+    if unknown:
+        raise ValueError(f"File '{file_path}' has no columns {unknown}, it has the columns {list(header['columns'])}")
+    _, decompress = ARCHIVE_COMPRESSIONS[header['compression']]
+
+    arrays = {}
+    with open(file_path, 'rb') as f:
+        for name, column in header['columns'].items():
+            if name not in columns:
+                continue
+            dtype = np.dtype(column['dtype'])
+            array = np.empty(header['io_count'], dtype=dtype)
+            start = 0
+            for offset, size in column['chunks']:
+                f.seek(header['data_offset'] + offset)
+                values = _decode(decompress(f.read(size)), dtype, column['encoding'])
+                array[start:start+len(values)] = values
+                start += len(values)
+            if start != header['io_count']:
+                raise ValueError(f"File '{file_path}' is truncated, the column '{name}' holds {start} of {header['io_count']} values")
+            arrays[name] = array
+    return header, arrays
+
+
+def load_archive(file_path: str, columns: Optional[list[str]] = None) -> ETDataArrays:
+    """Load a run archive into a new ETDataArrays object of io_count elements.
+
+    Args:
+        file_path: str
+            The path of the archive
+        columns: list[str]
+            The names of the struct_def variables to load, the struct_def of the ETDataArrays only holds these. If None, every
+            variable is loaded.
+
+    Returns:
+        data: ETDataArrays
+            The ETDataArrays object, with the record_dtype of the file if every variable is loaded
+    """
+    header, arrays = read_archive(file_path, None if columns is None else list(columns) + [HOST_TIME_COLUMN])
+    struct_def = {variable: np.dtype(_dtype) for variable, _dtype in header['struct_def'].items() if variable in arrays}
+    record_dtype = np.dtype(header['record_dtype']) if columns is None else np.dtype([(variable, arrays[variable].dtype) for variable in struct_def])
+    data = ETDataArrays(struct_def, max_elements=header['io_count'], name=header['name'], record_dtype=record_dtype)
+    records = np.empty(header['io_count'], dtype=record_dtype)
+    for variable in struct_def:
+        records[variable] = arrays[variable]
+    data.append_records(records, arrays[HOST_TIME_COLUMN])
+    return data
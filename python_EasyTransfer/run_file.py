@@ -0,0 +1,138 @@
+from datetime import datetime
+import json
+from struct import Struct
+from typing import Callable, Optional
+import numpy as np
+from ETData import ETDataArrays, dtype_to_json
+
+""" Run file format
+
+    A self-describing file of the elements of an ETDataArrays, trimmed to its io_count. It starts with the RUN_MAGIC bytes, followed by:
+        uint32          number of bytes of the JSON header, little-endian
+        header          JSON object: version, name, struct_def (dtype string of each variable), record_dtype (names, formats with
+                        their byte order, offsets, itemsize), byte_format, io_count, and the offsets of the two arrays below
+        padding         zeros up to records_offset, a multiple of RUN_ALIGNMENT
+        records         io_count records of the record_dtype, as they were received
+        host_time_ns    io_count little-endian int64 host receive times (time.perf_counter_ns)
+    Both arrays can be read directly, e.g. np.fromfile(file_path, dtype=record_dtype, count=io_count, offset=records_offset) or
+    np.memmap, and reading a file never runs any code from it, unlike a pickle.
+"""
+RUN_MAGIC = b'ETRUN\x01'
+RUN_FILE_EXTENSION = '.etrun'
+RUN_FILE_VERSION = 1
+RUN_ALIGNMENT = 64                      # Alignment of the arrays in the file
+RUN_HEADER_SIZE = Struct('<I')
+RUN_WRITE_BLOCK_SIZE = 1024*1024        # Number of bytes of the arrays written at a time, the progress is reported after each block
+
+
+def _aligned(offset: int) -> int:
+    """Round offset up to a multiple of RUN_ALIGNMENT"""
+    return -(-offset // RUN_ALIGNMENT) * RUN_ALIGNMENT
+
+
+def default_filename(data: ETDataArrays, extension: str) -> str:
+    """Return the filename of the name of the ETDataArrays object with the current time, e.g. 'monitor_2024-01-31_12-00-00.etrun'"""
+    datetime_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return f"{data.name}_{datetime_str}{extension}"
+
+
+def write_run_file(data: ETDataArrays, file_path: str, progress: Optional[Callable[[int, int], None]] = None) -> None:
+    """Write the elements 0 to io_count of an ETDataArrays object to a run file.
+
+    Args:
+        data: ETDataArrays
+            The ETDataArrays object to write
+        file_path: str
+            The path of the run file, it is overwritten if it exists
+        progress: Callable[[int, int], None]
+            Called with the number of bytes of the arrays written so far and the total number of bytes of the arrays
+    """
+    io_count = data.io_count
+    records = np.ascontiguousarray(data.records[:io_count])         # The rows of a file backed ETDataArrays are not packed
+    host_time_ns = np.ascontiguousarray(data.host_time_ns[:io_count], dtype='<i8')
+    formats = [data.record_dtype.fields[variable][0].str for variable in data.record_dtype.names]
+    header = {'version': RUN_FILE_VERSION, 'name': data.name,
+              'struct_def': {variable: np.dtype(_dtype).str for variable, _dtype in data.struct_def.items()},
+              'record_dtype': dtype_to_json(data.record_dtype),
+              'byte_format': 'big-endian' if any(_format.startswith('>') for _format in formats) else 'little-endian',
+              'io_count': io_count, 'records_offset': 0, 'host_time_ns_offset': 0}
+
+    # The offsets are part of the header, so its size is fixed by formatting them with a width large enough for any file
+    header['records_offset'] = header['host_time_ns_offset'] = 10**15
+    header_size = len(json.dumps(header).encode())
+    header['records_offset'] = _aligned(len(RUN_MAGIC) + RUN_HEADER_SIZE.size + header_size)
+    header['host_time_ns_offset'] = _aligned(header['records_offset'] + records.nbytes)
+    header_bytes = json.dumps(header).encode().ljust(header_size)
+
+    with open(file_path, 'wb') as f:
+        f.write(RUN_MAGIC)
+        f.write(RUN_HEADER_SIZE.pack(header_size))
+        f.write(header_bytes)
+        total = records.nbytes + host_time_ns.nbytes
+        written = 0
+        for offset, array in [(header['records_offset'], records), (header['host_time_ns_offset'], host_time_ns)]:
+            f.write(bytes(offset - f.tell()))
+            array_bytes = memoryview(array).cast('B')
+            for start in range(0, len(array_bytes), RUN_WRITE_BLOCK_SIZE):
+                block = array_bytes[start:start+RUN_WRITE_BLOCK_SIZE]
+                f.write(block)
+                written += len(block)
+                if progress:
+                    progress(written, total)
+
+
+def read_run_header(file_path: str) -> dict:
+    """Return the JSON header of a run file, see the run file format above"""
+    with open(file_path, 'rb') as f:
+        if f.read(len(RUN_MAGIC)) != RUN_MAGIC:
+            raise ValueError(f"File '{file_path}' is not a run file")
+        header_size, = RUN_HEADER_SIZE.unpack(f.read(RUN_HEADER_SIZE.size))
+        header = json.loads(f.read(header_size))
+    if header['version'] != RUN_FILE_VERSION:
+        raise ValueError(f"File '{file_path}' has the run file version {header['version']}, only version {RUN_FILE_VERSION} is supported")
+    return header
+
+
+def read_run_file(file_path: str, mmap: bool = False) -> tuple[dict, np.ndarray, np.ndarray]:
+    """Read the arrays of a run file without creating an ETDataArrays object.
+
+    Args:
+        file_path: str
+            The path of the run file
+        mmap: bool
+            Map the arrays read-only instead of reading them into the RAM
+
+    Returns:
+        [header: dict, records: np.ndarray, host_time_ns: np.ndarray]
+            The JSON header, the records as a structured array of the record_dtype, and the host receive time of each record
+    """
+    header = read_run_header(file_path)
+    record_dtype = np.dtype(header['record_dtype'])
+    io_count = header['io_count']
+    if mmap and io_count:
+        records = np.memmap(file_path, dtype=record_dtype, mode='r', offset=header['records_offset'], shape=io_count)
+        host_time_ns = np.memmap(file_path, dtype='<i8', mode='r', offset=header['host_time_ns_offset'], shape=io_count)
+    else:
+        records = np.fromfile(file_path, dtype=record_dtype, count=io_count, offset=header['records_offset'])
+        host_time_ns = np.fromfile(file_path, dtype='<i8', count=io_count, offset=header['host_time_ns_offset'])
+    if len(records) != io_count or len(host_time_ns) != io_count:
+        raise ValueError(f"File '{file_path}' is truncated, it holds {len(records)} of {io_count} records")
+    return header, records, host_time_ns
+
+
+def load_run_file(file_path: str) -> ETDataArrays:
+    """Load a run file into a new ETDataArrays object of io_count elements.
+
+    Args:
+        file_path: str
+            The path of the run file
+
+    Returns:
+        data: ETDataArrays
+            The ETDataArrays object, with the record_dtype of the file
+    """
+    header, records, host_time_ns = read_run_file(file_path)
+    struct_def = {variable: np.dtype(_dtype) for variable, _dtype in header['struct_def'].items()}
+    data = ETDataArrays(struct_def, max_elements=len(records), name=header['name'], record_dtype=records.dtype)
+    data.append_records(records, host_time_ns)
+    return data
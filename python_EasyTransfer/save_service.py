@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Callable, Optional
+from ETData import ETDataArrays
+from run_file import RUN_FILE_EXTENSION, default_filename, write_run_file
+
+""" Background saving
+
+    A SaveService saves ETDataArrays objects to run files without blocking the event loop. save() copies the elements 0 to
+    io_count (a few ms for a long test), so the ETDataArrays can be reset and receive the next test right away, and a worker
+    thread writes the copy. The file is written under a temporary name and renamed once it is complete, so a file with the
+    final name is never partially written. The progress and completion callbacks are called on the event loop thread.
+    The saves are written one at a time in the order they were requested. The GUI (controller/application.py) saves every test
+    this way by default, unless stream_data_to_file is set.
+"""
+SAVE_TEMP_SUFFIX = '.tmp'               # Suffix of a run file while it is written
+
+
+class SaveService:
+    """Saves ETDataArrays objects to run files in a worker thread.
+
+    Args:
+        dir: str
+            The directory the run files are saved to
+        progress: Callable[[str, int, int], None]
+            Called with the file path, the number of bytes written and the total number of bytes while a file is written
+        done: Callable[[str, Optional[BaseException]], None]
+            Called with the file path and None once a file is saved, or the exception if it could not be saved
+    """
+    def __init__(self, dir: str, progress: Optional[Callable[[str, int, int], None]] = None,
+                 done: Optional[Callable[[str, Optional[BaseException]], None]] = None):
+        self.dir = dir
+        self.progress = progress
+        self.done = done
+        self.pending: set[asyncio.Future] = set()           # The saves which are not written yet
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='SaveService')
+
+    def save(self, data: ETDataArrays, filename: Optional[str] = None) -> asyncio.Future:
+        """Copy the filled elements of data and write them to a run file in the background. Must be called from the event loop.
+
+        Args:
+            data: ETDataArrays
+                The ETDataArrays object to save, it can be modified as soon as save returns
+            filename: str
+                The filename of the run file. If None, the current time will be used with the name of the ETDataArrays object
+
+        Returns:
+            future: asyncio.Future
+                Resolves to the path of the run file once it is saved
+        """
+        file_path = os.path.join(self.dir, filename or default_filename(data, RUN_FILE_EXTENSION))
+        loop = asyncio.get_running_loop()
+        progress = None
+        if self.progress:
+            progress = lambda written, total: loop.call_soon_threadsafe(self.progress, file_path, written, total)
+        future = loop.run_in_executor(self._executor, self._write, data.snapshot(), file_path, progress)
+        self.pending.add(future)
+        future.add_done_callback(lambda future: self._save_done(future, file_path))
+        return future
+
+    @staticmethod
+    def _write(data: ETDataArrays, file_path: str, progress: Optional[Callable[[int, int], None]]) -> str:
+        """Worker thread, write the run file under the temporary name and rename it"""
+        temp_path = file_path + SAVE_TEMP_SUFFIX
+        try:
+            write_run_file(data, temp_path, progress)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return file_path
+
+    def _save_done(self, future: asyncio.Future, file_path: str):
+        """Report the completion of a save"""
+        self.pending.discard(future)
+        if self.done and not future.cancelled():
+            self.done(file_path, future.exception())
+
+    async def wait(self):
+        """Wait until every pending save is written, the exceptions are reported to the done callback"""
+        if self.pending:
+            await asyncio.wait(list(self.pending))
+
+    def close(self):
+        """Wait for the saves which are being written and stop the worker thread"""
+        self._executor.shutdown(wait=True)
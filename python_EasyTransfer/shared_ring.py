@@ -0,0 +1,152 @@
+from multiprocessing import shared_memory
+from typing import Optional
+import numpy as np
+
+""" Shared memory record ring
+
+    A single writer process appends decoded records, any number of reader processes map the same segment and copy the records
+    they have not seen yet. The segment holds:
+        header          RING_HEADER_SIZE int64 values, [0] is the number of records ever written (the write count)
+        records         capacity records of the record_dtype
+        host_time_ns    capacity int64 host receive times, one per record
+    The writer stores the records before it increments the write count, and readers re-check the write count after copying,
+    so a reader which was lapped by the writer drops the overwritten records instead of returning torn ones.
+"""
+RING_HEADER_SIZE = 8                    # Number of int64 values in the header
+RING_CAPACITY = 64*1024                 # Default number of records in the ring
+
+
+class SharedRecordRing:
+    """Ring of structured records in a multiprocessing.shared_memory segment, see create and attach.
+
+    Args:
+        shm: shared_memory.SharedMemory
+            The segment holding the ring
+        record_dtype: np.dtype
+            The structured dtype of the records
+        capacity: int
+            The number of records in the ring
+        readonly: bool
+            Map the arrays read-only, for readers
+        owner: bool
+            True for the process which created the segment, it unlinks the segment on close
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, record_dtype: np.dtype, capacity: int, readonly: bool = False, owner: bool = False):
+        self.shm = shm
+        self.name = shm.name
+        self.record_dtype = np.dtype(record_dtype)
+        self.capacity = capacity
+        self.readonly = readonly
+        self.owner = owner
+        records_offset = RING_HEADER_SIZE*8
+        times_offset = records_offset + capacity*self.record_dtype.itemsize
+        self._header = np.ndarray(RING_HEADER_SIZE, dtype=np.int64, buffer=shm.buf)
+        self.records = np.ndarray(capacity, dtype=self.record_dtype, buffer=shm.buf, offset=records_offset)
+        self.host_time_ns = np.ndarray(capacity, dtype=np.int64, buffer=shm.buf, offset=times_offset)
+        if readonly:
+            self._protect()
+
+    def _protect(self):
+        """Make the numpy views of the segment read-only"""
+        self.readonly = True
+        for array in [self._header, self.records, self.host_time_ns]:
+            array.flags.writeable = False
+
+    @staticmethod
+    def segment_size(record_dtype: np.dtype, capacity: int) -> int:
+        """Return the size in bytes of the segment of a ring"""
+        return RING_HEADER_SIZE*8 + capacity*(np.dtype(record_dtype).itemsize + 8)
+
+    @classmethod
+    def create(cls, record_dtype: np.dtype, capacity: int = RING_CAPACITY, name: Optional[str] = None, readonly: bool = False) -> 'SharedRecordRing':
+        """Create a new, empty ring. The creating process owns the segment and unlinks it on close, it can map the ring
+        read-only when another process is the writer."""
+        if capacity <= 0:
+            raise ValueError(f"Invalid capacity {capacity}, must be positive")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.segment_size(record_dtype, capacity))
+        ring = cls(shm, record_dtype, capacity, owner=True)
+        ring._header[:] = 0
+        ring._header[1] = capacity
+        ring._header[2] = ring.record_dtype.itemsize
+        if readonly:
+            ring._protect()
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, record_dtype: np.dtype, readonly: bool = True) -> 'SharedRecordRing':
+        """Map an existing ring, read-only unless this process is the writer"""
+        shm = shared_memory.SharedMemory(name=name)
+        header = np.ndarray(RING_HEADER_SIZE, dtype=np.int64, buffer=shm.buf)
+        capacity, itemsize = int(header[1]), int(header[2])
+        del header
+        if itemsize != np.dtype(record_dtype).itemsize:
+            shm.close()
+            raise ValueError(f"The ring '{name}' holds {itemsize} byte records, but the record_dtype is {np.dtype(record_dtype).itemsize} bytes")
+        return cls(shm, record_dtype, capacity, readonly=readonly)
+
+    @property
+    def write_count(self) -> int:
+        """Number of records ever written to the ring"""
+        return int(self._header[0])
+
+    @property
+    def io_count(self) -> int:
+        """Same as write_count, so the ring can be given to PyEasyTransfer as the save_read_data of the writer"""
+        return self.write_count
+
+    def append_records(self, records: np.ndarray, host_time_ns=None) -> int:
+        """Append a block of records, host_time_ns is a single value or one per record. Only the last capacity records are kept
+        if more are given. Returns the number of records given, the ring never refuses records."""
+        num = len(records)
+        if num == 0:
+            return 0
+        host_time_ns = np.broadcast_to(np.asarray(host_time_ns if host_time_ns is not None else 0, dtype=np.int64), (num,))
+        write_count = self.write_count
+        keep = min(num, self.capacity)
+        start = (write_count + num - keep) % self.capacity
+        first = min(keep, self.capacity - start)            # Records before wrapping around to the start of the ring
+        self.records[start:start+first] = records[num-keep:num-keep+first]
+        self.host_time_ns[start:start+first] = host_time_ns[num-keep:num-keep+first]
+        if first < keep:
+            self.records[:keep-first] = records[num-keep+first:]
+            self.host_time_ns[:keep-first] = host_time_ns[num-keep+first:]
+        self._header[0] = write_count + num                 # Publish the records once they are written
+        return num
+
+    def read(self, position: int) -> tuple[np.ndarray, np.ndarray, int, int]:
+        """Copy the records written since position.
+
+        Args:
+            position: int
+                The write count up to which the records have already been read, 0 for the first read
+
+        Returns:
+            [records: np.ndarray, host_time_ns: np.ndarray, position: int, lost: int]
+                The new records and their host times, the position to pass to the next read, and the number of records which
+                were overwritten before they could be read
+        """
+        end = self.write_count
+        start = max(position, end - self.capacity)
+        indexes = np.arange(start, end) % self.capacity
+        records = self.records[indexes]                     # Fancy indexing copies
+        host_time_ns = self.host_time_ns[indexes]
+
+        # Records overwritten by the writer while copying are dropped
+        overwritten = max(self.write_count - self.capacity - start, 0)
+        if overwritten:
+            records, host_time_ns = records[overwritten:], host_time_ns[overwritten:]
+        return records, host_time_ns, end, (start - position) + min(overwritten, end - start)
+
+    def latest(self) -> tuple[Optional[np.void], int]:
+        """Return a copy of the last record written and the write count, None if nothing has been written"""
+        end = self.write_count
+        if end == 0:
+            return None, 0
+        return self.records[(end - 1) % self.capacity].copy(), end
+
+    def close(self):
+        """Unmap the ring, and unlink the segment if this process created it"""
+        self._header = self.records = self.host_time_ns = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
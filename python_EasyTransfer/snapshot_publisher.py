@@ -0,0 +1,191 @@
+import json
+from multiprocessing import resource_tracker, shared_memory
+import os
+from struct import Struct
+import time
+from typing import Optional
+import numpy as np
+from ETData import dtype_to_json
+
+""" Shared memory live snapshot
+
+    A PyEasyTransfer publishes the latest record and a rolling window of the most recent records into a named shared memory
+    segment, so any local process can read the live data without opening the (exclusive) COM port. The segment holds:
+        header          SNAPSHOT_HEADER fields, see below
+        metadata        JSON description of the records (struct_def, record dtype, window), METADATA_SIZE bytes
+        latest          the last record published
+        window          window records, a ring indexed by write count % window
+        window times    window int64 host receive times (time.perf_counter_ns of the publisher)
+    The sequence counter is a seqlock: the publisher makes it odd before writing and even after, a reader copies the data
+    and retries if the counter was odd or changed meanwhile. Readers therefore never block the publisher.
+"""
+SNAPSHOT_HEADER = Struct('<qqqqqqqq')   # sequence, write count, latest host time ns, window, record size, metadata size, publisher pid, unused
+METADATA_SIZE = 4096                    # Bytes reserved for the JSON metadata
+SNAPSHOT_WINDOW = 1000                  # Default number of recent records kept in the window
+MAX_READ_RETRIES = 10000                # Number of attempts of a reader to get a consistent snapshot
+_SEQUENCE = Struct('<q')
+_COUNT_AND_TIME = Struct('<qq')
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """Map an existing segment without registering it with the resource tracker, which would unlink it when this process exits"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)       # Python 3.13+
+    except TypeError:
+        pass
+    # Older versions always register the segment, skip it while attaching. Unregistering afterwards would also drop the
+    # registration of a publisher in the same process.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SnapshotPublisher:
+    """Publishes records into a named shared memory segment, see SnapshotReader to read them.
+
+    Args:
+        name: str
+            The name of the segment, readers attach with the same name
+        record_dtype: np.dtype
+            The structured dtype of the records, as the packets are received (see create_record_dtype)
+        window: int
+            The number of most recent records kept in the window
+        metadata: dict
+            Extra JSON serializable information for the readers, e.g. the struct_def and byte_format
+    """
+    def __init__(self, name: str, record_dtype: np.dtype, window: int = SNAPSHOT_WINDOW, metadata: Optional[dict] = None):
+        if window <= 0:
+            raise ValueError(f"Invalid window {window}, must be positive")
+        self.name = name
+        self.record_dtype = np.dtype(record_dtype)
+        self.window = window
+        self.record_size = self.record_dtype.itemsize
+        self.write_count = 0
+        meta = json.dumps(dict(metadata or {}, dtype=dtype_to_json(self.record_dtype), window=window)).encode()
+        if len(meta) > METADATA_SIZE:
+            raise ValueError(f"The snapshot metadata is {len(meta)} bytes, at most {METADATA_SIZE} bytes fit in the segment")
+
+        self._latest_offset = SNAPSHOT_HEADER.size + METADATA_SIZE
+        self._window_offset = self._latest_offset + self.record_size
+        self._times_offset = self._window_offset + window*self.record_size
+        size = self._times_offset + window*8
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a publisher which did not exit cleanly, replace it
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buf = self.shm.buf
+        self._buf[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size+len(meta)] = meta
+        SNAPSHOT_HEADER.pack_into(self._buf, 0, 0, 0, 0, window, self.record_size, len(meta), os.getpid(), 0)
+        self._sequence = 0
+
+    def publish_packet(self, packet: bytes, host_time_ns: int):
+        """Publish a single record given as its packed bytes, e.g. a received packet"""
+        slot = self._window_offset + (self.write_count % self.window)*self.record_size
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._buf, 0, self._sequence)                   # Odd while writing
+        self._buf[self._latest_offset:self._latest_offset+self.record_size] = packet
+        self._buf[slot:slot+self.record_size] = packet
+        _SEQUENCE.pack_into(self._buf, self._times_offset + (self.write_count % self.window)*8, host_time_ns)
+        self.write_count += 1
+        _COUNT_AND_TIME.pack_into(self._buf, 8, self.write_count, host_time_ns)
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._buf, 0, self._sequence)                   # Even once the snapshot is consistent
+
+    def publish_records(self, records: np.ndarray, host_time_ns=None):
+        """Publish a block of records, host_time_ns is a single value or one per record"""
+        num = len(records)
+        if num == 0:
+            return
+        host_time_ns = np.broadcast_to(np.asarray(host_time_ns if host_time_ns is not None else 0, dtype=np.int64), (num,))
+        keep = min(num, self.window)
+        slots = (self.write_count + np.arange(num - keep, num)) % self.window
+        data = np.ascontiguousarray(records[num-keep:]).view(np.uint8).reshape(keep, self.record_size)
+        window = np.ndarray((self.window, self.record_size), dtype=np.uint8, buffer=self._buf, offset=self._window_offset)
+        times = np.ndarray(self.window, dtype=np.int64, buffer=self._buf, offset=self._times_offset)
+
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._buf, 0, self._sequence)
+        window[slots] = data
+        times[slots] = host_time_ns[num-keep:]
+        self._buf[self._latest_offset:self._latest_offset+self.record_size] = data[-1].tobytes()
+        self.write_count += num
+        _COUNT_AND_TIME.pack_into(self._buf, 8, self.write_count, int(host_time_ns[-1]))
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._buf, 0, self._sequence)
+        del window, times
+
+    def close(self):
+        """Remove the segment, readers which are attached keep their mapping until they close it"""
+        self._buf.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SnapshotReader:
+    """Reads consistent snapshots of the records published by a SnapshotPublisher, from any local process.
+
+    Args:
+        name: str
+            The name of the segment, the same as the publisher
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.shm = _attach_untracked(name)
+        buf = self.shm.buf
+        _, _, _, window, record_size, metadata_size, self.publisher_pid, _ = SNAPSHOT_HEADER.unpack_from(buf, 0)
+        self.metadata = json.loads(bytes(buf[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size+metadata_size]))
+        self.record_dtype = np.dtype(self.metadata['dtype'])
+        self.window = window
+        latest_offset = SNAPSHOT_HEADER.size + METADATA_SIZE
+        window_offset = latest_offset + record_size
+        times_offset = window_offset + window*record_size
+        self._header = np.ndarray(3, dtype='<i8', buffer=buf)                # sequence, write count, latest host time ns
+        self._latest = np.ndarray(1, dtype=self.record_dtype, buffer=buf, offset=latest_offset)
+        self._window = np.ndarray(window, dtype=self.record_dtype, buffer=buf, offset=window_offset)
+        self._times = np.ndarray(window, dtype=np.int64, buffer=buf, offset=times_offset)
+        for array in [self._header, self._latest, self._window, self._times]:
+            array.flags.writeable = False
+
+    @property
+    def write_count(self) -> int:
+        """Number of records published so far, poll it to see whether there is new data"""
+        return int(self._header[1])
+
+    def _read(self, copy):
+        """Run copy() until it is not interleaved with a publish, returns its result and the write count"""
+        for _ in range(MAX_READ_RETRIES):
+            sequence = int(self._header[0])
+            if sequence % 2 == 0:
+                result = copy()
+                write_count = int(self._header[1])
+                if int(self._header[0]) == sequence:
+                    return result, write_count
+            time.sleep(0)
+        raise TimeoutError(f"Could not read a consistent snapshot of '{self.name}', the publisher may have stopped while writing")
+
+    def latest(self) -> tuple[Optional[np.void], int, int]:
+        """Return a copy of the last record published, its host time in ns and the write count, None if nothing has been published"""
+        (record, host_time_ns), write_count = self._read(lambda: (self._latest[0].copy(), int(self._header[2])))
+        return (record if write_count else None), host_time_ns, write_count
+
+    def recent(self, num: Optional[int] = None) -> tuple[np.ndarray, np.ndarray, int]:
+        """Return copies of the num (default all of the window) most recent records and their host times, oldest first, and the write count"""
+        def copy():
+            write_count = int(self._header[1])
+            count = min(write_count, self.window, num if num is not None else self.window)
+            indexes = np.arange(write_count - count, write_count) % self.window
+            return self._window[indexes], self._times[indexes]
+        (records, host_time_ns), write_count = self._read(copy)
+        return records, host_time_ns, write_count
+
+    def close(self):
+        """Unmap the segment"""
+        self._header = self._latest = self._window = self._times = None
+        self.shm.close()
@@ -1,33 +1,70 @@
-from datetime import datetime
 import os
 import pickle
-from ETData import ETDataArrays
+from ETData import ROWS_FILE_EXTENSION, ETDataArrays
+from run_file import RUN_FILE_EXTENSION, default_filename, load_run_file, write_run_file
+from run_archive import ARCHIVE_FILE_EXTENSION, load_archive, write_archive
 
 def save_ETDataArrays(data: ETDataArrays, dir: str, filename: str=None) -> None:
-    """Save the current ETDataArrays object to a pickle file.
+    """Save the elements 0 to io_count of the current ETDataArrays object to a run file, see run_file.
 
     Args:
         data: ETDataArrays
-            The ETDataArrays object to save to a pickle file
+            The ETDataArrays object to save to a run file
         dir: str
-            The directory to save the pickle file to
+            The directory to save the run file to
         filename: str
-            The filename to save the pickle file as. If None, the current time will be used with the name of the ETDataArrays object
+            The filename to save the run file as. If None, the current time will be used with the name of the ETDataArrays object
     """
     if filename is None:
-        datetime_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"{data.name}_{datetime_str}.pkl"
-    file_path = os.path.join(dir, filename)
-    with open(file_path, 'wb') as f:
-        pickle.dump(data, f)
+        filename = default_filename(data, RUN_FILE_EXTENSION)
+    write_run_file(data, os.path.join(dir, filename))
+
+
+def archive_ETDataArrays(data: ETDataArrays, dir: str, filename: str=None, compression: str='zlib') -> None:
+    """Save the elements 0 to io_count of the current ETDataArrays object to a compressed run archive, see run_archive.
+
+    Args:
+        data: ETDataArrays
+            The ETDataArrays object to archive, e.g. loaded with load_ETDataArrays
+        dir: str
+            The directory to save the archive to
+        filename: str
+            The filename to save the archive as. If None, the current time will be used with the name of the ETDataArrays object
+        compression: str
+            The compression of the archive, 'zlib' or 'lzma'
+    """
+    if filename is None:
+        filename = default_filename(data, ARCHIVE_FILE_EXTENSION)
+    write_archive(data, os.path.join(dir, filename), compression)
+
+
+def start_ETDataArrays_file(data: ETDataArrays, dir: str, filename: str=None) -> None:
+    """Stream the rows of the ETDataArrays object to a new memory mapped file from now on, see ETDataArrays.start_file.
+
+    Args:
+        data: ETDataArrays
+            The ETDataArrays object to write to the file, its io_count is reset to 0
+        dir: str
+            The directory to create the file in
+        filename: str
+            The filename of the file. If None, the current time will be used with the name of the ETDataArrays object
+    """
+    if filename is None:
+        filename = default_filename(data, ROWS_FILE_EXTENSION)
+    data.start_file(os.path.join(dir, filename))
         
         
-def load_ETDataArrays(dir: str, filename: str) -> ETDataArrays:
-    """Load the current ETDataArrays object from a pickle file.
+def load_ETDataArrays(dir: str, filename: str, columns: list[str]=None) -> ETDataArrays:
+    """Load the current ETDataArrays object from a run file, a run archive, a rows file streamed during a test (mapped read-only, 
+    see start_ETDataArrays_file), or a pickle file saved by earlier versions.
 
     Args:
-        file_path: str
-            The path to load the pickle file from
+        dir: str
+            The directory of the file
+        filename: str
+            The filename of the run file, run archive, rows file or pickle file
+        columns: list[str]
+            The struct_def variables to load from a run archive, only these are decompressed. If None, every variable is loaded.
 
     Returns:
         data: ETDataArrays
@@ -35,11 +72,17 @@ def load_ETDataArrays(dir: str, filename: str) -> ETDataArrays:
     """
     file_path = os.path.join(dir, filename)
     
-    # Confirm the file exists and is a pickle file
+    # Confirm the file exists and is a run file, run archive, rows file or pickle file
     if not os.path.isfile(file_path):
         raise FileNotFoundError(f"File '{file_path}' does not exist")
+    if file_path.endswith(RUN_FILE_EXTENSION):
+        return load_run_file(file_path)
+    if file_path.endswith(ARCHIVE_FILE_EXTENSION):
+        return load_archive(file_path, columns)
+    if file_path.endswith(ROWS_FILE_EXTENSION):
+        return ETDataArrays.open_file(file_path)
     if not file_path.endswith('.pkl'):
-        raise FileNotFoundError(f"File '{file_path}' is not a pickle file")
+        raise FileNotFoundError(f"File '{file_path}' is not a run file, run archive, rows file or pickle file")
     
     # Open the pickle file and load the data    
     with open(file_path, 'rb') as f:
@@ -185,6 +185,7 @@ void send_data_to_pc() {
     driver_to_pc_data.piezo_2_phase             = piezo_2_phase;
     driver_to_pc_data.inlet_flow_sensor_ml_min  = inlet_sensor.scaled_flow_value;
     driver_to_pc_data.outlet_flow_sensor_ml_min = outlet_sensor.scaled_flow_value;
+    driver_to_pc_data.pc_seq_received           = pc_to_driver_data.pc_seq;     // Echo the last command for the round-trip time
 
     // Send the data to the PC
     ETout_pc.sendData();
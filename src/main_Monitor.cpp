@@ -112,6 +112,7 @@ void send_data_to_pc(){
 	monitor_to_pc_data.thermistor_12_temp_c 	= thermistor_temps[11];
 	monitor_to_pc_data.thermistor_13_temp_c 	= thermistor_temps[12];
 	monitor_to_pc_data.thermistor_14_temp_c 	= thermistor_temps[13];
+	monitor_to_pc_data.pc_seq_received 			= pc_to_monitor_data.pc_seq;	// Echo the last command for the round-trip time
 
 	// Now send the struct
 	ETout_pc.sendData();
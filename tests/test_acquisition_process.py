@@ -0,0 +1,16 @@
+import asyncio
+import numpy as np
+import pytest
+from acquisition_process import AcquisitionProcess
+
+STRUCT_DEF = {'time_ms': np.uint32, 'x': np.float32}
+
+
+def test_commands_before_open_raise():
+    acquisition = AcquisitionProcess('COM1', 115200, input_struct_def=STRUCT_DEF, output_struct_def=STRUCT_DEF)
+    with pytest.raises(RuntimeError, match='not open'):
+        acquisition.start_capture('capture.etcap')
+    with pytest.raises(RuntimeError, match='not open'):
+        acquisition.stop_capture()
+    with pytest.raises(RuntimeError, match='not open'):
+        asyncio.run(acquisition.send_data())
@@ -0,0 +1,49 @@
+import logging
+import numpy as np
+import pytest
+from ETData import ETDataArrays
+from pyEasyTransfer import EasyTransferReceiver, PyEasyTransfer, create_record_dtype, encode_frames
+
+STRUCT_DEF = {'time_ms': np.uint32, 'x': np.float32, 'flag': np.uint8}
+NUM_FRAMES = 2000
+
+
+def receive(stream: bytes, byte_format: str, batch_decode: bool, chunk_size: int = 333) -> ETDataArrays:
+    """Feed stream to a receiver in chunks and return the saved records"""
+    data = ETDataArrays(STRUCT_DEF, 2*NUM_FRAMES, 'received', record_dtype=create_record_dtype(byte_format, STRUCT_DEF))
+    et = PyEasyTransfer('test', 115200, input_struct_def=STRUCT_DEF, mode='input', byte_format=byte_format, save_read_data=data,
+                        batch_decode=batch_decode, log=logging.getLogger('test'))
+    et.start_saving()
+    receiver = EasyTransferReceiver(et, et.receive_buffer_size)
+    for start in range(0, len(stream), chunk_size):
+        receiver.data_received(stream[start:start + chunk_size])
+    return data
+
+
+def make_stream(byte_format: str, corrupt: bool) -> bytes:
+    records = np.zeros(NUM_FRAMES, dtype=create_record_dtype(byte_format, STRUCT_DEF))
+    records['time_ms'] = np.arange(NUM_FRAMES)
+    records['x'] = np.arange(NUM_FRAMES) / 4
+    records['flag'] = np.arange(NUM_FRAMES) % 2
+    byte_order = {'little-endian': '<', 'big-endian': '>', 'native': '<'}[byte_format]
+    stream = bytearray(encode_frames(records, byte_order=byte_order).tobytes())
+    if corrupt:
+        rng = np.random.default_rng(0)
+        for index in rng.choice(len(stream), len(stream) // 200, replace=False):
+            stream[index] ^= 0xFF
+        stream[100:100] = b'\x06\x85\x07noise'       # A false header
+    return bytes(stream)
+
+
+@pytest.mark.parametrize('byte_format', ['little-endian', 'big-endian', 'native'])
+@pytest.mark.parametrize('corrupt', [False, True])
+def test_batch_decode_matches_per_frame_decode(byte_format, corrupt):
+    stream = make_stream(byte_format, corrupt)
+    per_frame = receive(stream, byte_format, batch_decode=False)
+    batch = receive(stream, byte_format, batch_decode=True)
+    if not corrupt:
+        assert per_frame.io_count == NUM_FRAMES
+    else:
+        assert NUM_FRAMES // 2 < per_frame.io_count < NUM_FRAMES       # The decode resynced after the corrupted frames
+    assert batch.io_count == per_frame.io_count
+    np.testing.assert_array_equal(batch.records[:batch.io_count], per_frame.records[:per_frame.io_count])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from ETData import ETData, ETDataArrays
+from pyEasyTransfer import ETCodec
+
+STRUCT_DEF = {'a': np.float32, 'b': np.uint16}
+
+
+def test_chunked_reads_while_growing():
+    data = ETDataArrays(STRUCT_DEF, max_elements=0, name='chunked', chunk_size=10)
+    record = np.zeros(1, dtype=data.record_dtype)
+    merged_sizes = set()
+    for i in range(1000):
+        record['a'] = i
+        assert data.append_records(record, np.array([i + 1])) == 1
+        assert data.a[-1] == i
+        merged_sizes.add(len(data._chunks[0][0]))
+    np.testing.assert_array_equal(data.a, np.arange(1000))
+    np.testing.assert_array_equal(data.host_time_ns, np.arange(1, 1001))
+    assert len(merged_sizes) < 10                       # The merged rows grow geometrically, not by a chunk at each read
+
+
+def test_preallocated_empty_elements(recwarn):
+    data = ETDataArrays({'flag': np.bool_, 'count': np.int16, 'value': np.float32}, max_elements=4, name='preallocated')
+    assert np.isnan(data.value).all()
+    np.testing.assert_array_equal(data.count, 0)
+    assert not data.flag.any()
+    assert not [warning for warning in recwarn if issubclass(warning.category, RuntimeWarning)]
+
+def test_fields_cast_plain_python_values():
+    data = ETData({'flag': np.bool_, 'count': np.uint8, 'value': np.float32}, 'cast')
+    data.flag, data.count, data.value = 1, 200.0, 7
+    assert (type(data.flag), type(data.count), type(data.value)) == (np.bool_, np.uint8, np.float32)
+    assert (data.flag, data.count, data.value) == (True, 200, 7.0)
+    for variable, value in [('count', 256), ('count', -1), ('count', 2.5), ('count', '3'), ('flag', 2), ('value', 1e300)]:
+        with pytest.raises(TypeError):
+            setattr(data, variable, value)
+    assert (data.flag, data.count, data.value) == (True, 200, 7.0)
+
+
+def test_decode_into_other_layout_sets_fields():
+    struct_def = {'flag': np.bool_, 'count': np.uint16, 'value': np.float32}
+    codec = ETCodec(struct_def, byte_format='big-endian')
+    source = ETData(struct_def, 'source', record_dtype=codec.record_dtype)
+    source.flag, source.count, source.value = True, 1000, 2.5
+    target = ETData(struct_def, 'target')               # Packed native byte order, so decode_into sets each field
+    assert not codec.has_record_layout(target)
+    assert codec.decode_into(bytes(source.record_bytes), target) == (True, 1000, 2.5)
+    assert (target.flag, target.count, target.value) == (True, 1000, 2.5)
@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import logging
+import numpy as np
+from ETData import ETDataArrays
+from frame_subscription import FrameBroadcaster
+from pyEasyTransfer import PyEasyTransfer
+from replay_transport import ReplaySource, create_replay_connection
+
+RECORD_DTYPE = np.dtype([('time_ms', '<u4')])
+
+
+def block(start: int, num: int) -> np.ndarray:
+    records = np.zeros(num, dtype=RECORD_DTYPE)
+    records['time_ms'] = np.arange(start, start + num)
+    return records
+
+
+def drain(subscription) -> list:
+    async def get_all():
+        subscription.close()
+        batches = []
+        while (batch := await subscription.get()) is not None:
+            batches.append(batch)
+        return batches
+    return asyncio.run(get_all())
+
+
+def test_drop_oldest_keeps_the_newest_records():
+    broadcaster = FrameBroadcaster()
+    subscription = broadcaster.subscribe(maxsize=10, overflow='drop_oldest')
+    for start in range(0, 30, 5):
+        broadcaster.publish(block(start, 5), 0)
+    batches = drain(subscription)
+    np.testing.assert_array_equal(np.concatenate([batch.records['time_ms'] for batch in batches]), np.arange(20, 30))
+    assert subscription.dropped == batches[0].dropped == 20
+
+
+def test_coalesce_keeps_the_last_record():
+    broadcaster = FrameBroadcaster()
+    subscription = broadcaster.subscribe(maxsize=4, overflow='coalesce')
+    broadcaster.publish(block(0, 3), 0)
+    broadcaster.publish(block(3, 3), 0)
+    batches = drain(subscription)
+    assert [batch.records['time_ms'].tolist() for batch in batches] == [[5]]
+    assert batches[0].dropped == 5
+
+
+def test_block_pauses_and_resumes_the_reading():
+    calls = []
+    broadcaster = FrameBroadcaster(lambda: calls.append('pause'), lambda: calls.append('resume'))
+    subscription = broadcaster.subscribe(maxsize=10, overflow='block')
+    broadcaster.publish(block(0, 8), 0)
+    broadcaster.publish(block(8, 8), 0)
+    assert calls == ['pause']
+    batches = drain(subscription)
+    assert calls == ['pause', 'resume']
+    assert sum(len(batch.records) for batch in batches) == 16 and subscription.dropped == 0
+
+
+def test_block_drops_when_the_reading_can_not_pause():
+    broadcaster = FrameBroadcaster(lambda: False, lambda: None)
+    subscription = broadcaster.subscribe(maxsize=10, overflow='block')
+    broadcaster.publish(block(0, 8), 0)
+    broadcaster.publish(block(8, 8), 0)
+    assert not broadcaster.can_pause
+    assert subscription.size == 10 and subscription.dropped == 6
+
+
+def test_pause_reading_falls_back_for_transports_without_it(caplog):
+    et = PyEasyTransfer('test', 115200, input_struct_def={'time_ms': np.uint32}, mode='input', log=logging.getLogger('test'))
+    et._transport = asyncio.Transport()
+    with caplog.at_level(logging.WARNING):
+        assert et._pause_reading() is False
+    assert 'can not pause reading' in caplog.text
+
+
+def test_block_subscriber_on_a_replay_receives_every_record():
+    struct_def = {'time_ms': np.uint32, 'time_us': np.uint32}
+    data = ETDataArrays(struct_def, 2000, 'monitor')
+    data.time_ms[:] = np.arange(2000)
+    data.time_us[:] = np.arange(2000) * 1000
+    data.io_count = 2000
+
+    async def run():
+        source = ReplaySource.from_ETDataArrays(data)
+        et = PyEasyTransfer('replay', 115200, input_struct_def=struct_def, mode='input', log=logging.getLogger('test'),
+                            connection_factory=functools.partial(create_replay_connection, source=source, speed=None, chunk_size=256))
+        await et.open()
+        received, dropped = [], 0
+
+        async def consume():
+            nonlocal dropped
+            async for batch in et.frames(max_batch=16, maxsize=64, overflow='block'):
+                received.append(batch.records['time_ms'].copy())
+                dropped += batch.dropped
+                await asyncio.sleep(0.0005)             # A consumer slower than the replay
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        await asyncio.wait_for(et._transport.done, 10)
+        await et.close()
+        await asyncio.wait_for(consumer, 10)
+        return np.concatenate(received), dropped
+
+    received, dropped = asyncio.run(run())
+    assert dropped == 0
+    np.testing.assert_array_equal(received, np.arange(2000))
@@ -0,0 +1,38 @@
+import logging
+import numpy as np
+from ETData import ETData, ETDataArrays
+from pyEasyTransfer import ETCodec, EasyTransferReceiver, PacketType, PyEasyTransfer
+
+FAST_DEF = {'time_ms': np.uint32, 'x': np.float32}
+SLOW_DEF = {'time_ms': np.uint32, 'temperature': np.float32, 'state': np.uint8}
+
+
+def test_multiplexed_stream_is_demultiplexed():
+    fast = PacketType(1, 'fast', FAST_DEF, ETDataArrays(FAST_DEF, 1000, 'fast'))
+    slow = PacketType(2, 'slow', SLOW_DEF, ETDataArrays(SLOW_DEF, 1000, 'slow'))
+    et = PyEasyTransfer('test', 115200, mode='input', input_packet_types=[fast, slow], log=logging.getLogger('test'))
+    et.start_saving()
+    fast_codec, slow_codec = ETCodec(FAST_DEF, packet_type=1), ETCodec(SLOW_DEF, packet_type=2)
+    unknown_codec = ETCodec(FAST_DEF, packet_type=3)
+    fast_data, slow_data = ETData(FAST_DEF, 'fast', record_dtype=fast_codec.record_dtype), ETData(SLOW_DEF, 'slow', record_dtype=slow_codec.record_dtype)
+    stream = bytearray(b'noise')
+    for i in range(300):
+        fast_data.time_ms, fast_data.x = i, i / 2
+        stream += fast_codec.encode(fast_data)
+        if i % 3 == 0:
+            slow_data.time_ms, slow_data.temperature, slow_data.state = i, 20 + i, i % 4
+            stream += slow_codec.encode(slow_data)
+        if i % 100 == 0:
+            stream += unknown_codec.encode(fast_data)
+    receiver = EasyTransferReceiver(et, et.receive_buffer_size)
+    for start in range(0, len(stream), 97):
+        receiver.data_received(bytes(stream[start:start + 97]))
+
+    assert et.unknown_packets == 3
+    assert fast.save_data.io_count == 300 and slow.save_data.io_count == 100
+    np.testing.assert_array_equal(fast.save_data.time_ms[:300], np.arange(300))
+    np.testing.assert_array_equal(fast.save_data.x[:300], np.arange(300) / 2)
+    np.testing.assert_array_equal(slow.save_data.time_ms[:100], np.arange(0, 300, 3))
+    np.testing.assert_array_equal(slow.save_data.temperature[:100], 20 + np.arange(0, 300, 3))
+    np.testing.assert_array_equal(slow.save_data.state[:100], np.arange(0, 300, 3) % 4)
+    assert et.get_packet_type('slow').data.time_ms == 297
@@ -0,0 +1,42 @@
+import numpy as np
+from capture_decoder import decode_capture_buffer, decode_raw_capture_file
+from pyEasyTransfer import create_record_dtype, encode_frames
+from raw_capture import CAPTURE_MAGIC, CHUNK_HEADER, load_raw_capture
+
+STRUCT_DEF = {'time_ms': np.uint32, 'x': np.float32}
+
+
+def write_capture(file_path, chunks: list[bytes], truncate: int = 0):
+    parts = [CAPTURE_MAGIC]
+    for i, chunk in enumerate(chunks):
+        parts += [CHUNK_HEADER.pack(1000*i, len(chunk)), chunk]
+    data = b''.join(parts)
+    with open(file_path, 'wb') as f:
+        f.write(data[:len(data) - truncate])
+
+
+def test_stream_slices_across_chunks(tmp_path):
+    rng = np.random.default_rng(0)
+    stream = rng.integers(0, 256, 5000, dtype=np.uint8).tobytes()
+    cuts = [0, 7, 7, 1000, 1001, 3333, 5000]
+    write_capture(tmp_path / 'capture.etcap', [stream[a:b] for a, b in zip(cuts[:-1], cuts[1:])])
+    timestamps_ns, chunk_offsets, capture = load_raw_capture(str(tmp_path / 'capture.etcap'))
+    assert len(capture) == 5000
+    np.testing.assert_array_equal(timestamps_ns, np.arange(6) * 1000)
+    np.testing.assert_array_equal(chunk_offsets, cuts[:-1])
+    expected = np.frombuffer(stream, dtype=np.uint8)
+    for start, stop in [(0, 5000), (0, 7), (5, 1500), (1000, 1001), (3000, 5000), (4999, 6000), (10, 10), (-10, None)]:
+        np.testing.assert_array_equal(capture[start:stop], expected[start:stop])
+    assert capture[1000] == expected[1000] and capture[-1] == expected[-1]
+
+
+def test_decode_truncated_capture_file(tmp_path):
+    records = np.zeros(500, dtype=create_record_dtype('little-endian', STRUCT_DEF))
+    records['time_ms'] = np.arange(500)
+    frames = encode_frames(records).tobytes()
+    write_capture(tmp_path / 'capture.etcap', [frames[i:i + 333] for i in range(0, len(frames), 333)], truncate=5)
+    decoded, stats = decode_raw_capture_file(str(tmp_path / 'capture.etcap'), STRUCT_DEF, chunk_size=1000)
+    np.testing.assert_array_equal(decoded['time_ms'], np.arange(499))
+    assert stats.frames_decoded == 499
+    _, _, capture = load_raw_capture(str(tmp_path / 'capture.etcap'))
+    assert decode_capture_buffer(capture, STRUCT_DEF)[1] == stats
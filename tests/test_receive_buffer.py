@@ -0,0 +1,24 @@
+import logging
+import numpy as np
+from pyEasyTransfer import EasyTransferReceiver, PyEasyTransfer
+from receive_buffer import ReceiveBuffer
+
+
+def test_overflow_discards_the_oldest_half():
+    overflowed = []
+    buffer = ReceiveBuffer(100, on_overflow=overflowed.append)
+    assert buffer.write(bytes(range(100))) == 100
+    assert len(buffer.get_write_buffer()) == 50
+    assert overflowed == [50]
+    assert buffer.bytes_overflowed == buffer.bytes_discarded == 50
+    assert bytes(buffer.view()) == bytes(range(50, 100))
+
+
+def test_receiver_counts_overflow(caplog):
+    et = PyEasyTransfer('test', 115200, input_struct_def={'x': np.float32}, mode='input', log=logging.getLogger('test'))
+    receiver = EasyTransferReceiver(et, 100)
+    receiver.buffer.write(bytes(100))                   # Unprocessed bytes filling the buffer
+    with caplog.at_level(logging.WARNING):
+        receiver.get_buffer(-1)
+    assert receiver.resync_stats.bytes_discarded == 50
+    assert 'Receive buffer full' in caplog.text
@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import logging
+import numpy as np
+from ETData import ETDataArrays
+from extended_framing import encode_extended_frames
+from pyEasyTransfer import PyEasyTransfer, create_record_dtype, encode_frames
+from replay_transport import ReplaySource, create_replay_connection
+
+STRUCT_DEF = {"time_ms": np.uint32, "time_us": np.uint32, "x": np.float32}
+NUM_FRAMES = 1000
+
+
+def make_data() -> ETDataArrays:
+    data = ETDataArrays(STRUCT_DEF, NUM_FRAMES, 'monitor')
+    data.time_ms[:] = np.arange(NUM_FRAMES)
+    data.time_us[:] = np.arange(NUM_FRAMES) * 1000
+    data.x[:] = np.arange(NUM_FRAMES)
+    data.io_count = NUM_FRAMES
+    return data
+
+
+def replay(source: ReplaySource, **kwargs):
+    """Replay source into a PyEasyTransfer object as fast as possible, return the ReplayStats and the received data"""
+    async def run():
+        received = ETDataArrays(STRUCT_DEF, 2*NUM_FRAMES, 'received')
+        et = PyEasyTransfer('replay', 115200, input_struct_def=STRUCT_DEF, mode='input', log=logging.getLogger('test'),
+                            save_read_data=received, connection_factory=functools.partial(create_replay_connection, source=source,
+                                                                                          speed=None, chunk_size=(1, 100), seed=1),
+                            **kwargs)
+        et.start_saving()
+        await et.open()
+        stats = await et._transport.done
+        await et.close()
+        return stats, received
+    return asyncio.run(run())
+
+
+def test_replay_all_frames():
+    stats, received = replay(ReplaySource.from_ETDataArrays(make_data()))
+    assert stats.frames_expected == stats.frames_received == NUM_FRAMES
+    assert stats.frames_lost == 0
+    assert stats.elapsed_s > 0
+    np.testing.assert_array_equal(received.x[:received.io_count], np.arange(NUM_FRAMES))
+
+
+def test_replay_corrupted_capture_counts_lost_frames():
+    source = ReplaySource.from_ETDataArrays(make_data())
+    frame_size = len(source.stream) // NUM_FRAMES
+    source.stream[frame_size*np.arange(10, NUM_FRAMES, 100) + frame_size - 1] ^= 0xFF     # Break the checksum of 10 frames
+    stats, _ = replay(source)
+    assert stats.frames_expected == NUM_FRAMES
+    assert stats.frames_received == NUM_FRAMES - 10
+    assert stats.frames_lost == 10
+
+
+def make_records() -> np.ndarray:
+    return make_data().get_records(create_record_dtype('little-endian', STRUCT_DEF))
+
+
+def test_replay_crc16_counts_expected_frames():
+    stream = encode_frames(make_records(), checksum='crc16').reshape(-1)
+    stats, _ = replay(ReplaySource(stream=stream), checksum='crc16')
+    assert stats.frames_expected == stats.frames_received == NUM_FRAMES
+    assert stats.frames_lost == 0
+
+
+def test_replay_extended_counts_expected_records():
+    stream = np.frombuffer(encode_extended_frames(make_records(), 16), dtype=np.uint8).copy()
+    stream[100] ^= 0xFF                                 # Break the checksum of the first frame of 16 records
+    stats, _ = replay(ReplaySource(stream=stream), input_framing='extended')
+    assert stats.frames_expected == NUM_FRAMES - 16
+    assert stats.frames_received == NUM_FRAMES - 16
+    assert stats.frames_lost == 0
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from ETData import ETDataArrays
+from pyEasyTransfer import create_record_dtype
+from run_archive import HOST_TIME_COLUMN, load_archive, read_archive, write_archive
+
+STRUCT_DEF = {'time_ms': np.uint32, 'flag': np.bool_, 'x': np.float32, 'count': np.int16}
+NUM_ROWS = 1000
+
+
+def make_data(byte_format: str) -> ETDataArrays:
+    data = ETDataArrays(STRUCT_DEF, max_elements=NUM_ROWS + 10, name='monitor', record_dtype=create_record_dtype(byte_format, STRUCT_DEF))
+    records = np.zeros(NUM_ROWS, dtype=data.record_dtype)
+    records['time_ms'] = np.arange(NUM_ROWS)
+    records['flag'] = np.arange(NUM_ROWS) % 3 == 0
+    records['x'] = np.sin(np.arange(NUM_ROWS))
+    records['count'] = np.arange(NUM_ROWS) % 700 - 30000          # Deltas which wrap around
+    data.append_records(records, 1000 + np.arange(NUM_ROWS)**2)
+    return data
+
+
+@pytest.mark.parametrize('compression', ['zlib', 'lzma'])
+@pytest.mark.parametrize('byte_format', ['little-endian', 'big-endian'])
+def test_archive_round_trip(tmp_path, compression, byte_format):
+    data = make_data(byte_format)
+    file_path = str(tmp_path / 'monitor.etarc')
+    write_archive(data, file_path, compression=compression, chunk_rows=300)       # The last chunk is partial
+
+    loaded = load_archive(file_path)
+    assert loaded.name == 'monitor' and loaded.io_count == NUM_ROWS
+    assert loaded.record_dtype == data.record_dtype
+    np.testing.assert_array_equal(loaded.records[:NUM_ROWS], data.records[:NUM_ROWS])
+    np.testing.assert_array_equal(loaded.host_time_ns[:NUM_ROWS], data.host_time_ns[:NUM_ROWS])
+
+    header, arrays = read_archive(file_path, columns=['x'])
+    assert list(arrays) == ['x'] and header['compression'] == compression
+    np.testing.assert_array_equal(arrays['x'], data.x[:NUM_ROWS])
+
+
+def test_load_archive_columns(tmp_path):
+    data = make_data('little-endian')
+    file_path = str(tmp_path / 'monitor.etarc')
+    write_archive(data, file_path)
+    loaded = load_archive(file_path, columns=['count', 'time_ms'])
+    assert list(loaded.struct_def) == ['time_ms', 'count']
+    np.testing.assert_array_equal(loaded.count[:NUM_ROWS], data.count[:NUM_ROWS])
+    np.testing.assert_array_equal(loaded.host_time_ns[:NUM_ROWS], data.host_time_ns[:NUM_ROWS])
+    with pytest.raises(ValueError, match='no columns'):
+        read_archive(file_path, columns=['missing'])
+    assert HOST_TIME_COLUMN in read_archive(file_path)[1]
+
+
+def test_empty_archive(tmp_path):
+    file_path = str(tmp_path / 'empty.etarc')
+    write_archive(ETDataArrays(STRUCT_DEF, max_elements=10, name='empty'), file_path)
+    assert load_archive(file_path).io_count == 0
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from ETData import ETDataArrays
+from pyEasyTransfer import create_record_dtype
+from run_file import load_run_file, read_run_file, write_run_file
+
+STRUCT_DEF = {'time_ms': np.uint32, 'flag': np.bool_, 'x': np.float32, 'count': np.int16}
+
+
+def make_data(byte_format: str, num: int) -> ETDataArrays:
+    data = ETDataArrays(STRUCT_DEF, max_elements=num + 10, name='monitor', record_dtype=create_record_dtype(byte_format, STRUCT_DEF))
+    records = np.zeros(num, dtype=data.record_dtype)
+    records['time_ms'] = np.arange(num)
+    records['flag'] = np.arange(num) % 3 == 0
+    records['x'] = np.sin(np.arange(num))
+    records['count'] = np.arange(num) - num // 2
+    data.append_records(records, 1000 + np.arange(num))
+    return data
+
+
+@pytest.mark.parametrize('byte_format', ['little-endian', 'big-endian', 'native'])
+def test_run_file_round_trip(tmp_path, byte_format):
+    data = make_data(byte_format, 500)
+    file_path = str(tmp_path / 'monitor.etrun')
+    progress = []
+    write_run_file(data, file_path, progress=lambda written, total: progress.append((written, total)))
+    assert progress[-1][0] == progress[-1][1]
+
+    loaded = load_run_file(file_path)
+    assert loaded.name == 'monitor' and loaded.io_count == 500
+    assert loaded.record_dtype == data.record_dtype
+    assert loaded.struct_def == {variable: np.dtype(_dtype) for variable, _dtype in STRUCT_DEF.items()}
+    np.testing.assert_array_equal(loaded.records[:500], data.records[:500])
+    np.testing.assert_array_equal(loaded.host_time_ns[:500], data.host_time_ns[:500])
+
+    header, records, host_time_ns = read_run_file(file_path, mmap=True)
+    assert header['io_count'] == 500
+    np.testing.assert_array_equal(records, data.records[:500])
+    np.testing.assert_array_equal(host_time_ns, data.host_time_ns[:500])
+    del records, host_time_ns
+
+
+def test_empty_run_file(tmp_path):
+    file_path = str(tmp_path / 'empty.etrun')
+    write_run_file(make_data('little-endian', 0), file_path)
+    assert load_run_file(file_path).io_count == 0
+
+
+def test_truncated_run_file(tmp_path):
+    file_path = tmp_path / 'monitor.etrun'
+    write_run_file(make_data('little-endian', 500), str(file_path))
+    file_path.write_bytes(file_path.read_bytes()[:-100])
+    with pytest.raises(ValueError, match='truncated'):
+        read_run_file(str(file_path))
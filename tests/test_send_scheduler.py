@@ -0,0 +1,59 @@
+import asyncio
+import functools
+import logging
+import numpy as np
+from pyEasyTransfer import PyEasyTransfer
+from replay_transport import ReplaySource, create_replay_connection
+
+INPUT_STRUCT_DEF = {'time_ms': np.uint32}
+OUTPUT_STRUCT_DEF = {'setpoint': np.float32, 'reset_time': np.bool_}
+
+
+def run_sender(test, **kwargs):
+    """Open a PyEasyTransfer on an empty replay, run test(et) and return the send_stats"""
+    async def run():
+        source = ReplaySource(stream=np.empty(0, dtype=np.uint8))
+        et = PyEasyTransfer('replay', 115200, input_struct_def=INPUT_STRUCT_DEF, output_struct_def=OUTPUT_STRUCT_DEF,
+                            log=logging.getLogger('test'), connection_factory=functools.partial(create_replay_connection, source=source, speed=None),
+                            **kwargs)
+        await et.open()
+        await test(et)
+        await et.close()
+        return et.send_stats
+    return asyncio.run(run())
+
+
+def test_send_window_coalesces_updates():
+    async def test(et):
+        et.write_data.reset_time = False
+        sends = []
+        for i in range(5):
+            et.write_data.setpoint = np.float32(i)
+            sends.append(asyncio.ensure_future(et.send_data()))
+            await asyncio.sleep(0)
+        await asyncio.gather(*sends)
+        assert et._last_sent_frame[et.write_codec.packet_start:et.write_codec.packet_start + 4] == np.float32(4).tobytes()
+    stats = run_sender(test, send_window=0.01)
+    assert stats.requests == 5
+    assert stats.frames_sent == 1
+    assert stats.coalesced == 4
+
+
+def test_unchanged_frames_are_skipped():
+    async def test(et):
+        et.write_data.reset_time = False
+        for _ in range(3):
+            await et.send_data()
+    stats = run_sender(test)
+    assert stats.frames_sent == 1
+    assert stats.unchanged == 2
+
+
+def test_reset_time_frames_are_always_sent():
+    async def test(et):
+        et.write_data.reset_time = True
+        for _ in range(3):
+            await et.send_data()
+    stats = run_sender(test)
+    assert stats.frames_sent == 3
+    assert stats.unchanged == 0
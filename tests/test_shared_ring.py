@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from shared_ring import SharedRecordRing
+
+RECORD_DTYPE = np.dtype([('count', '<u4'), ('x', '<f4')])
+
+
+def make_records(start: int, num: int) -> np.ndarray:
+    records = np.zeros(num, dtype=RECORD_DTYPE)
+    records['count'] = np.arange(start, start + num)
+    records['x'] = records['count'] / 2
+    return records
+
+
+def test_reader_follows_and_reports_lapped_records():
+    ring = SharedRecordRing.create(RECORD_DTYPE, capacity=8)
+    reader = SharedRecordRing.attach(ring.name, RECORD_DTYPE)
+    try:
+        assert reader.latest() == (None, 0)
+        ring.append_records(make_records(0, 5), np.arange(5))
+        records, host_time_ns, position, lost = reader.read(0)
+        np.testing.assert_array_equal(records, make_records(0, 5))
+        np.testing.assert_array_equal(host_time_ns, np.arange(5))
+        assert (position, lost) == (5, 0)
+
+        ring.append_records(make_records(5, 6), 7)              # Wraps around the end of the ring
+        records, host_time_ns, position, lost = reader.read(position)
+        np.testing.assert_array_equal(records, make_records(5, 6))
+        assert (position, lost) == (11, 0)
+
+        ring.append_records(make_records(11, 20))               # Laps the reader, only the last 8 records are kept
+        records, _, position, lost = reader.read(position)
+        np.testing.assert_array_equal(records, make_records(23, 8))
+        assert (position, lost) == (31, 12)
+        assert reader.latest()[0]['count'] == 30
+        with pytest.raises(ValueError):
+            reader.records[0] = records[0]                      # Readers map the ring read-only
+    finally:
+        reader.close()
+        ring.close()
+
+
+def test_attach_checks_record_size():
+    ring = SharedRecordRing.create(RECORD_DTYPE, capacity=8)
+    try:
+        with pytest.raises(ValueError):
+            SharedRecordRing.attach(ring.name, np.dtype([('count', '<u2')]))
+    finally:
+        ring.close()
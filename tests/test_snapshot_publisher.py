@@ -0,0 +1,71 @@
+import os
+import threading
+import numpy as np
+import pytest
+import snapshot_publisher
+from snapshot_publisher import SnapshotPublisher, SnapshotReader
+
+RECORD_DTYPE = np.dtype([('count', '<u4'), ('check', '<u4')])
+
+
+@pytest.fixture
+def publisher():
+    publisher = SnapshotPublisher(f'et_snapshot_test_{os.getpid()}', RECORD_DTYPE, window=16, metadata={'byte_format': 'little-endian'})
+    yield publisher
+    publisher.close()
+
+
+def make_records(start: int, num: int) -> np.ndarray:
+    records = np.zeros(num, dtype=RECORD_DTYPE)
+    records['count'] = np.arange(start, start + num)
+    records['check'] = ~records['count']
+    return records
+
+
+def test_snapshot_round_trip(publisher):
+    reader = SnapshotReader(publisher.name)
+    assert reader.metadata['byte_format'] == 'little-endian' and reader.window == 16
+    assert reader.latest() == (None, 0, 0)
+    publisher.publish_packet(make_records(0, 1).tobytes(), 100)
+    publisher.publish_records(make_records(1, 20), np.arange(101, 121))
+    record, host_time_ns, write_count = reader.latest()
+    assert (record['count'], host_time_ns, write_count) == (20, 120, 21)
+    records, host_times, write_count = reader.recent()
+    np.testing.assert_array_equal(records, make_records(5, 16))         # The window keeps the 16 most recent records, oldest first
+    np.testing.assert_array_equal(host_times, np.arange(105, 121))
+    np.testing.assert_array_equal(reader.recent(3)[0], make_records(18, 3))
+    reader.close()
+
+
+def test_snapshots_are_consistent_while_publishing(publisher):
+    reader = SnapshotReader(publisher.name)
+    stop = threading.Event()
+
+    def publish():
+        count = 0
+        while not stop.is_set():
+            publisher.publish_records(make_records(count, 5), count)
+            count += 5
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        for _ in range(2000):
+            records, host_times, write_count = reader.recent()
+            # A torn snapshot would mix records of different publishes
+            np.testing.assert_array_equal(records['check'], ~records['count'])
+            np.testing.assert_array_equal(records['count'], np.arange(write_count - len(records), write_count))
+            np.testing.assert_array_equal(host_times, (records['count'] // 5) * 5)
+    finally:
+        stop.set()
+        thread.join()
+    reader.close()
+
+
+def test_read_during_stalled_publish_times_out(publisher, monkeypatch):
+    reader = SnapshotReader(publisher.name)
+    monkeypatch.setattr(snapshot_publisher, 'MAX_READ_RETRIES', 10)
+    snapshot_publisher._SEQUENCE.pack_into(publisher._buf, 0, 1)       # A publisher stopped in the middle of a write
+    with pytest.raises(TimeoutError):
+        reader.latest()
+    reader.close()
@@ -0,0 +1,31 @@
+import numpy as np
+from ETData import ETDataArrays
+from utils import load_ETDataArrays, save_ETDataArrays, start_ETDataArrays_file
+
+STRUCT_DEF = {'time_ms': np.uint32, 'x': np.float32}
+
+
+def append_rows(data: ETDataArrays, num: int):
+    records = np.zeros(num, dtype=data.record_dtype)
+    records['time_ms'] = np.arange(num)
+    records['x'] = np.arange(num) / 2
+    data.append_records(records, np.arange(1, num + 1))
+
+
+def test_load_streamed_rows_file(tmp_path):
+    data = ETDataArrays(STRUCT_DEF, max_elements=0, name='monitor', chunk_size=100)
+    start_ETDataArrays_file(data, str(tmp_path), 'monitor.rows')
+    append_rows(data, 250)
+    data.flush()
+    loaded = load_ETDataArrays(str(tmp_path), 'monitor.rows')
+    assert loaded.io_count == 250
+    np.testing.assert_array_equal(loaded.x[:loaded.io_count], np.arange(250) / 2)
+    np.testing.assert_array_equal(loaded.host_time_ns[:loaded.io_count], np.arange(1, 251))
+
+
+def test_load_run_file(tmp_path):
+    data = ETDataArrays(STRUCT_DEF, max_elements=100, name='monitor')
+    append_rows(data, 60)
+    save_ETDataArrays(data, str(tmp_path), 'monitor.etrun')
+    loaded = load_ETDataArrays(str(tmp_path), 'monitor.etrun')
+    np.testing.assert_array_equal(loaded.records[:loaded.io_count], data.records[:60])